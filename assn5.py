@@ -1,9 +1,17 @@
 import argparse
+import glob
+import hashlib
+import json
 import os
 import sys
+import time
+import zipfile
 import numpy as np
 import open3d as o3d
-import random
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 
 # INFO PRINTERS
 def print_mesh_info(mesh, label="Mesh"):
@@ -32,12 +40,15 @@ def print_voxel_info(vg, label="VoxelGrid"):
     print(f"  voxel count: {n:,}")
 
 # MESH LOADING (PLY ONLY)
-def load_mesh_ply(model_path):
+def require_file(model_path):
     if not os.path.exists(model_path):
         print(f"ERROR: File not found: {model_path}")
         print("  Make sure your .ply file is in the correct folder.")
         print("  Example: --model 'hollow_knight_clean.ply'")
-        sys.exit(1)
+        raise FileNotFoundError(model_path)
+
+def load_mesh_ply(model_path):
+    require_file(model_path)
 
     print(f"Loading PLY: {model_path}")
     mesh = o3d.io.read_triangle_mesh(model_path)
@@ -116,148 +127,778 @@ def highlight_extrema(mesh, axis=1, radius=0.03):
     s_max.translate(p_max); s_max.paint_uniform_color([1, 0, 0])  # Red
     return p_min, p_max, s_min, s_max
 
-# CLIPPING
-def clip_mesh(mesh, point, normal, keep_left=True):
-    verts = np.asarray(mesh.vertices)
-    tris = np.asarray(mesh.triangles)
-    centers = np.mean(verts[tris], axis=1)
-    signed = np.dot(centers - point, normal)
-    mask = signed <= 0 if keep_left else signed >= 0
-    kept_tris = tris[mask]
-    if len(kept_tris) == 0:
+# VOXEL MESH
+# Unit-cube faces (-X, +X, -Y, +Y, -Z, +Z): corners counter-clockwise seen from outside
+FACE_NORMALS = np.array([[-1, 0, 0], [1, 0, 0], [0, -1, 0], [0, 1, 0], [0, 0, -1], [0, 0, 1]])
+FACE_CORNERS = np.array([
+    [[0, 0, 0], [0, 0, 1], [0, 1, 1], [0, 1, 0]],
+    [[1, 0, 0], [1, 1, 0], [1, 1, 1], [1, 0, 1]],
+    [[0, 0, 0], [1, 0, 0], [1, 0, 1], [0, 0, 1]],
+    [[0, 1, 0], [0, 1, 1], [1, 1, 1], [1, 1, 0]],
+    [[0, 0, 0], [0, 1, 0], [1, 1, 0], [1, 0, 0]],
+    [[0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]],
+])
+QUAD_TRIS = np.array([[0, 1, 2], [0, 2, 3]])
+DENSE_GRID_MAX = 1 << 26  # occupancy as a bool array up to 64 MB, sorted keys beyond that
+
+def voxel_palette(n):
+    """The old per-cube shading: five intensities of a dark purple, cycling by voxel order."""
+    intensity = 0.3 + 0.7 * (np.arange(n) % 5) / 4
+    return intensity[:, None] * np.array([0.3, 0.1, 0.2])
+
+def occupied(idx, query):
+    """For each row of query (grid indices), whether it is one of the voxels in idx."""
+    lo = idx.min(axis=0) - 1
+    dims = idx.max(axis=0) - lo + 2
+    inside = np.all((query >= lo) & (query < lo + dims), axis=1)
+    q = np.where(inside[:, None], query - lo, 0)
+    keys = np.ravel_multi_index((idx - lo).T, dims)
+    qkeys = np.ravel_multi_index(q.T, dims)
+    if np.prod(dims) <= DENSE_GRID_MAX:
+        grid = np.zeros(int(np.prod(dims)), dtype=bool)
+        grid[keys] = True
+        return inside & grid[qkeys]
+    keys.sort()
+    pos = np.minimum(np.searchsorted(keys, qkeys), len(keys) - 1)
+    return inside & (keys[pos] == qkeys)
+
+def voxel_mesh(vg, colors=None, cull=True):
+    """One TriangleMesh for the whole voxel grid, built with array ops instead of a box per voxel.
+
+    colors: (n, 3) per voxel in get_voxels() order; default is the grid's colors if it has them,
+    else voxel_palette. cull drops faces shared by two occupied voxels, leaving only the shell.
+    """
+    voxels = vg.get_voxels()
+    if not voxels:
         return o3d.geometry.TriangleMesh()
+    idx = np.array([v.grid_index for v in voxels], dtype=np.int64)
+    if colors is None:
+        colors = np.array([v.color for v in voxels]) if vg.has_colors() else voxel_palette(len(idx))
+
+    visible = np.ones((len(idx), 6), dtype=bool)
+    if cull:
+        for f, n in enumerate(FACE_NORMALS):
+            visible[:, f] = ~occupied(idx, idx + n)
+    vox, face = np.nonzero(visible)
+
+    size = vg.voxel_size
+    verts = (idx[vox, None, :] + FACE_CORNERS[face]) * size + np.asarray(vg.origin)
+    tris = np.arange(len(vox))[:, None, None] * 4 + QUAD_TRIS
+
+    mesh = o3d.geometry.TriangleMesh()
+    mesh.vertices = o3d.utility.Vector3dVector(verts.reshape(-1, 3))
+    mesh.triangles = o3d.utility.Vector3iVector(tris.reshape(-1, 3).astype(np.int32))
+    # four vertices per face, so normals stay flat across the cube edges
+    mesh.vertex_normals = o3d.utility.Vector3dVector(np.repeat(FACE_NORMALS[face], 4, axis=0).astype(np.float64))
+    mesh.vertex_colors = o3d.utility.Vector3dVector(np.repeat(np.asarray(colors, dtype=np.float64)[vox], 4, axis=0))
+    return mesh
 
-    uniq, inv = np.unique(kept_tris, return_inverse=True)
-    new_verts = verts[uniq]
-    new_tris = inv.reshape(-1, 3)
-
-    new_mesh = o3d.geometry.TriangleMesh()
-    new_mesh.vertices = o3d.utility.Vector3dVector(new_verts)
-    new_mesh.triangles = o3d.utility.Vector3iVector(new_tris)
+# CLIPPING
+CLIP_CHUNK = 1 << 18  # triangles per chunk; temporaries scale with this, not with the mesh
+
+class MeshClipper:
+    """Vertex store for clipping: the input vertices plus the ones created where edges cross a plane.
+
+    Ids below nv are input vertices, the rest index self.extra. A cut vertex is keyed by
+    (plane, edge), so both triangles sharing a crossing edge get the same vertex and the
+    result stays watertight along the cut. Every vertex carries a bitmask of the planes it
+    lies on (within eps of the bbox diagonal), which is what cap() looks at.
+    """
+
+    def __init__(self, mesh, eps=1e-9):
+        self.verts = np.asarray(mesh.vertices)
+        self.colors = np.asarray(mesh.vertex_colors) if mesh.has_vertex_colors() else None
+        self.nv = len(self.verts)
+        self.eps = eps * (np.linalg.norm(np.ptp(self.verts, axis=0)) if self.nv else 1.0)
+        self.mask = np.zeros(self.nv, dtype=np.int64)
+        self.extra = np.zeros((0, 3))
+        self.extra_colors = np.zeros((0, 3))
+        self.extra_mask = np.zeros(0, dtype=np.int64)
+        self.cut_ids = {}
+
+    def masks(self, ids):
+        orig = ids < self.nv
+        out = np.empty(ids.shape, dtype=np.int64)
+        out[orig] = self.mask[ids[orig]]
+        out[~orig] = self.extra_mask[ids[~orig] - self.nv]
+        return out
+
+    def mark(self, ids, plane):
+        ids = np.unique(ids)
+        orig = ids < self.nv
+        self.mask[ids[orig]] |= 1 << plane
+        self.extra_mask[ids[~orig] - self.nv] |= 1 << plane
+
+    def positions(self, ids):
+        out = np.empty(ids.shape + (3,))
+        orig = ids < self.nv
+        out[orig] = self.verts[ids[orig]]
+        out[~orig] = self.extra[ids[~orig] - self.nv]
+        return out
+
+    def vertex_colors(self, ids):
+        out = np.empty(ids.shape + (3,))
+        orig = ids < self.nv
+        out[orig] = self.colors[ids[orig]]
+        out[~orig] = self.extra_colors[ids[~orig] - self.nv]
+        return out
+
+    def add(self, pos, colors, mask):
+        first = self.nv + len(self.extra)
+        self.extra = np.concatenate([self.extra, pos])
+        self.extra_mask = np.concatenate([self.extra_mask, np.broadcast_to(np.asarray(mask, dtype=np.int64), len(pos))])
+        if self.colors is not None:
+            self.extra_colors = np.concatenate([self.extra_colors, colors])
+        return np.arange(first, first + len(pos))
+
+    def cut(self, a, b, da, db, pa, pb, plane):
+        """Vertex ids where edges a-b cross the plane; a is the kept endpoint (da <= 0 < db)."""
+        ids = np.where(da == 0, a, -1)  # kept endpoint lies on the plane: reuse it
+        todo = np.nonzero(ids < 0)[0]
+        if len(todo) == 0:
+            return ids
+        keys = list(zip(a[todo].tolist(), b[todo].tolist()))
+        fresh = {}
+        for i, key in zip(todo.tolist(), keys):
+            vid = self.cut_ids.get((plane, key))
+            if vid is None:
+                fresh.setdefault(key, i)
+            else:
+                ids[i] = vid
+        if fresh:
+            rows = np.fromiter(fresh.values(), dtype=np.int64, count=len(fresh))
+            t = (da[rows] / (da[rows] - db[rows]))[:, None]
+            colors = None
+            if self.colors is not None:
+                ca, cb = self.vertex_colors(a[rows]), self.vertex_colors(b[rows])
+                colors = ca + t * (cb - ca)
+            # on this plane, and on any earlier plane that contains the whole edge
+            mask = (1 << plane) | (self.masks(a[rows]) & self.masks(b[rows]))
+            new = self.add(pa[rows] + t * (pb[rows] - pa[rows]), colors, mask)
+            for key, vid in zip(fresh, new.tolist()):
+                self.cut_ids[(plane, key)] = vid
+        for i, key in zip(todo.tolist(), keys):
+            if ids[i] < 0:
+                ids[i] = self.cut_ids[(plane, key)]
+        return ids
+
+    def clip(self, tris, plane, point, normal):
+        """Keeps the part of each triangle with (p - point)·normal <= 0; crossing triangles are split."""
+        P = self.positions(tris)
+        d = (P - point) @ normal
+        d[np.abs(d) <= self.eps] = 0  # on the plane: kept, reused as the cut point, tagged for cap()
+        if (d == 0).any():
+            self.mark(tris[d == 0], plane)
+        inside = d <= 0
+        count = inside.sum(axis=1)
+        out = [tris[count == 3]]
+        for n_in, corner in ((1, np.argmax), (2, np.argmin)):
+            sel = count == n_in
+            if not sel.any():
+                continue
+            # rotate so corner 0 is the lone inside (1) or outside (2) vertex; winding is kept
+            rot = (corner(inside[sel], axis=1)[:, None] + np.arange(3)) % 3
+            rows = np.arange(len(rot))[:, None]
+            T, D, Q = tris[sel][rows, rot], d[sel][rows, rot], P[sel][rows, rot]
+            if n_in == 1:
+                a, b, da, db, pa, pb = T[:, [0, 0]], T[:, [1, 2]], D[:, [0, 0]], D[:, [1, 2]], Q[:, [0, 0]], Q[:, [1, 2]]
+            else:
+                a, b, da, db, pa, pb = T[:, [1, 2]], T[:, [0, 0]], D[:, [1, 2]], D[:, [0, 0]], Q[:, [1, 2]], Q[:, [0, 0]]
+            e = self.cut(a.ravel(), b.ravel(), da.ravel(), db.ravel(),
+                         pa.reshape(-1, 3), pb.reshape(-1, 3), plane).reshape(-1, 2)
+            if n_in == 1:
+                out.append(np.stack([T[:, 0], e[:, 0], e[:, 1]], axis=1))
+            else:
+                out.append(np.stack([e[:, 0], T[:, 1], T[:, 2]], axis=1))
+                out.append(np.stack([e[:, 0], T[:, 2], e[:, 1]], axis=1))
+        tris = np.concatenate(out)
+        # a vertex lying on the plane collapses some pieces to zero area
+        degenerate = (tris[:, 0] == tris[:, 1]) | (tris[:, 1] == tris[:, 2]) | (tris[:, 0] == tris[:, 2])
+        return tris[~degenerate]
+
+    def on_plane(self, plane):
+        """Which vertex ids lie on the plane, by the bitmask kept through clip() and cut()."""
+        return (np.concatenate([self.mask, self.extra_mask]) >> plane) & 1 == 1
+
+    def cap(self, tris, plane):
+        """Closes the cut on one plane: a fan from the centre of each boundary loop lying on it."""
+        on = self.on_plane(plane)
+        cand = tris[on[tris].sum(axis=1) >= 2]
+        edges = np.concatenate([cand[:, [0, 1]], cand[:, [1, 2]], cand[:, [2, 0]]])
+        edges = edges[on[edges].all(axis=1)]
+        directed = set(map(tuple, edges.tolist()))
+        boundary = [(a, b) for a, b in directed if (b, a) not in directed]
+        if not boundary:
+            return np.zeros((0, 3), dtype=np.int64)
+
+        # loops = connected components of the boundary edges (union-find on vertex ids)
+        parent = {}
+        def find(v):
+            while parent.setdefault(v, v) != v:
+                parent[v] = parent[parent[v]]
+                v = parent[v]
+            return v
+        for a, b in boundary:
+            parent[find(a)] = find(b)
+        loops = {}
+        for a, b in boundary:
+            loops.setdefault(find(a), []).append((a, b))
+
+        caps = []
+        for loop in loops.values():
+            ids = np.unique(np.array(loop).ravel())
+            centre = self.positions(ids).mean(axis=0, keepdims=True)
+            colors = self.vertex_colors(ids).mean(axis=0, keepdims=True) if self.colors is not None else None
+            c = self.add(centre, colors, 0)[0]
+            # reversed boundary edge keeps the cap's winding consistent with the kept surface
+            caps += [(b, a, c) for a, b in loop]
+        return np.array(caps, dtype=np.int64)
+
+    def build(self, tris):
+        """Mesh from the kept triangles; vertex ids are compacted with an O(n) remap, no sort."""
+        if len(tris) == 0:
+            return o3d.geometry.TriangleMesh()
+        used = np.zeros(self.nv + len(self.extra), dtype=bool)
+        used[tris.ravel()] = True
+        remap = np.cumsum(used) - 1
+
+        new_mesh = o3d.geometry.TriangleMesh()
+        new_mesh.vertices = o3d.utility.Vector3dVector(
+            np.concatenate([self.verts[used[:self.nv]], self.extra[used[self.nv:]]]))
+        new_mesh.triangles = o3d.utility.Vector3iVector(remap[tris].astype(np.int32))
+        if self.colors is not None:
+            new_mesh.vertex_colors = o3d.utility.Vector3dVector(
+                np.concatenate([self.colors[used[:self.nv]], self.extra_colors[used[self.nv:]]]))
+        new_mesh.compute_vertex_normals()
+        return new_mesh
+
+def clip_mesh_planes(mesh, planes, cap=False, chunk=CLIP_CHUNK):
+    """Keeps the part of the mesh where (p - point)·normal <= 0 for every (point, normal) in planes.
+
+    One pass over the triangles in chunks, each chunk clipped by all planes; crossing triangles
+    are split exactly at the plane. cap closes each cut with a centre fan (exact for convex sections).
+    """
+    planes = [(np.asarray(p, dtype=float), np.asarray(n, dtype=float)) for p, n in planes]
+    if len(planes) > 63:
+        raise ValueError("at most 63 planes per pass (one bit each in the on-plane mask)")
+    clipper = MeshClipper(mesh)
+    tris = np.asarray(mesh.triangles)
+    kept = []
+    for start in range(0, len(tris), chunk):
+        part = tris[start:start + chunk].astype(np.int64)
+        for k, (point, normal) in enumerate(planes):
+            if len(part) == 0:
+                break
+            part = clipper.clip(part, k, point, normal)
+        kept.append(part)
+    kept = np.concatenate(kept) if kept else np.zeros((0, 3), dtype=np.int64)
+    if cap and len(kept):
+        kept = np.concatenate([kept] + [clipper.cap(kept, k) for k in range(len(planes))])
+    return clipper.build(kept)
+
+def clip_mesh(mesh, point, normal, keep_left=True, cap=False, chunk=CLIP_CHUNK):
+    normal = np.asarray(normal, dtype=float)
+    return clip_mesh_planes(mesh, [(point, normal if keep_left else -normal)], cap=cap, chunk=chunk)
+
+# STAGE CACHE
+# Each stage's output is stored under a hash of the input file plus every parameter it depends
+# on (including the parent stage's key), so changing --axis/--keep reuses everything up to clip.
+CACHE_DIR = '.cache/assn5'
+CACHE_MAX_MB = 2048
+CACHE_VERSION = 1  # bump when a cached stage changes what it computes
+SAMPLE_POINTS = 50000
+POISSON_DEPTH = 9
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+class StageCache:
+    """Stage outputs as .npz files, evicted least-recently-read first once over max_mb."""
+
+    def __init__(self, cache_dir=CACHE_DIR, max_mb=CACHE_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps([CACHE_VERSION, *parts]).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path) as z:
+                arrays = {k: z[k] for k in z.files}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zipfile.BadZipFile):
+            return None  # truncated or foreign file: recompute and overwrite
+        try:
+            os.utime(path)  # mtime = last read, eviction goes by it
+        except FileNotFoundError:
+            pass  # evicted by another worker meanwhile; the arrays are already loaded
+        return arrays
+
+    def put(self, key, arrays):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:  # a file object, so np.savez doesn't append .npz
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npz'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(e[1] for e in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+def mesh_to_arrays(mesh):
+    arrays = {"vertices": np.asarray(mesh.vertices), "triangles": np.asarray(mesh.triangles)}
+    if mesh.has_vertex_normals():
+        arrays["normals"] = np.asarray(mesh.vertex_normals)
     if mesh.has_vertex_colors():
-        new_mesh.vertex_colors = o3d.utility.Vector3dVector(np.asarray(mesh.vertex_colors)[uniq])
-    new_mesh.compute_vertex_normals()
-    return new_mesh
-
-# MAIN
-def main():
-    parser = argparse.ArgumentParser(description="Hollow Knight PLY Pipeline")
-    parser.add_argument('--model', type=str, default='hollow_knight_clean.ply',
-                        help='Path to .ply file')
-    parser.add_argument('--voxel_size', type=float, default=0.0,
-                        help='Voxel size (0 = auto)')
-    parser.add_argument('--axis', type=str, default='y', choices=['x','y','z'],
-                        help='Clip & gradient axis')
-    parser.add_argument('--keep', type=str, default='left', choices=['left','right'],
-                        help='Side to keep after clip')
-    parser.add_argument('--headless', action='store_true',
-                        help='No visualization windows')
-    parser.add_argument('--output', type=str, default='output_ply',
-                        help='Output folder')
-    args = parser.parse_args()
+        arrays["colors"] = np.asarray(mesh.vertex_colors)
+    return arrays
+
+def arrays_to_mesh(a):
+    mesh = o3d.geometry.TriangleMesh()
+    mesh.vertices = o3d.utility.Vector3dVector(a["vertices"])
+    mesh.triangles = o3d.utility.Vector3iVector(a["triangles"])
+    if "normals" in a:
+        mesh.vertex_normals = o3d.utility.Vector3dVector(a["normals"])
+    if "colors" in a:
+        mesh.vertex_colors = o3d.utility.Vector3dVector(a["colors"])
+    return mesh
 
-    os.makedirs(args.output, exist_ok=True)
+def pcd_to_arrays(pcd):
+    arrays = {"points": np.asarray(pcd.points)}
+    if pcd.has_normals():
+        arrays["normals"] = np.asarray(pcd.normals)
+    if pcd.has_colors():
+        arrays["colors"] = np.asarray(pcd.colors)
+    return arrays
+
+def arrays_to_pcd(a):
+    pcd = o3d.geometry.PointCloud(o3d.utility.Vector3dVector(a["points"]))
+    if "normals" in a:
+        pcd.normals = o3d.utility.Vector3dVector(a["normals"])
+    if "colors" in a:
+        pcd.colors = o3d.utility.Vector3dVector(a["colors"])
+    return pcd
+
+def voxels_to_arrays(vg):
+    voxels = vg.get_voxels()
+    return {"origin": np.asarray(vg.origin), "voxel_size": np.array(vg.voxel_size),
+            "grid_index": np.array([v.grid_index for v in voxels], dtype=np.int32).reshape(-1, 3),
+            "colors": np.array([v.color for v in voxels], dtype=np.float64).reshape(-1, 3)}
+
+def arrays_to_voxels(a):
+    vg = o3d.geometry.VoxelGrid()
+    vg.origin = a["origin"]
+    vg.voxel_size = float(a["voxel_size"])
+    for idx, color in zip(a["grid_index"], a["colors"]):
+        vg.add_voxel(o3d.geometry.Voxel(idx, color))
+    return vg
+
+def cached_stage(cache, key, name, timings, hits, compute, save, restore):
+    """Runs a pipeline stage through the cache (cache=None: always compute); timed as `name`."""
+    with stage(timings, name):
+        arrays = cache.get(key) if cache else None
+        if arrays is not None:
+            hits[name] = True
+            print(f"  [cache] {name}: hit")
+            return restore(arrays)
+        obj = compute()
+        if cache:
+            cache.put(key, save(obj))
+        hits[name] = False
+        return obj
+
+# LOD & BUDGET
+LOD_MIN_TRIANGLES = 500
+POINT_BYTES = 200  # per sample: point, normal and the KNN scratch of estimate_normals
+POISSON_BYTES_DEPTH9 = 400 * 1024 * 1024  # rough Poisson peak at depth 9; ~4x per extra level
+POISSON_DEPTHS = range(6, 13)
+
+def parse_lods(text):
+    """'1,0.25,0.05' -> [1.0, 0.25, 0.05]: fractions of the triangle count, finest first, 1.0 always included."""
+    ratios = {1.0}
+    for part in text.split(','):
+        r = float(part)
+        if not 0 < r <= 1:
+            raise ValueError(f"LOD ratio must be in (0, 1]: {part}")
+        ratios.add(r)
+    return sorted(ratios, reverse=True)
+
+def decimate(mesh, ratio):
+    if ratio >= 1.0:
+        return mesh
+    target = max(LOD_MIN_TRIANGLES, int(len(mesh.triangles) * ratio))
+    lod = mesh.simplify_quadric_decimation(target_number_of_triangles=target)
+    lod.compute_vertex_normals()
+    return lod
+
+def budget_params(mesh, budget_mb):
+    """Sample count and Poisson depth that fit in budget_mb (0 = the fixed 50k points / depth 9).
+
+    A quarter of the budget goes to the point cloud, capped at 4 samples per mesh vertex, since
+    denser sampling adds no detail; the rest bounds the Poisson octree. Depth is also capped by
+    the point count: an octree much finer than the samples only reconstructs noise.
+    """
+    if budget_mb <= 0:
+        return SAMPLE_POINTS, POISSON_DEPTH
+    budget = budget_mb * 1024 * 1024
+    points = int(np.clip(min(budget / 4 / POINT_BYTES, 4 * len(mesh.vertices)), 5000, 5_000_000))
+    max_depth = np.log(points) / np.log(4) + 1.5
+    depth = POISSON_DEPTHS[0]
+    for d in POISSON_DEPTHS:
+        if POISSON_BYTES_DEPTH9 * 4.0 ** (d - 9) <= budget * 0.75 and d <= max_depth:
+            depth = d
+    return points, depth
+
+# TIMING
+@contextmanager
+def stage(timings, name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round(time.perf_counter() - t0, 4)
+
+def mesh_counts(mesh):
+    return {"vertices": len(mesh.vertices), "triangles": len(mesh.triangles)}
+
+# PIPELINE
+def process_model(model, output, voxel_size=0.0, axis='y', keep='left', headless=False, cull=True, cap=False,
+                  use_cache=True, cache_dir=CACHE_DIR, cache_max_mb=CACHE_MAX_MB, lods=None, budget_mb=0):
+    """Runs the whole pipeline for one PLY; returns counts and per-stage timings for the manifest."""
+    os.makedirs(output, exist_ok=True)
+    timings, hits = {}, {}
+    result = {"model": model, "output": output, "timings": timings, "cache_hits": hits}
+    cache = StageCache(cache_dir, cache_max_mb) if use_cache else None
 
     print("Hollow Knight PLY Pipeline")
-    print(f"Model: {args.model}")
-    print(f"Axis: {args.axis.upper()} | Keep: {args.keep}")
+    print(f"Model: {model}")
+    print(f"Axis: {axis.upper()} | Keep: {keep}")
 
     # Load
-    mesh = load_mesh_ply(args.model)
-    mesh = auto_scale_and_orient(mesh)
+    key = None
+    if cache:
+        require_file(model)
+        with stage(timings, "hash"):
+            key = StageCache.key(file_digest(model))
+    key = key and StageCache.key(key, "clean", 1.8, False)
+    mesh = cached_stage(cache, key, "clean", timings, hits,
+                        lambda: auto_scale_and_orient(load_mesh_ply(model)), mesh_to_arrays, arrays_to_mesh)
+    result["original"] = mesh_counts(mesh)
 
     bbox = mesh.get_axis_aligned_bounding_box()
     center = bbox.get_center()
     diag = np.linalg.norm(bbox.get_extent())
-    voxel_size = args.voxel_size if args.voxel_size > 0 else diag / 120
+    voxel_size = voxel_size if voxel_size > 0 else diag / 120
+    result["voxel_size"] = voxel_size
     print(f"  Voxel size: {voxel_size:.4f}")
 
-    axis_idx = {'x':0, 'y':1, 'z':2}[args.axis]
+    axis_idx = {'x':0, 'y':1, 'z':2}[axis]
     normal = np.zeros(3); normal[axis_idx] = 1.0
 
+    n_points, poisson_depth = budget_params(mesh, budget_mb)
+    result["sample_points"], result["poisson_depth"] = n_points, poisson_depth
+    print(f"  Samples: {n_points:,} | Poisson depth: {poisson_depth}")
+
+    # LOD chain; the coarsest level drives previews and the gradient/extrema step
+    lod_meshes = []
+    for i, ratio in enumerate(lods or []):
+        lod_key = key and StageCache.key(key, "lod", ratio, LOD_MIN_TRIANGLES)
+        lod = mesh if ratio >= 1.0 else cached_stage(
+            cache, lod_key, f"lod{i}", timings, hits, lambda r=ratio: decimate(mesh, r), mesh_to_arrays, arrays_to_mesh)
+        lod_meshes.append((ratio, lod))
+        print(f"  LOD{i} ({ratio:.0%}): {len(lod.triangles):,} triangles")
+    preview = lod_meshes[-1][1] if lod_meshes else mesh
+
     # 1. Original
-    if not args.headless:
-        o3d.visualization.draw_geometries([mesh], window_name="1. Original")
+    if not headless:
+        o3d.visualization.draw_geometries([preview], window_name="1. Original")
 
     # 2. Point Cloud
-    pcd = mesh.sample_points_uniformly(50000)
-    pcd.estimate_normals()
-    if not args.headless:
+    def sample():
+        pcd = mesh.sample_points_uniformly(n_points)
+        pcd.estimate_normals()
+        return pcd
+    pcd_key = key and StageCache.key(key, "sample", n_points)
+    pcd = cached_stage(cache, pcd_key, "sample", timings, hits, sample, pcd_to_arrays, arrays_to_pcd)
+    result["points"] = len(pcd.points)
+    if not headless:
         o3d.visualization.draw_geometries([pcd], window_name="2. Point Cloud")
     print_pcd_info(pcd)
 
     # 3. Poisson
-    poisson, _ = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(pcd, depth=9)
-    poisson = poisson.crop(bbox.scale(1.1, center))
-    poisson.compute_vertex_normals()
-    if not args.headless:
+    def reconstruct():
+        poisson, _ = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(pcd, depth=poisson_depth)
+        # scale() works in place, so crop with a copy and leave bbox for the cutting plane
+        poisson = poisson.crop(mesh.get_axis_aligned_bounding_box().scale(1.1, center))
+        poisson.compute_vertex_normals()
+        return poisson
+    poisson_key = pcd_key and StageCache.key(pcd_key, "poisson", poisson_depth, 1.1)
+    poisson = cached_stage(cache, poisson_key, "poisson", timings, hits, reconstruct, mesh_to_arrays, arrays_to_mesh)
+    result["poisson"] = mesh_counts(poisson)
+    if not headless:
         o3d.visualization.draw_geometries([poisson], window_name="3. Poisson")
     print_mesh_info(poisson, "Poisson")
 
     # 4. Voxel Art
-    vg = o3d.geometry.VoxelGrid.create_from_point_cloud(pcd, voxel_size)
+    vg_key = pcd_key and StageCache.key(pcd_key, "voxelize", voxel_size)
+    vg = cached_stage(cache, vg_key, "voxelize", timings, hits,
+                      lambda: o3d.geometry.VoxelGrid.create_from_point_cloud(pcd, voxel_size),
+                      voxels_to_arrays, arrays_to_voxels)
     voxels = vg.get_voxels()
-    max_show = 3000
-    show_voxels = random.sample(voxels, min(len(voxels), max_show)) if len(voxels) > max_show else voxels
-    vox_meshes = []
-    for i, v in enumerate(show_voxels):
-        c = np.asarray(vg.get_voxel_center_coordinate(v.grid_index))
-        cube = o3d.geometry.TriangleMesh.create_box(voxel_size, voxel_size, voxel_size)
-        cube.translate(c - voxel_size/2)
-        cube.compute_vertex_normals()
-        intensity = 0.3 + 0.7 * (i % 5)/4
-        cube.paint_uniform_color([intensity*0.3, intensity*0.1, intensity*0.2])
-        vox_meshes.append(cube)
-    if not args.headless and vox_meshes:
-        o3d.visualization.draw_geometries(vox_meshes, window_name="4. Voxel Art")
+    result["voxels"] = len(voxels)
+    with stage(timings, "voxel_mesh"):
+        vox_mesh = voxel_mesh(vg, voxel_palette(len(voxels)), cull=cull)
+    result["voxel_mesh"] = mesh_counts(vox_mesh)
+    if not headless and not vox_mesh.is_empty():
+        o3d.visualization.draw_geometries([vox_mesh], window_name="4. Voxel Art")
     print_voxel_info(vg)
+    print_mesh_info(vox_mesh, "Voxel Mesh")
 
     # 5. Dynamic Cutting Plane
-    axis_idx = {'x': 0, 'y': 1, 'z': 2}[args.axis]
-    extents = bbox.get_extent()
+    if not headless:
+        extents = bbox.get_extent()
 
-    # Thin in cutting direction, large in others
-    width = 0.005 if axis_idx == 0 else extents[0] * 1.5
-    height = 0.005 if axis_idx == 1 else extents[1] * 1.5
-    depth = 0.005 if axis_idx == 2 else extents[2] * 1.5
+        # Thin in cutting direction, large in others
+        width = 0.005 if axis_idx == 0 else extents[0] * 1.5
+        height = 0.005 if axis_idx == 1 else extents[1] * 1.5
+        depth = 0.005 if axis_idx == 2 else extents[2] * 1.5
 
-    plane = o3d.geometry.TriangleMesh.create_box(width, height, depth)
-    plane.paint_uniform_color([0.9, 0.1, 0.1])  # Red
-    plane.compute_vertex_normals()
+        plane = o3d.geometry.TriangleMesh.create_box(width, height, depth)
+        plane.paint_uniform_color([0.9, 0.1, 0.1])  # Red
+        plane.compute_vertex_normals()
 
-    # Position at center
-    plane_center_offset = np.array([width, height, depth]) / 2
-    plane.translate(center - plane_center_offset)
+        # Position at center
+        plane_center_offset = np.array([width, height, depth]) / 2
+        plane.translate(center - plane_center_offset)
 
-    if not args.headless:
-        o3d.visualization.draw_geometries([mesh, plane], window_name="5. With Cutting Plane")
+        o3d.visualization.draw_geometries([preview, plane], window_name="5. With Cutting Plane")
 
     # 6. Clip
-    clipped = clip_mesh(mesh, center, normal, keep_left=args.keep=='left')
+    with stage(timings, "clip"):
+        clipped = clip_mesh(mesh, center, normal, keep_left=keep=='left', cap=cap)
     if clipped.is_empty():
         print("Warning: Clipping removed everything!")
         clipped = mesh
-    if not args.headless:
+    result["clipped"] = mesh_counts(clipped)
+    if not headless:
         o3d.visualization.draw_geometries([clipped], window_name="6. Clipped")
     print_mesh_info(clipped, "Clipped")
 
     # 7. Final Gradient
-    final = clipped.crop(clipped.get_axis_aligned_bounding_box())
-    final.vertex_colors = o3d.utility.Vector3dVector(np.zeros((len(final.vertices), 3)))
-    apply_gradient(final, axis_idx)
-    p_min, p_max, s_min, s_max = highlight_extrema(final, axis_idx, voxel_size*2)
-    print(f"  Min point ({args.axis}): {p_min}")
-    print(f"  Max point ({args.axis}): {p_max}")
-    if not args.headless:
+    with stage(timings, "gradient"):
+        base = clipped
+        if preview is not mesh:
+            base = clip_mesh(preview, center, normal, keep_left=keep=='left', cap=cap)
+            base = clipped if base.is_empty() else base
+        final = base.crop(base.get_axis_aligned_bounding_box())
+        final.vertex_colors = o3d.utility.Vector3dVector(np.zeros((len(final.vertices), 3)))
+        apply_gradient(final, axis_idx)
+        p_min, p_max, s_min, s_max = highlight_extrema(final, axis_idx, voxel_size*2)
+    result["final"] = mesh_counts(final)
+    result["extrema"] = {"min": p_min.tolist(), "max": p_max.tolist()}
+    print(f"  Min point ({axis}): {p_min}")
+    print(f"  Max point ({axis}): {p_max}")
+    if not headless:
         o3d.visualization.draw_geometries([final, s_min, s_max], window_name="7. Final Gradient")
 
     # Save all
-    o3d.io.write_triangle_mesh(f"{args.output}/01_original.ply", mesh)
-    o3d.io.write_triangle_mesh(f"{args.output}/03_poisson.ply", poisson)
-    o3d.io.write_triangle_mesh(f"{args.output}/06_clipped.ply", clipped)
-    o3d.io.write_triangle_mesh(f"{args.output}/07_final.ply", final)
-    o3d.io.write_point_cloud(f"{args.output}/02_pcd.ply", pcd)
-    print(f"\nAll files saved to: {args.output}/")
+    with stage(timings, "write"):
+        o3d.io.write_triangle_mesh(f"{output}/01_original.ply", mesh)
+        o3d.io.write_triangle_mesh(f"{output}/03_poisson.ply", poisson)
+        o3d.io.write_triangle_mesh(f"{output}/04_voxels.ply", vox_mesh)
+        o3d.io.write_triangle_mesh(f"{output}/06_clipped.ply", clipped)
+        o3d.io.write_triangle_mesh(f"{output}/07_final.ply", final)
+        o3d.io.write_point_cloud(f"{output}/02_pcd.ply", pcd)
+        if lod_meshes:
+            # index for viewers: pick the cheapest level that is good enough
+            index = []
+            for i, (ratio, lod) in enumerate(lod_meshes):
+                name = f"01_original_lod{i}.ply"
+                o3d.io.write_triangle_mesh(f"{output}/{name}", lod)
+                index.append({"level": i, "ratio": ratio, "file": name, **mesh_counts(lod)})
+            with open(f"{output}/lods.json", "w", encoding="utf-8") as f:
+                json.dump(index, f, indent=2)
+            result["lods"] = index
+    print(f"\nAll files saved to: {output}/")
+    return result
+
+# BATCH
+def find_models(pattern):
+    """A directory means every *.ply in it; anything else is a glob."""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.ply")
+    return sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+
+def output_dirs(models, output):
+    """One folder per model, named after the file; same names from different dirs get a suffix."""
+    seen, dirs = {}, []
+    for m in models:
+        stem = os.path.splitext(os.path.basename(m))[0]
+        n = seen.get(stem, 0)
+        seen[stem] = n + 1
+        dirs.append(os.path.join(output, stem if n == 0 else f"{stem}_{n}"))
+    return dirs
+
+def run_one(model, output, params):
+    """Worker entry point: a bad model becomes a failed manifest entry instead of killing the batch."""
+    t0 = time.perf_counter()
+    try:
+        result = process_model(model, output, headless=True, **params)
+        result["status"] = "ok"
+    except Exception as e:
+        result = {"model": model, "output": output, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+    result["seconds"] = round(time.perf_counter() - t0, 4)
+    return result
+
+def failed_result(model, output, error, seconds=0.0):
+    return {"model": model, "output": output, "status": "failed", "error": error, "seconds": round(seconds, 4)}
+
+def pool(workers):
+    # spawn, not fork: open3d's thread pools don't survive fork reliably
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+
+def run_isolated(model, output, params):
+    """One model in its own single-process pool: if the worker dies, it was this model."""
+    t0 = time.perf_counter()
+    with pool(1) as ex:
+        try:
+            return ex.submit(run_one, model, output, params).result()
+        except BrokenProcessPool:
+            return failed_result(model, output, "worker process died (native crash or OOM kill)",
+                                 time.perf_counter() - t0)
+
+def run_batch(pattern, output, workers, params):
+    models = find_models(pattern)
+    if not models:
+        print(f"ERROR: No .ply files match: {pattern}")
+        return 1
+    os.makedirs(output, exist_ok=True)
+    workers = max(1, min(workers, len(models)))
+    print(f"Batch: {len(models)} model(s), {workers} worker(s)")
+
+    jobs = list(zip(models, output_dirs(models, output)))
+    results = {}
+
+    def record(i, r):
+        results[i] = r
+        status = "ok" if r["status"] == "ok" else f"FAILED ({r['error']})"
+        print(f"[{len(results)}/{len(models)}] {r['model']}: {status}, {r['seconds']:.1f}s")
+
+    t0 = time.perf_counter()
+    path = os.path.join(output, "manifest.json")
+    try:
+        orphaned = []
+        with pool(workers) as ex:
+            futures = {ex.submit(run_one, m, d, params): i for i, (m, d) in enumerate(jobs)}
+            for f in as_completed(futures):
+                i = futures[f]
+                try:
+                    record(i, f.result())
+                except BrokenProcessPool:
+                    orphaned.append(i)  # the pool died: this model may or may not be the culprit
+                except Exception as e:
+                    record(i, failed_result(*jobs[i], f"{type(e).__name__}: {e}"))
+        if orphaned:
+            # a worker died in native code; rerun the unfinished models one per process to find the bad one
+            print(f"Worker pool died, re-running {len(orphaned)} unfinished model(s) one at a time")
+            for i in sorted(orphaned):
+                record(i, run_isolated(*jobs[i], params))
+    finally:
+        # also after Ctrl+C or an unexpected error: whatever finished is in the manifest
+        done = [results[i] for i in sorted(results)]
+        missing = [{"model": m, "output": d, "status": "not run"} for i, (m, d) in enumerate(jobs) if i not in results]
+        failed = [r for r in done if r["status"] != "ok"]
+        manifest = {"pattern": pattern, "workers": workers, "params": params,
+                    "seconds": round(time.perf_counter() - t0, 4),
+                    "models": len(models), "failed": len(failed), "not_run": len(missing),
+                    "results": done + missing}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+    print(f"\nBatch done: {len(done) - len(failed)} ok, {len(failed)} failed in {manifest['seconds']:.1f}s")
+    print(f"Manifest: {path}")
+    return 1 if failed else 0
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(description="Hollow Knight PLY Pipeline")
+    parser.add_argument('--model', type=str, default='hollow_knight_clean.ply',
+                        help='Path to .ply file')
+    parser.add_argument('--batch', type=str, default=None,
+                        help='Directory or glob of .ply files to process in parallel (implies --headless)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Processes for --batch (default: number of cores)')
+    parser.add_argument('--voxel_size', type=float, default=0.0,
+                        help='Voxel size (0 = auto)')
+    parser.add_argument('--no_cull', action='store_true',
+                        help='Keep voxel faces hidden between neighbours (default: outer shell only)')
+    parser.add_argument('--axis', type=str, default='y', choices=['x','y','z'],
+                        help='Clip & gradient axis')
+    parser.add_argument('--keep', type=str, default='left', choices=['left','right'],
+                        help='Side to keep after clip')
+    parser.add_argument('--cap', action='store_true',
+                        help='Close the cut with a cap face')
+    parser.add_argument('--headless', action='store_true',
+                        help='No visualization windows')
+    parser.add_argument('--output', type=str, default='output_ply',
+                        help='Output folder (with --batch: one subfolder per model + manifest.json)')
+    parser.add_argument('--lod', type=str, default=None,
+                        help='LOD ratios, e.g. 1,0.25,0.05: writes a decimated chain, previews/gradient use the coarsest')
+    parser.add_argument('--budget_mb', type=int, default=0,
+                        help='Memory budget for sampling + Poisson; picks sample count and depth (0 = 50k / depth 9)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Recompute every stage, do not read or write the stage cache')
+    parser.add_argument('--cache_dir', type=str, default=CACHE_DIR,
+                        help='Stage cache folder (cleaned mesh, point cloud, Poisson, voxels)')
+    parser.add_argument('--cache_max_mb', type=int, default=CACHE_MAX_MB,
+                        help='Stage cache size cap; least recently used entries go first')
+    args = parser.parse_args()
+    try:
+        lods = parse_lods(args.lod) if args.lod else None
+    except ValueError as e:
+        parser.error(f"--lod: {e}")
+
+    params = dict(voxel_size=args.voxel_size, axis=args.axis, keep=args.keep, cull=not args.no_cull, cap=args.cap,
+                  use_cache=not args.no_cache, cache_dir=args.cache_dir, cache_max_mb=args.cache_max_mb,
+                  lods=lods, budget_mb=args.budget_mb)
+    if args.batch:
+        sys.exit(run_batch(args.batch, args.output, args.workers, params))
+
+    try:
+        process_model(args.model, args.output, headless=args.headless, **params)
+    except FileNotFoundError:
+        sys.exit(1)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
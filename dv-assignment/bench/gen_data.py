@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""Детерминированный генератор 11 CSV в формате дампа Crunchbase для бенчмарков.
+
+Пропорции таблиц и типов объектов — как в исходном дампе; ссылки на объекты с перекосом
+(немногие инвесторы и компании собирают большую часть сделок), страны и типы раундов —
+со смещёнными весами, суммы — логнормальные. id — с префиксом (c:123, f:45, p:6),
+в ссылках бывают крайние пробелы и NBSP, как в реальных файлах.
+
+entity_id объекта совпадает с его id без шума: загрузчик проверяет ссылки как
+k.entity_id = btrim(ref), так что ссылки с пробелами находятся, а с NBSP — уходят в отбраковку.
+
+Одинаковые --seed и --scale дают побайтно одинаковые файлы: каждый кусок в CHUNK строк
+генерируется своим ГСЧ от (seed, файл, номер куска).
+
+    python dv-assignment/bench/gen_data.py --scale 100k --out dv-assignment/bench/data/100k
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "loader"))
+from load_cb import STEPS  # noqa: E402
+
+GEN_VERSION = 1
+CHUNK = 250_000
+MANIFEST = "_gen.json"
+
+# (entity_type, префикс id, доля среди objects)
+OBJECT_TYPES = [("Company", "c", 0.42), ("Person", "p", 0.49), ("FinancialOrg", "f", 0.025), ("Product", "r", 0.065)]
+COMPANY, PERSON, FINORG, PRODUCT = range(4)
+PREFIX = np.array([t[1] for t in OBJECT_TYPES])
+
+# строк на один объект; people — ровно по одной на Person
+RATIOS = {
+    "offices.csv": 0.24, "degrees.csv": 0.24, "milestones.csv": 0.087, "funds.csv": 0.0033,
+    "funding_rounds.csv": 0.114, "investments.csv": 0.173, "acquisitions.csv": 0.0206,
+    "ipos.csv": 0.0027, "relationships.csv": 0.87,
+}
+ROWS_PER_OBJECT = 1 + OBJECT_TYPES[PERSON][2] + sum(RATIOS.values())
+
+COUNTRIES = ["USA", "GBR", "CAN", "IND", "DEU", "FRA", "ISR", "CHN", "AUS", "ESP", "NLD", "SWE", "IRL",
+             "SGP", "BRA", "JPN", "RUS", "CHE", "ITA", "FIN"]
+COUNTRY_P = np.array([62, 6, 3.5, 3, 2.5, 2.5, 2, 2, 1.5, 1.2, 1, 1, 0.9, 0.8, 0.8, 0.7, 0.6, 0.6, 0.6, 0.5])
+ROUND_TYPES = ["venture", "angel", "series-a", "series-b", "series-c+", "private-equity",
+               "crowdfunding", "post-ipo", "other"]
+ROUND_TYPE_P = np.array([30, 20, 17, 10, 7, 5, 4, 2, 5])
+CATEGORIES = ["software", "web", "mobile", "enterprise", "ecommerce", "biotech", "advertising",
+              "games_video", "hardware", "cleantech", "network_hosting", "finance", "health", "other"]
+CATEGORY_P = np.array([16, 14, 8, 7, 6, 6, 5, 5, 4, 4, 4, 3, 3, 15])
+STATUSES = ["operating", "acquired", "closed", "ipo"]
+STATUS_P = np.array([85, 8, 5, 2])
+
+
+def parse_scale(s: str) -> int:
+    """'10k' -> 10_000, '50M' -> 50_000_000."""
+    m = re.fullmatch(r"(\d+(?:\.\d+)?)([kKmM]?)", s.strip())
+    if not m:
+        raise argparse.ArgumentTypeError(f"bad scale: {s!r}")
+    mult = {"": 1, "k": 1_000, "m": 1_000_000}[m.group(2).lower()]
+    return int(float(m.group(1)) * mult)
+
+
+def stage_columns() -> dict[str, list[str]]:
+    """csv -> колонки в порядке staging-таблицы загрузчика (COPY ... HEADER берёт их по позиции)."""
+    return {csv_file: re.findall(r"(\w+) TEXT", create) for _, _, create, _, csv_file, _ in STEPS}
+
+
+def _p(weights):
+    return weights / weights.sum()
+
+
+def skewed(rng, n: int, size: int, power: float = 3.0) -> np.ndarray:
+    """Индексы 0..n-1 с перекосом к началу: чем больше power, тем сильнее."""
+    return np.minimum((n * rng.random(size) ** power).astype(np.int64), n - 1)
+
+
+def ids(types: np.ndarray, idx: np.ndarray) -> pd.Series:
+    return pd.Series(PREFIX[types[idx]]) + ":" + pd.Series(idx + 1).astype(str)
+
+
+def noisy(rng, s: pd.Series, rate: float = 0.01) -> pd.Series:
+    """Крайние пробелы (70%) и NBSP (30%) в доле `rate` значений."""
+    s = s.copy()
+    u = rng.random(len(s))
+    space, nbsp = u < rate * 0.7, (u >= rate * 0.7) & (u < rate)
+    s[space] = " " + s[space] + " "
+    s[nbsp] = s[nbsp] + "\u00a0"
+    return s
+
+
+def dates(rng, size: int, lo: int = 1995, hi: int = 2014, empty: float = 0.0) -> np.ndarray:
+    """YYYY-MM-DD, годы ближе к `hi` чаще (как рост рынка в дампе); доля `empty` — пустые."""
+    years = np.arange(lo, hi + 1)
+    y = rng.choice(years, size, p=_p((years - lo + 1.0) ** 2))
+    d = (y - 1970).astype("datetime64[Y]").astype("datetime64[D]") + rng.integers(0, 365, size)
+    out = d.astype(str).astype(object)
+    out[rng.random(size) < empty] = ""
+    return out
+
+
+def timestamps(rng, size: int) -> np.ndarray:
+    t = dates(rng, size, 2007, 2014).astype("datetime64[s]") + rng.integers(0, 86_400, size)
+    return np.char.replace(t.astype(str), "T", " ")
+
+
+def amounts(rng, size: int, median: float = 2e6, sigma: float = 1.5, empty: float = 0.0) -> np.ndarray:
+    a = np.round(rng.lognormal(np.log(median), sigma, size), -3).astype(np.int64).astype(str).astype(object)
+    a[rng.random(size) < empty] = ""
+    return a
+
+
+def pick(rng, values, p, size: int, empty: float = 0.0) -> np.ndarray:
+    out = np.asarray(values, dtype=object)[rng.choice(len(values), size, p=_p(p))]
+    out[rng.random(size) < empty] = ""
+    return out
+
+
+class World:
+    """Общие для всех файлов массивы: типы объектов, пулы по типам, компания каждого раунда."""
+
+    def __init__(self, scale: int, seed: int):
+        self.n_objects = max(1_000, int(scale / ROWS_PER_OBJECT))
+        self.rows = {"objects.csv": self.n_objects}
+        rng = np.random.default_rng([seed, 0])
+        self.types = rng.choice(len(OBJECT_TYPES), self.n_objects, p=[t[2] for t in OBJECT_TYPES]).astype(np.int8)
+        self.pool = {t: np.flatnonzero(self.types == t) for t in range(len(OBJECT_TYPES))}
+        self.rows["people.csv"] = len(self.pool[PERSON])
+        for f, r in RATIOS.items():
+            self.rows[f] = max(10, int(self.n_objects * r))
+        self.round_company = self.pool[COMPANY][
+            skewed(rng, len(self.pool[COMPANY]), self.rows["funding_rounds.csv"], 2.0)]
+
+    def investors(self, rng, size: int) -> np.ndarray:
+        """Инвесторы: фонды 60%, люди 25%, компании 15%; внутри пула — сильный перекос."""
+        kind = rng.choice([FINORG, PERSON, COMPANY], size, p=[0.6, 0.25, 0.15])
+        out = np.empty(size, dtype=np.int64)
+        for k in (FINORG, PERSON, COMPANY):
+            m = kind == k
+            out[m] = self.pool[k][skewed(rng, len(self.pool[k]), int(m.sum()), 4.0)]
+        return out
+
+
+# ---- генераторы кусков: (rng, w, start, stop) -> {колонка: значения}; прочие колонки пустые
+
+def gen_objects(rng, w, start, stop):
+    n = stop - start
+    idx = np.arange(start, stop)
+    types = w.types[idx]
+    clean = ids(w.types, idx)
+    kind = np.array([t[0] for t in OBJECT_TYPES], dtype=object)[types]
+    name = pd.Series(kind) + " " + pd.Series(idx + 1).astype(str)
+    name[rng.random(n) < 0.02] = ""
+    is_company = types == COMPANY
+    country = pick(rng, COUNTRIES, COUNTRY_P, n, empty=0.25)
+    country[~is_company & (rng.random(n) < 0.8)] = ""
+    return {
+        "id": noisy(rng, clean, 0.003),
+        "entity_type": kind,
+        "entity_id": clean,
+        "name": name,
+        "normalized_name": name.str.lower(),
+        "permalink": "/" + pd.Series(kind).str.lower() + "/" + name.str.lower().str.replace(" ", "-"),
+        "category_code": np.where(is_company, pick(rng, CATEGORIES, CATEGORY_P, n), ""),
+        "status": pick(rng, STATUSES, STATUS_P, n),
+        "founded_at": np.where(is_company, dates(rng, n, 1980, 2013, empty=0.4), ""),
+        "homepage_url": np.where(is_company, "http://" + name.str.lower().str.replace(" ", "") + ".com", ""),
+        "country_code": country,
+        "city": np.where(country == "", "", "City " + pd.Series(rng.integers(1, 500, n)).astype(str)),
+        "funding_total_usd": np.where(is_company, amounts(rng, n, 5e6, 1.8, empty=0.85), ""),
+        "created_at": timestamps(rng, n),
+        "updated_at": timestamps(rng, n),
+    }
+
+
+def gen_people(rng, w, start, stop):
+    n = stop - start
+    return {
+        "id": np.arange(start + 1, stop + 1),
+        "object_id": noisy(rng, ids(w.types, w.pool[PERSON][start:stop])),
+        "first_name": "First" + pd.Series(rng.integers(1, 5_000, n)).astype(str),
+        "last_name": "Last" + pd.Series(rng.integers(1, 50_000, n)).astype(str),
+        "affiliation_name": pick(rng, ["Unaffiliated", "Company"], [7, 3], n),
+    }
+
+
+def gen_offices(rng, w, start, stop):
+    n = stop - start
+    owners = np.concatenate([w.pool[COMPANY], w.pool[FINORG]])
+    return {
+        "id": np.arange(start + 1, stop + 1),
+        "object_id": noisy(rng, ids(w.types, owners[rng.integers(0, len(owners), n)])),
+        "office_id": np.arange(start + 1, stop + 1),
+        "city": "City " + pd.Series(rng.integers(1, 500, n)).astype(str),
+        "country_code": pick(rng, COUNTRIES, COUNTRY_P, n, empty=0.1),
+        "latitude": np.round(rng.uniform(-60, 70, n), 6),
+        "longitude": np.round(rng.uniform(-180, 180, n), 6),
+        "created_at": timestamps(rng, n),
+        "updated_at": timestamps(rng, n),
+    }
+
+
+def gen_degrees(rng, w, start, stop):
+    n = stop - start
+    return {
+        "id": np.arange(start + 1, stop + 1),
+        "object_id": noisy(rng, ids(w.types, w.pool[PERSON][rng.integers(0, len(w.pool[PERSON]), n)])),
+        "degree_type": pick(rng, ["BS", "BA", "MS", "MBA", "PhD"], [35, 25, 15, 18, 7], n),
+        "subject": pick(rng, ["Computer Science", "Economics", "Engineering", "Business", ""], [3, 2, 2, 2, 1], n),
+        "institution": "University " + pd.Series(skewed(rng, 3_000, n, 2.0)).astype(str),
+        "graduated_at": dates(rng, n, 1970, 2013, empty=0.5),
+        "created_at": timestamps(rng, n),
+        "updated_at": timestamps(rng, n),
+    }
+
+
+def gen_milestones(rng, w, start, stop):
+    n = stop - start
+    return {
+        "id": np.arange(start + 1, stop + 1),
+        "object_id": noisy(rng, ids(w.types, w.pool[COMPANY][skewed(rng, len(w.pool[COMPANY]), n, 2.0)])),
+        "milestone_at": dates(rng, n, 2000, 2013),
+        "milestone_code": "other",
+        "description": pick(rng, ["Launched", "Raised", "Hired", "Acquired"], [4, 3, 2, 1], n),
+        "created_at": timestamps(rng, n),
+        "updated_at": timestamps(rng, n),
+    }
+
+
+def gen_funds(rng, w, start, stop):
+    n = stop - start
+    fins = w.pool[FINORG]
+    return {
+        "id": np.arange(start + 1, stop + 1),
+        "fund_id": np.arange(start + 1, stop + 1),
+        "object_id": noisy(rng, ids(w.types, fins[skewed(rng, len(fins), n, 2.0)])),
+        "name": "Fund " + pd.Series(np.arange(start + 1, stop + 1)).astype(str),
+        "funded_at": dates(rng, n, 1995, 2013, empty=0.1),
+        "raised_amount": amounts(rng, n, 1e8, 1.2, empty=0.05),
+        "raised_currency_code": "USD",
+        "created_at": timestamps(rng, n),
+        "updated_at": timestamps(rng, n),
+    }
+
+
+def gen_funding_rounds(rng, w, start, stop):
+    n = stop - start
+    usd = amounts(rng, n, 2e6, 1.6, empty=0.1)
+    return {
+        "id": np.arange(start + 1, stop + 1),
+        "funding_round_id": np.arange(start + 1, stop + 1),
+        "object_id": noisy(rng, ids(w.types, w.round_company[start:stop])),
+        "funded_at": dates(rng, n, 1995, 2014, empty=0.02),
+        "funding_round_type": pick(rng, ROUND_TYPES, ROUND_TYPE_P, n),
+        "raised_amount": usd,
+        "raised_amount_usd": usd,
+        "raised_currency_code": "USD",
+        "participants": rng.integers(0, 8, n),
+        "is_first_round": pick(rng, ["true", "false"], [1, 2], n),
+        "is_last_round": pick(rng, ["true", "false"], [1, 2], n),
+        "created_at": timestamps(rng, n),
+        "updated_at": timestamps(rng, n),
+    }
+
+
+def gen_investments(rng, w, start, stop):
+    n = stop - start
+    n_rounds = len(w.round_company)
+    rnd = rng.integers(0, n_rounds, n)
+    round_id = pd.Series(rnd + 1).astype(str)
+    dangling = rng.random(n) < 0.01  # раунд, которого нет в funding_rounds
+    round_id[dangling] = pd.Series(n_rounds + 1 + rnd[dangling]).astype(str).values
+    return {
+        "id": np.arange(start + 1, stop + 1),
+        "funding_round_id": round_id,
+        "funded_object_id": noisy(rng, ids(w.types, w.round_company[rnd])),
+        "investor_object_id": noisy(rng, ids(w.types, w.investors(rng, n))),
+        "created_at": timestamps(rng, n),
+        "updated_at": timestamps(rng, n),
+    }
+
+
+def gen_acquisitions(rng, w, start, stop):
+    n = stop - start
+    comp = w.pool[COMPANY]
+    return {
+        "id": np.arange(start + 1, stop + 1),
+        "acquisition_id": np.arange(start + 1, stop + 1),
+        "acquiring_object_id": noisy(rng, ids(w.types, comp[skewed(rng, len(comp), n, 4.0)])),
+        "acquired_object_id": noisy(rng, ids(w.types, comp[rng.integers(0, len(comp), n)])),
+        "term_code": pick(rng, ["cash", "stock", "cash_and_stock", ""], [2, 1, 1, 6], n),
+        "price_amount": amounts(rng, n, 5e7, 1.8, empty=0.7),
+        "price_currency_code": "USD",
+        "acquired_at": dates(rng, n, 1995, 2014, empty=0.05),
+        "created_at": timestamps(rng, n),
+        "updated_at": timestamps(rng, n),
+    }
+
+
+def gen_ipos(rng, w, start, stop):
+    n = stop - start
+    comp = w.pool[COMPANY]
+    return {
+        "id": np.arange(start + 1, stop + 1),
+        "ipo_id": np.arange(start + 1, stop + 1),
+        "object_id": noisy(rng, ids(w.types, comp[rng.integers(0, len(comp), n)])),
+        "valuation_amount": amounts(rng, n, 1e9, 1.0, empty=0.6),
+        "valuation_currency_code": "USD",
+        "raised_amount": amounts(rng, n, 1e8, 1.0, empty=0.6),
+        "raised_currency_code": "USD",
+        "public_at": dates(rng, n, 1980, 2014, empty=0.1),
+        "stock_symbol": "SYM" + pd.Series(np.arange(start + 1, stop + 1)).astype(str),
+        "created_at": timestamps(rng, n),
+        "updated_at": timestamps(rng, n),
+    }
+
+
+def gen_relationships(rng, w, start, stop):
+    n = stop - start
+    pers = w.pool[PERSON]
+    orgs = np.concatenate([w.pool[COMPANY], w.pool[FINORG]])
+    return {
+        "id": np.arange(start + 1, stop + 1),
+        "relationship_id": np.arange(start + 1, stop + 1),
+        "person_object_id": noisy(rng, ids(w.types, pers[rng.integers(0, len(pers), n)])),
+        "relationship_object_id": noisy(rng, ids(w.types, orgs[skewed(rng, len(orgs), n, 2.0)])),
+        "start_at": dates(rng, n, 1990, 2013, empty=0.6),
+        "end_at": dates(rng, n, 2000, 2014, empty=0.8),
+        "is_past": pick(rng, ["true", "false"], [1, 3], n),
+        "sequence": rng.integers(1, 10, n),
+        "title": pick(rng, ["CEO", "CTO", "Founder", "Board Member", "VP", "Engineer"], [2, 1, 2, 2, 2, 3], n),
+        "created_at": timestamps(rng, n),
+        "updated_at": timestamps(rng, n),
+    }
+
+
+GENERATORS = {
+    "objects.csv": gen_objects, "people.csv": gen_people, "offices.csv": gen_offices,
+    "degrees.csv": gen_degrees, "milestones.csv": gen_milestones, "funds.csv": gen_funds,
+    "funding_rounds.csv": gen_funding_rounds, "investments.csv": gen_investments,
+    "acquisitions.csv": gen_acquisitions, "ipos.csv": gen_ipos, "relationships.csv": gen_relationships,
+}
+
+
+def write_file(path: str, columns: list[str], gen, w: World, rows: int, seed: int, file_no: int):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        for chunk_no, start in enumerate(range(0, rows, CHUNK)):
+            stop = min(rows, start + CHUNK)
+            rng = np.random.default_rng([seed, file_no, chunk_no])
+            data = gen(rng, w, start, stop)
+            df = pd.DataFrame({c: data.get(c, "") for c in columns}, index=range(stop - start))
+            df.to_csv(f, header=(start == 0), index=False)
+    os.replace(tmp, path)
+
+
+def generate(out_dir: str, scale: int, seed: int = 42, force: bool = False) -> dict:
+    """Пишет 11 CSV в `out_dir`; если там уже лежит набор с теми же параметрами — ничего не делает."""
+    os.makedirs(out_dir, exist_ok=True)
+    manifest_path = os.path.join(out_dir, MANIFEST)
+    params = {"version": GEN_VERSION, "scale": scale, "seed": seed}
+    if not force and os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            m = json.load(f)
+        if {k: m.get(k) for k in params} == params:
+            return m
+
+    t0 = time.perf_counter()
+    w = World(scale, seed)
+    columns = stage_columns()
+    for file_no, (csv_file, gen) in enumerate(GENERATORS.items(), start=1):
+        t = time.perf_counter()
+        write_file(os.path.join(out_dir, csv_file), columns[csv_file], gen, w, w.rows[csv_file], seed, file_no)
+        print(f"[GEN] {csv_file}: {w.rows[csv_file]:,} rows, {time.perf_counter() - t:.1f}s")
+    m = dict(params, rows=w.rows, seconds=round(time.perf_counter() - t0, 2))
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(m, f, indent=2)
+    return m
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Generate Crunchbase-shaped CSVs for benchmarks")
+    ap.add_argument("--scale", type=parse_scale, default=parse_scale("100k"),
+                    help="всего строк во всех файлах: 10k … 50M")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", required=True, help="каталог для CSV")
+    ap.add_argument("--force", action="store_true", help="перегенерировать, даже если набор уже есть")
+    args = ap.parse_args()
+    m = generate(args.out, args.scale, args.seed, args.force)
+    print(f"[GEN] {sum(m['rows'].values()):,} rows in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Бенчмарк конвейера на синтетических данных: загрузка, вьюхи, отчётные запросы, экспорты.
+
+Для каждого масштаба: сгенерировать CSV (gen_data.py, кэшируются по seed/scale), пересоздать
+схему cb в ОТДЕЛЬНОЙ базе, загрузить load_cb.py, применить views/materialized/indices, замерить
+каждую вьюху, каждый запрос sql/assignment2 и экспорты Excel/CSV. Результат — JSON;
+если есть baseline, печатается сравнение, и при регрессиях код выхода 1.
+
+    python dv-assignment/bench/run_bench.py --dbname dv_bench --scales 10k,100k,1M
+    python dv-assignment/bench/run_bench.py --dbname dv_bench --scales 10k,100k --save-baseline
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from argparse import Namespace
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import psycopg2
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(PROJECT_DIR, "loader"))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, BENCH_DIR)
+from load_cb import CBLoader, ensure_schema, refresh_materialized, refresh_rollup  # noqa: E402
+from run_assignment import read_sql, exec_file, export_csv, EXPORTS  # noqa: E402
+from gen_data import generate, parse_scale  # noqa: E402
+
+SCHEMA_SQL = os.path.join(BENCH_DIR, "schema.sql")
+SQL_DIR = os.path.join(PROJECT_DIR, "sql")
+DATA_ROOT = os.path.join(BENCH_DIR, "data")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+# бенчмарк сносит схему cb — на этих базах только с --force-db
+PROTECTED_DBS = {"dv_project", "postgres"}
+TABLES = ["objects", "people", "offices", "degrees", "milestones", "funds",
+          "funding_rounds", "investments", "acquisitions", "ipos", "relationships"]
+
+
+class Timings(dict):
+    @contextmanager
+    def measure(self, name: str):
+        t0 = time.perf_counter()
+        yield
+        self[name] = round(time.perf_counter() - t0, 4)
+        print(f"[BENCH] {name}: {self[name]:.3f}s")
+
+
+def reset_schema(conn):
+    with conn.cursor() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS cb CASCADE;")
+        cur.execute("CREATE SCHEMA cb;")
+        for stmt in read_sql(SCHEMA_SQL):
+            cur.execute(stmt)
+    conn.commit()
+
+
+def view_names(path: str) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return re.findall(r"CREATE\s+OR\s+REPLACE\s+VIEW\s+cb\.(\w+)", f.read(), re.I)
+
+
+def bench_scale(conn, dsn: dict, label: str, scale: int, args) -> dict:
+    import run_assignment2 as ra2  # тянет matplotlib/plotly — только когда реально меряем
+
+    t = Timings()
+    data_dir = os.path.join(args.data_root, label)
+    gen = generate(data_dir, scale, args.seed)
+
+    reset_schema(conn)
+    ensure_schema(conn, "cb")
+    loader = CBLoader(conn, "cb", data_dir, dsn=dsn, bulk=args.bulk)
+    with t.measure("load.total"):
+        loader.load_all(jobs=args.jobs)
+    for step, sec in loader.timings.items():
+        t[f"load.{step}"] = round(sec, 4)
+
+    with conn.cursor() as cur:
+        with t.measure("ddl.views"):
+            exec_file(cur, os.path.join(SQL_DIR, "views.sql"), "CREATE/REPLACE VIEWS")
+        with t.measure("ddl.materialized"):
+            exec_file(cur, os.path.join(SQL_DIR, "materialized.sql"), "CREATE MATERIALIZED VIEWS")
+        with t.measure("ddl.indices"):
+            exec_file(cur, os.path.join(SQL_DIR, "indices.sql"), "CREATE INDICES")
+    conn.commit()
+    with t.measure("refresh.rollup"):
+        refresh_rollup(conn, "cb")
+    with t.measure("refresh.materialized"):
+        refresh_materialized(conn, "cb")
+    conn.autocommit = True
+    with conn.cursor() as cur, t.measure("ddl.analyze"):
+        cur.execute("ANALYZE;")
+    conn.autocommit = False
+
+    with conn.cursor() as cur:
+        for view in view_names(os.path.join(SQL_DIR, "views.sql")):
+            with t.measure(f"view.{view}"):
+                cur.execute(f"SELECT count(*) FROM (SELECT * FROM cb.{view}) v;")
+                cur.fetchone()
+        rows = {}
+        for table in TABLES:
+            cur.execute(f"SELECT count(*) FROM cb.{table};")
+            rows[table] = cur.fetchone()[0]
+    conn.commit()
+
+    engine = ra2.mk_engine(Namespace(parallel=1, **{k: dsn[k] for k in ("host", "port", "dbname", "user", "password")}))
+    dfs = {}
+    for q, f in ra2.QUERIES.items():
+        with open(os.path.join(SQL_DIR, "assignment2", f), encoding="utf-8") as fh:
+            sql = fh.read()
+        with t.measure(f"query.{q}"):
+            dfs[q] = ra2.read_df(engine, sql)
+    for q, fn in ra2.ROLLUP_QUERIES.items():
+        with t.measure(f"rollup.{q}"):
+            fn(ra2.Rollup(lambda sql: ra2.read_df(engine, sql)))
+    engine.dispose()
+
+    xlsx = f"bench_{label}.xlsx"
+    with t.measure("export.excel"):
+        ra2.export_to_excel({q.lower(): df for q, df in dfs.items() if q != "PLOTLY"}, xlsx)
+    os.remove(os.path.join("dv-assignment", "exports", xlsx))
+
+    tmp = tempfile.mkdtemp(prefix="bench-csv-")
+    try:
+        for name, query in EXPORTS:
+            with t.measure(f"export.{name}"):
+                export_csv(conn, query, os.path.join(tmp, name))
+        conn.commit()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    return {"scale": scale, "generated_rows": gen["rows"], "gen_seconds": gen.get("seconds"),
+            "rows": rows, "rejected": loader.rejected, "timings": dict(t)}
+
+
+def compare(result: dict, baseline: dict, threshold: float, min_delta: float) -> list[tuple]:
+    """(масштаб, метрика, было, стало, отношение, метка) по метрикам, которые есть в обоих прогонах."""
+    out = []
+    for label, cur in result["scales"].items():
+        base = baseline.get("scales", {}).get(label)
+        if not base:
+            continue
+        for metric, now in cur["timings"].items():
+            was = base["timings"].get(metric)
+            if was is None:
+                continue
+            ratio = now / was if was > 0 else float("inf")
+            mark = ""
+            if abs(now - was) >= min_delta:
+                if ratio > 1 + threshold:
+                    mark = "REGRESSION"
+                elif ratio < 1 - threshold:
+                    mark = "faster"
+            out.append((label, metric, was, now, ratio, mark))
+    return out
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark loader, views, report queries and exports on synthetic data")
+    ap.add_argument("--host", default="localhost")
+    ap.add_argument("--port", type=int, default=5432)
+    ap.add_argument("--dbname", default="dv_bench", help="отдельная база: схема cb в ней пересоздаётся")
+    ap.add_argument("--user", default="postgres")
+    ap.add_argument("--password", default="0000")
+    ap.add_argument("--force-db", action="store_true", help=f"разрешить базы {sorted(PROTECTED_DBS)}")
+    ap.add_argument("--scales", default="10k,100k", help="масштабы через запятую: 10k … 50M строк всего")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--data-root", default=DATA_ROOT, help="куда складывать сгенерированные CSV")
+    ap.add_argument("--jobs", type=int, default=1, help="--jobs загрузчика")
+    ap.add_argument("--bulk", action="store_true", help="--bulk загрузчика")
+    ap.add_argument("--out", default=None, help="JSON с результатом (по умолчанию bench/results/<время>.json)")
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--save-baseline", action="store_true", help="записать результат как новый baseline")
+    ap.add_argument("--threshold", type=float, default=0.2, help="доля замедления, считающаяся регрессией")
+    ap.add_argument("--min-delta", type=float, default=0.05, help="секунды: меньшие разницы — шум")
+    args = ap.parse_args()
+
+    if args.dbname in PROTECTED_DBS and not args.force_db:
+        ap.error(f"--dbname {args.dbname}: бенчмарк пересоздаёт схему cb, нужна отдельная база (или --force-db)")
+
+    # пути в run_assignment2 (charts/, exports/) — от корня репозитория, как при обычном запуске
+    args.data_root, args.baseline = os.path.abspath(args.data_root), os.path.abspath(args.baseline)
+    args.out = args.out and os.path.abspath(args.out)
+    os.chdir(os.path.dirname(PROJECT_DIR))
+    dsn = dict(host=args.host, port=args.port, dbname=args.dbname, user=args.user, password=args.password)
+    conn = psycopg2.connect(**dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SHOW server_version;")
+            server = cur.fetchone()[0]
+        conn.commit()
+        started = datetime.now(timezone.utc)
+        result = {
+            "meta": {"started_at": started.isoformat(timespec="seconds"), "git": git_commit(),
+                     "postgres": server, "python": platform.python_version(), "host": platform.node(),
+                     "seed": args.seed, "jobs": args.jobs, "bulk": args.bulk},
+            "scales": {},
+        }
+        for label in [s.strip() for s in args.scales.split(",") if s.strip()]:
+            print(f"\n===== scale {label} =====")
+            result["scales"][label] = bench_scale(conn, dsn, label, parse_scale(label), args)
+    finally:
+        conn.close()
+
+    out = args.out or os.path.join(RESULTS_DIR, f"bench-{started:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\n[BENCH] results -> {out}")
+
+    regressions = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(result, baseline, args.threshold, args.min_delta)
+        print(f"\n--- vs baseline {args.baseline} (git {baseline.get('meta', {}).get('git')}) ---")
+        print(f"{'scale':>6} | {'metric':<45} | {'base, s':>9} | {'now, s':>9} | {'x':>6} |")
+        for label, metric, was, now, ratio, mark in rows:
+            print(f"{label:>6} | {metric:<45} | {was:9.3f} | {now:9.3f} | {ratio:6.2f} | {mark}")
+        regressions = sum(1 for r in rows if r[-1] == "REGRESSION")
+        print(f"{regressions} regression(s) over {args.threshold:.0%}")
+    if args.save_baseline:
+        shutil.copyfile(out, args.baseline)
+        print(f"[BENCH] baseline -> {args.baseline}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
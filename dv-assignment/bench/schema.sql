@@ -0,0 +1,73 @@
+-- Целевые таблицы cb для бенчмарка (в рабочей базе они уже есть).
+-- Типы — как приводит loader/load_cb.py, уникальные ключи — под его ON CONFLICT.
+-- Колонки канонических ключей (obj_key, *_object_key) добавит сам загрузчик.
+-- ipos.public_at — TEXT, как в рабочей базе: analysis.sql (6.4) сверяет его с regex.
+-- funding_rounds и investments загрузчик сам переделает в таблицы с разбиением по годам (ensure_partitioned).
+
+CREATE TABLE cb.objects (
+  id TEXT PRIMARY KEY, entity_type TEXT, entity_id TEXT UNIQUE, parent_id TEXT, name TEXT, normalized_name TEXT,
+  permalink TEXT, category_code TEXT, status TEXT, founded_at DATE, closed_at DATE, domain TEXT,
+  homepage_url TEXT, twitter_username TEXT, logo_url TEXT, logo_width INT, logo_height INT,
+  short_description TEXT, description TEXT, overview TEXT, tag_list TEXT, country_code TEXT,
+  state_code TEXT, city TEXT, region TEXT, first_investment_at DATE, last_investment_at DATE,
+  investment_rounds INT, invested_companies INT, first_funding_at DATE, last_funding_at DATE,
+  funding_rounds INT, funding_total_usd NUMERIC, first_milestone_at DATE, last_milestone_at DATE,
+  milestones INT, relationships INT, created_by TEXT, created_at TIMESTAMP, updated_at TIMESTAMP
+);
+
+CREATE TABLE cb.people (
+  id BIGINT, object_id TEXT UNIQUE, first_name TEXT, last_name TEXT, birthplace TEXT, affiliation_name TEXT
+);
+
+CREATE TABLE cb.offices (
+  id BIGINT, object_id TEXT, office_id TEXT, description TEXT, region TEXT, address1 TEXT, address2 TEXT,
+  city TEXT, zip_code TEXT, state_code TEXT, country_code TEXT, latitude DOUBLE PRECISION,
+  longitude DOUBLE PRECISION, created_at TIMESTAMP, updated_at TIMESTAMP
+);
+
+CREATE TABLE cb.degrees (
+  id BIGINT, object_id TEXT, degree_type TEXT, subject TEXT, institution TEXT, graduated_at DATE,
+  created_at TIMESTAMP, updated_at TIMESTAMP
+);
+
+CREATE TABLE cb.milestones (
+  id BIGINT, object_id TEXT, milestone_at DATE, milestone_code TEXT, description TEXT,
+  source_url TEXT, source_description TEXT, created_at TIMESTAMP, updated_at TIMESTAMP
+);
+
+CREATE TABLE cb.funds (
+  id BIGINT, fund_id TEXT UNIQUE, object_id TEXT, name TEXT, funded_at DATE, raised_amount NUMERIC,
+  raised_currency_code TEXT, created_at TIMESTAMP, updated_at TIMESTAMP, source_url TEXT, source_description TEXT
+);
+
+CREATE TABLE cb.funding_rounds (
+  id BIGINT, funding_round_id TEXT UNIQUE, object_id TEXT, funded_at DATE, funding_round_type TEXT,
+  funding_round_code TEXT, raised_amount NUMERIC, raised_amount_usd NUMERIC, raised_currency_code TEXT,
+  pre_money_valuation NUMERIC, pre_money_valuation_usd NUMERIC, pre_money_currency_code TEXT,
+  post_money_valuation NUMERIC, post_money_valuation_usd NUMERIC, post_money_currency_code TEXT,
+  participants INT, is_first_round BOOLEAN, is_last_round BOOLEAN, source_url TEXT, source_description TEXT,
+  created_by TEXT, created_at TIMESTAMP, updated_at TIMESTAMP
+);
+
+CREATE TABLE cb.investments (
+  id BIGINT, funding_round_id TEXT, funded_object_id TEXT, investor_object_id TEXT,
+  created_at TIMESTAMP, updated_at TIMESTAMP
+);
+
+CREATE TABLE cb.acquisitions (
+  id BIGINT, acquisition_id TEXT UNIQUE, acquiring_object_id TEXT, acquired_object_id TEXT, term_code TEXT,
+  price_amount NUMERIC, price_currency_code TEXT, acquired_at DATE, source_url TEXT,
+  source_description TEXT, created_at TIMESTAMP, updated_at TIMESTAMP
+);
+
+CREATE TABLE cb.ipos (
+  id BIGINT, ipo_id TEXT UNIQUE, object_id TEXT, valuation_amount NUMERIC, valuation_currency_code TEXT,
+  raised_amount NUMERIC, raised_currency_code TEXT, public_at TEXT, stock_symbol TEXT,
+  source_url TEXT, source_description TEXT, created_at TIMESTAMP, updated_at TIMESTAMP
+);
+
+CREATE TABLE cb.relationships (
+  id BIGINT, relationship_id TEXT UNIQUE, person_object_id TEXT, relationship_object_id TEXT,
+  start_at DATE, end_at DATE, is_past BOOLEAN, sequence INT, title TEXT,
+  created_at TIMESTAMP, updated_at TIMESTAMP
+);
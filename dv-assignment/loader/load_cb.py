@@ -1,8 +1,19 @@
 #!/usr/bin/env python3
 import os
+import re
+import sys
+import time
+import hashlib
 import argparse
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+sys.path.insert(0, os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')))
+import metrics  # noqa: E402
+import rollup  # noqa: E402
 
 DB_CONFIG = {
     'host': 'localhost',
@@ -13,6 +24,9 @@ DB_CONFIG = {
 }
 DEFAULT_SCHEMA = 'cb'
 DEFAULT_DATA_DIR = '/Users/asandauren/Downloads/archive'
+DEFAULT_REJECT_DIR = 'dv-assignment/rejects'
+SQL_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sql'))
+INDICES_SQL = os.path.join(SQL_DIR, 'indices.sql')
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 log = logging.getLogger(__name__)
@@ -23,9 +37,9 @@ def qname(schema: str, table: str) -> str:
 SQL = {}
 
 # objects
-SQL["objects_stage_drop"] = "DROP TABLE IF EXISTS {sch}.objects_stage;"
+SQL["objects_stage_drop"] = "DROP TABLE IF EXISTS {stg}.objects_stage;"
 SQL["objects_stage_create"] = """
-CREATE TABLE {sch}.objects_stage (
+CREATE TABLE {stg}.objects_stage (
   id TEXT, entity_type TEXT, entity_id TEXT, parent_id TEXT, name TEXT, normalized_name TEXT,
   permalink TEXT, category_code TEXT, status TEXT, founded_at TEXT, closed_at TEXT, domain TEXT,
   homepage_url TEXT, twitter_username TEXT, logo_url TEXT, logo_width TEXT, logo_height TEXT,
@@ -43,7 +57,7 @@ INSERT INTO {sch}.objects(
   short_description, description, overview, tag_list, country_code, state_code, city, region,
   first_investment_at, last_investment_at, investment_rounds, invested_companies, first_funding_at,
   last_funding_at, funding_rounds, funding_total_usd, first_milestone_at, last_milestone_at,
-  milestones, relationships, created_by, created_at, updated_at
+  milestones, relationships, created_by, created_at, updated_at, obj_key
 )
 SELECT
   id, entity_type, entity_id, parent_id, name, normalized_name, permalink, category_code, status,
@@ -56,19 +70,19 @@ SELECT
   NULLIF(funding_rounds,'')::int, NULLIF(funding_total_usd,'')::numeric,
   NULLIF(first_milestone_at,'')::date, NULLIF(last_milestone_at,'')::date,
   NULLIF(milestones,'')::int, NULLIF(relationships,'')::int,
-  created_by, NULLIF(created_at,'')::timestamp, NULLIF(updated_at,'')::timestamp
+  created_by, NULLIF(created_at,'')::timestamp, NULLIF(updated_at,'')::timestamp, util.norm_id(id)
 FROM (
   SELECT DISTINCT ON (entity_id) *
-  FROM {sch}.objects_stage
+  FROM {stg}.objects_stage
   ORDER BY entity_id, COALESCE(NULLIF(updated_at,'')::timestamp, '1900-01-01'::timestamp) DESC
 ) s
 ON CONFLICT (entity_id) DO NOTHING;
 """
 
 # people
-SQL["people_stage_drop"] = "DROP TABLE IF EXISTS {sch}.people_stage;"
+SQL["people_stage_drop"] = "DROP TABLE IF EXISTS {stg}.people_stage;"
 SQL["people_stage_create"] = """
-CREATE TABLE {sch}.people_stage (
+CREATE TABLE {stg}.people_stage (
   id TEXT, object_id TEXT, first_name TEXT, last_name TEXT, birthplace TEXT, affiliation_name TEXT
 );
 """
@@ -76,15 +90,15 @@ SQL["people_insert"] = """
 INSERT INTO {sch}.people(id, object_id, first_name, last_name, birthplace, affiliation_name)
 SELECT
   NULLIF(id,'')::bigint, btrim(object_id), first_name, last_name, birthplace, affiliation_name
-FROM {sch}.people_stage s
-WHERE EXISTS (SELECT 1 FROM {sch}.objects o WHERE o.entity_id = btrim(s.object_id))
+FROM {stg}.people_stage s
+JOIN {sch}.object_keys k ON k.entity_id = btrim(s.object_id)
 ON CONFLICT (object_id) DO NOTHING;
 """
 
 # offices
-SQL["offices_stage_drop"] = "DROP TABLE IF EXISTS {sch}.offices_stage;"
+SQL["offices_stage_drop"] = "DROP TABLE IF EXISTS {stg}.offices_stage;"
 SQL["offices_stage_create"] = """
-CREATE TABLE {sch}.offices_stage (
+CREATE TABLE {stg}.offices_stage (
   id TEXT, object_id TEXT, office_id TEXT, description TEXT, region TEXT, address1 TEXT, address2 TEXT,
   city TEXT, zip_code TEXT, state_code TEXT, country_code TEXT, latitude TEXT, longitude TEXT, created_at TEXT, updated_at TEXT
 );
@@ -98,14 +112,14 @@ SELECT
   NULLIF(id,'')::bigint, btrim(object_id), office_id, description, region, address1, address2, city, zip_code, state_code,
   country_code, NULLIF(latitude,'')::double precision, NULLIF(longitude,'')::double precision,
   NULLIF(created_at,'')::timestamp, NULLIF(updated_at,'')::timestamp
-FROM {sch}.offices_stage s
-WHERE EXISTS (SELECT 1 FROM {sch}.objects o WHERE o.entity_id = btrim(s.object_id));
+FROM {stg}.offices_stage s
+JOIN {sch}.object_keys k ON k.entity_id = btrim(s.object_id);
 """
 
 # degrees
-SQL["degrees_stage_drop"] = "DROP TABLE IF EXISTS {sch}.degrees_stage;"
+SQL["degrees_stage_drop"] = "DROP TABLE IF EXISTS {stg}.degrees_stage;"
 SQL["degrees_stage_create"] = """
-CREATE TABLE {sch}.degrees_stage (
+CREATE TABLE {stg}.degrees_stage (
   id TEXT, object_id TEXT, degree_type TEXT, subject TEXT, institution TEXT, graduated_at TEXT, created_at TEXT, updated_at TEXT
 );
 """
@@ -116,14 +130,14 @@ INSERT INTO {sch}.degrees(
 SELECT
   NULLIF(id,'')::bigint, btrim(object_id), degree_type, subject, institution,
   NULLIF(graduated_at,'')::date, NULLIF(created_at,'')::timestamp, NULLIF(updated_at,'')::timestamp
-FROM {sch}.degrees_stage s
-WHERE EXISTS (SELECT 1 FROM {sch}.objects o WHERE o.entity_id = btrim(s.object_id));
+FROM {stg}.degrees_stage s
+JOIN {sch}.object_keys k ON k.entity_id = btrim(s.object_id);
 """
 
 # milestones
-SQL["milestones_stage_drop"] = "DROP TABLE IF EXISTS {sch}.milestones_stage;"
+SQL["milestones_stage_drop"] = "DROP TABLE IF EXISTS {stg}.milestones_stage;"
 SQL["milestones_stage_create"] = """
-CREATE TABLE {sch}.milestones_stage (
+CREATE TABLE {stg}.milestones_stage (
   id TEXT, object_id TEXT, milestone_at TEXT, milestone_code TEXT, description TEXT,
   source_url TEXT, source_description TEXT, created_at TEXT, updated_at TEXT
 );
@@ -135,14 +149,14 @@ INSERT INTO {sch}.milestones(
 SELECT
   NULLIF(id,'')::bigint, btrim(object_id), NULLIF(milestone_at,'')::date, milestone_code, description,
   source_url, source_description, NULLIF(created_at,'')::timestamp, NULLIF(updated_at,'')::timestamp
-FROM {sch}.milestones_stage s
-WHERE EXISTS (SELECT 1 FROM {sch}.objects o WHERE o.entity_id = btrim(s.object_id));
+FROM {stg}.milestones_stage s
+JOIN {sch}.object_keys k ON k.entity_id = btrim(s.object_id);
 """
 
 # funds
-SQL["funds_stage_drop"] = "DROP TABLE IF EXISTS {sch}.funds_stage;"
+SQL["funds_stage_drop"] = "DROP TABLE IF EXISTS {stg}.funds_stage;"
 SQL["funds_stage_create"] = """
-CREATE TABLE {sch}.funds_stage (
+CREATE TABLE {stg}.funds_stage (
   id TEXT, fund_id TEXT, object_id TEXT, name TEXT, funded_at TEXT, raised_amount TEXT,
   raised_currency_code TEXT, created_at TEXT, updated_at TEXT, source_url TEXT, source_description TEXT
 );
@@ -155,15 +169,15 @@ SELECT
   NULLIF(id,'')::bigint, fund_id, btrim(object_id), name, NULLIF(funded_at,'')::date,
   NULLIF(raised_amount,'')::numeric, raised_currency_code,
   NULLIF(created_at,'')::timestamp, NULLIF(updated_at,'')::timestamp, source_url, source_description
-FROM {sch}.funds_stage s
-WHERE EXISTS (SELECT 1 FROM {sch}.objects o WHERE o.entity_id = btrim(s.object_id))
+FROM {stg}.funds_stage s
+JOIN {sch}.object_keys k ON k.entity_id = btrim(s.object_id)
 ON CONFLICT (fund_id) DO NOTHING;
 """
 
 # funding_rounds
-SQL["funding_rounds_stage_drop"] = "DROP TABLE IF EXISTS {sch}.funding_rounds_stage;"
+SQL["funding_rounds_stage_drop"] = "DROP TABLE IF EXISTS {stg}.funding_rounds_stage;"
 SQL["funding_rounds_stage_create"] = """
-CREATE TABLE {sch}.funding_rounds_stage (
+CREATE TABLE {stg}.funding_rounds_stage (
   id TEXT, funding_round_id TEXT, object_id TEXT, funded_at TEXT, funding_round_type TEXT, funding_round_code TEXT,
   raised_amount TEXT, raised_amount_usd TEXT, raised_currency_code TEXT,
   pre_money_valuation TEXT, pre_money_valuation_usd TEXT, pre_money_currency_code TEXT,
@@ -172,15 +186,18 @@ CREATE TABLE {sch}.funding_rounds_stage (
   created_by TEXT, created_at TEXT, updated_at TEXT
 );
 """
+# funding_rounds is partitioned by funded_at, so funding_round_id cannot have a UNIQUE constraint:
+# duplicates are dropped by DISTINCT ON (newest updated_at wins) and NOT EXISTS instead of ON CONFLICT
 SQL["funding_rounds_insert"] = """
 INSERT INTO {sch}.funding_rounds(
   id, funding_round_id, object_id, funded_at, funding_round_type, funding_round_code,
   raised_amount, raised_amount_usd, raised_currency_code,
   pre_money_valuation, pre_money_valuation_usd, pre_money_currency_code,
   post_money_valuation, post_money_valuation_usd, post_money_currency_code,
-  participants, is_first_round, is_last_round, source_url, source_description, created_by, created_at, updated_at
+  participants, is_first_round, is_last_round, source_url, source_description, created_by, created_at, updated_at,
+  object_key
 )
-SELECT
+SELECT DISTINCT ON (s.funding_round_id)
   NULLIF(id,'')::bigint, funding_round_id, btrim(object_id), NULLIF(funded_at,'')::date,
   funding_round_type, funding_round_code,
   NULLIF(raised_amount,'')::numeric, NULLIF(raised_amount_usd,'')::numeric, raised_currency_code,
@@ -189,36 +206,41 @@ SELECT
   NULLIF(participants,'')::int,
   CASE LOWER(COALESCE(is_first_round,'')) WHEN 't' THEN true WHEN 'true' THEN true WHEN '1' THEN true WHEN 'yes' THEN true ELSE false END,
   CASE LOWER(COALESCE(is_last_round,''))  WHEN 't' THEN true WHEN 'true' THEN true WHEN '1' THEN true WHEN 'yes' THEN true ELSE false END,
-  source_url, source_description, created_by, NULLIF(created_at,'')::timestamp, NULLIF(updated_at,'')::timestamp
-FROM {sch}.funding_rounds_stage s
-WHERE EXISTS (SELECT 1 FROM {sch}.objects o WHERE o.entity_id = btrim(s.object_id))
-ON CONFLICT (funding_round_id) DO NOTHING;
+  source_url, source_description, created_by, NULLIF(created_at,'')::timestamp, NULLIF(updated_at,'')::timestamp,
+  k.obj_key
+FROM {stg}.funding_rounds_stage s
+JOIN {sch}.object_keys k ON k.entity_id = btrim(s.object_id)
+WHERE NOT EXISTS (SELECT 1 FROM {sch}.funding_rounds fr WHERE fr.funding_round_id = s.funding_round_id)
+ORDER BY s.funding_round_id, NULLIF(s.updated_at,'')::timestamp DESC NULLS LAST;
 """
 
 # investments
-SQL["investments_stage_drop"] = "DROP TABLE IF EXISTS {sch}.investments_stage;"
+SQL["investments_stage_drop"] = "DROP TABLE IF EXISTS {stg}.investments_stage;"
 SQL["investments_stage_create"] = """
-CREATE TABLE {sch}.investments_stage (
+CREATE TABLE {stg}.investments_stage (
   id TEXT, funding_round_id TEXT, funded_object_id TEXT, investor_object_id TEXT, created_at TEXT, updated_at TEXT
 );
 """
 SQL["investments_insert"] = """
 INSERT INTO {sch}.investments(
-  id, funding_round_id, funded_object_id, investor_object_id, created_at, updated_at
+  id, funding_round_id, funded_object_id, investor_object_id, created_at, updated_at,
+  funded_object_key, investor_object_key, funded_year
 )
 SELECT
-  NULLIF(id,'')::bigint, funding_round_id, btrim(funded_object_id), btrim(investor_object_id),
-  NULLIF(created_at,'')::timestamp, NULLIF(updated_at,'')::timestamp
-FROM {sch}.investments_stage s
-WHERE EXISTS (SELECT 1 FROM {sch}.funding_rounds fr WHERE fr.funding_round_id = s.funding_round_id)
-  AND EXISTS (SELECT 1 FROM {sch}.objects o1 WHERE o1.entity_id = btrim(s.funded_object_id))
-  AND EXISTS (SELECT 1 FROM {sch}.objects o2 WHERE o2.entity_id = btrim(s.investor_object_id));
+  NULLIF(s.id,'')::bigint, s.funding_round_id, btrim(s.funded_object_id), btrim(s.investor_object_id),
+  NULLIF(s.created_at,'')::timestamp, NULLIF(s.updated_at,'')::timestamp,
+  k1.obj_key, k2.obj_key, EXTRACT(YEAR FROM fr.funded_at)::int
+FROM {stg}.investments_stage s
+JOIN {sch}.object_keys k1 ON k1.entity_id = btrim(s.funded_object_id)
+JOIN {sch}.object_keys k2 ON k2.entity_id = btrim(s.investor_object_id)
+-- funding_round_id is unique in funding_rounds (see funding_rounds_insert), the join is the FK check
+JOIN {sch}.funding_rounds fr ON fr.funding_round_id = s.funding_round_id;
 """
 
 # acquisitions
-SQL["acq_stage_drop"] = "DROP TABLE IF EXISTS {sch}.acq_stage;"
+SQL["acq_stage_drop"] = "DROP TABLE IF EXISTS {stg}.acq_stage;"
 SQL["acq_stage_create"] = """
-CREATE TABLE {sch}.acq_stage (
+CREATE TABLE {stg}.acq_stage (
   id TEXT, acquisition_id TEXT, acquiring_object_id TEXT, acquired_object_id TEXT, term_code TEXT,
   price_amount TEXT, price_currency_code TEXT, acquired_at TEXT, source_url TEXT,
   source_description TEXT, created_at TEXT, updated_at TEXT
@@ -227,22 +249,24 @@ CREATE TABLE {sch}.acq_stage (
 SQL["acq_insert"] = """
 INSERT INTO {sch}.acquisitions(
   id, acquisition_id, acquiring_object_id, acquired_object_id, term_code, price_amount, price_currency_code,
-  acquired_at, source_url, source_description, created_at, updated_at
+  acquired_at, source_url, source_description, created_at, updated_at,
+  acquiring_object_key, acquired_object_key
 )
 SELECT
   NULLIF(id,'')::bigint, acquisition_id, btrim(acquiring_object_id), btrim(acquired_object_id), term_code,
   NULLIF(price_amount,'')::numeric, price_currency_code, NULLIF(acquired_at,'')::date,
-  source_url, source_description, NULLIF(created_at,'')::timestamp, NULLIF(updated_at,'')::timestamp
-FROM {sch}.acq_stage s
-WHERE EXISTS (SELECT 1 FROM {sch}.objects o1 WHERE o1.entity_id = btrim(s.acquiring_object_id))
-  AND EXISTS (SELECT 1 FROM {sch}.objects o2 WHERE o2.entity_id = btrim(s.acquired_object_id))
+  source_url, source_description, NULLIF(created_at,'')::timestamp, NULLIF(updated_at,'')::timestamp,
+  k1.obj_key, k2.obj_key
+FROM {stg}.acq_stage s
+JOIN {sch}.object_keys k1 ON k1.entity_id = btrim(s.acquiring_object_id)
+JOIN {sch}.object_keys k2 ON k2.entity_id = btrim(s.acquired_object_id)
 ON CONFLICT (acquisition_id) DO NOTHING;
 """
 
 # ipos
-SQL["ipos_stage_drop"] = "DROP TABLE IF EXISTS {sch}.ipos_stage;"
+SQL["ipos_stage_drop"] = "DROP TABLE IF EXISTS {stg}.ipos_stage;"
 SQL["ipos_stage_create"] = """
-CREATE TABLE {sch}.ipos_stage (
+CREATE TABLE {stg}.ipos_stage (
   id TEXT, ipo_id TEXT, object_id TEXT, valuation_amount TEXT, valuation_currency_code TEXT,
   raised_amount TEXT, raised_currency_code TEXT, public_at TEXT, stock_symbol TEXT,
   source_url TEXT, source_description TEXT, created_at TEXT, updated_at TEXT
@@ -259,15 +283,15 @@ SELECT
   NULLIF(raised_amount,'')::numeric, raised_currency_code,
   NULLIF(public_at,'')::date, stock_symbol, source_url, source_description,
   NULLIF(created_at,'')::timestamp, NULLIF(updated_at,'')::timestamp
-FROM {sch}.ipos_stage s
-WHERE EXISTS (SELECT 1 FROM {sch}.objects o WHERE o.entity_id = btrim(s.object_id))
+FROM {stg}.ipos_stage s
+JOIN {sch}.object_keys k ON k.entity_id = btrim(s.object_id)
 ON CONFLICT (ipo_id) DO NOTHING;
 """
 
 # relationships
-SQL["relationships_stage_drop"] = "DROP TABLE IF EXISTS {sch}.relationships_stage;"
+SQL["relationships_stage_drop"] = "DROP TABLE IF EXISTS {stg}.relationships_stage;"
 SQL["relationships_stage_create"] = """
-CREATE TABLE {sch}.relationships_stage (
+CREATE TABLE {stg}.relationships_stage (
   id TEXT, relationship_id TEXT, person_object_id TEXT, relationship_object_id TEXT,
   start_at TEXT, end_at TEXT, is_past TEXT, sequence TEXT, title TEXT, created_at TEXT, updated_at TEXT
 );
@@ -281,56 +305,780 @@ SELECT
   NULLIF(start_at,'')::date, NULLIF(end_at,'')::date,
   CASE LOWER(COALESCE(is_past,'')) WHEN 't' THEN true WHEN 'true' THEN true WHEN '1' THEN true WHEN 'yes' THEN true ELSE false END,
   NULLIF(sequence,'')::int, title, NULLIF(created_at,'')::timestamp, NULLIF(updated_at,'')::timestamp
-FROM {sch}.relationships_stage s
+FROM {stg}.relationships_stage s
 ON CONFLICT (relationship_id) DO NOTHING;
 """
 
+# same as util.norm_id in sql/views.sql; the loader needs it before views exist
+SQL["norm_id_function"] = r"""
+CREATE SCHEMA IF NOT EXISTS util;
+CREATE OR REPLACE FUNCTION util.norm_id(t text)
+RETURNS text
+LANGUAGE sql
+IMMUTABLE
+AS $$
+  SELECT lower(
+           regexp_replace(
+             replace(btrim(t), chr(160), ''),
+             '[\x00-\x1F\x7F]', '', 'g'
+           )
+         )
+$$;
+"""
+
+# valid object ids, built once per load right after objects; FK-checked inserts join against it
+# and take the canonical key (obj_key) of the referenced object from it
+SQL["object_keys_build"] = """
+DROP TABLE IF EXISTS {sch}.object_keys;
+CREATE UNLOGGED TABLE {sch}.object_keys (entity_id TEXT PRIMARY KEY, obj_key TEXT);
+INSERT INTO {sch}.object_keys(entity_id, obj_key)
+SELECT DISTINCT ON (entity_id) entity_id, obj_key FROM {sch}.objects WHERE entity_id IS NOT NULL;
+ANALYZE {sch}.object_keys;
+"""
+SQL["object_keys_exists"] = """
+SELECT EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = '{sch}' AND table_name = 'object_keys' AND column_name = 'obj_key');
+"""
+
+# canonical normalized object keys, stored next to the raw ids so joins are plain equi-joins:
+# objects.obj_key = util.norm_id(id), references carry obj_key of the object their FK check matched.
+# (table, column, backfill for rows loaded before the column existed)
+KEY_COLUMNS = [
+    ("objects", "obj_key",
+     "UPDATE {sch}.objects SET obj_key = util.norm_id(id);"),
+    ("funding_rounds", "object_key",
+     "UPDATE {sch}.funding_rounds t SET object_key = o.obj_key FROM {sch}.objects o WHERE o.entity_id = btrim(t.object_id);"),
+    ("investments", "funded_object_key",
+     "UPDATE {sch}.investments t SET funded_object_key = o.obj_key FROM {sch}.objects o WHERE o.entity_id = btrim(t.funded_object_id);"),
+    ("investments", "investor_object_key",
+     "UPDATE {sch}.investments t SET investor_object_key = o.obj_key FROM {sch}.objects o WHERE o.entity_id = btrim(t.investor_object_id);"),
+    ("acquisitions", "acquiring_object_key",
+     "UPDATE {sch}.acquisitions t SET acquiring_object_key = o.obj_key FROM {sch}.objects o WHERE o.entity_id = btrim(t.acquiring_object_id);"),
+    ("acquisitions", "acquired_object_key",
+     "UPDATE {sch}.acquisitions t SET acquired_object_key = o.obj_key FROM {sch}.objects o WHERE o.entity_id = btrim(t.acquired_object_id);"),
+]
+# year-partitioned tables: (table, partition key, its type, how to fill a column missing from older tables)
+# funding_rounds by funded_at, investments by funded_year (year of its round, denormalized at insert);
+# before PARTITION_FROM one partition, then one per year created on demand, NULL dates go to the default one
+PARTITION_FROM = 2000
+PARTITIONED_TABLES = [
+    ("funding_rounds", "funded_at", "date", None),
+    ("investments", "funded_year", "int",
+     "UPDATE {sch}.investments t SET funded_year = EXTRACT(YEAR FROM fr.funded_at)::int"
+     " FROM {sch}.funding_rounds fr WHERE fr.funding_round_id = t.funding_round_id;"),
+]
+SQL["relkind"] = """
+SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE n.nspname = %s AND c.relname = %s;
+"""
+SQL["partition_migrate"] = """
+ALTER TABLE {sch}.{table} RENAME TO {table}_unpartitioned;
+CREATE TABLE {sch}.{table} (LIKE {sch}.{table}_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE ({key});
+CREATE TABLE {sch}.{table}_pre{first} PARTITION OF {sch}.{table} FOR VALUES FROM (MINVALUE) TO ({first_bound});
+CREATE TABLE {sch}.{table}_default PARTITION OF {sch}.{table} DEFAULT;
+"""
+SQL["partition_copy"] = "INSERT INTO {sch}.{table} SELECT * FROM {sch}.{table}_unpartitioned;"
+SQL["partition_drop_old"] = "DROP TABLE {sch}.{table}_unpartitioned CASCADE;"
+SQL["partition_years"] = "SELECT DISTINCT {year} FROM {sch}.{table} WHERE {key} IS NOT NULL;"
+SQL["partition_create"] = """
+CREATE TABLE IF NOT EXISTS {sch}.{table}_y{year} PARTITION OF {sch}.{table} FOR VALUES FROM ({lo}) TO ({hi});
+"""
+# years of the staged rounds, so their partitions exist before the insert and never land in the default one
+SQL["stage_years"] = """
+SELECT DISTINCT EXTRACT(YEAR FROM NULLIF(funded_at,'')::date)::int FROM {stg}.funding_rounds_stage
+WHERE NULLIF(funded_at,'') IS NOT NULL;
+"""
+# incremental load may move a round to another year: its investments follow (row moves to the other partition)
+SQL["investments_year_sync"] = """
+UPDATE {sch}.investments i SET funded_year = EXTRACT(YEAR FROM fr.funded_at)::int
+FROM {sch}.funding_rounds fr
+WHERE fr.funding_round_id = i.funding_round_id
+  AND i.funded_year IS DISTINCT FROM EXTRACT(YEAR FROM fr.funded_at)::int
+  AND fr.funding_round_id IN (SELECT funding_round_id FROM {stg}.funding_rounds_stage);
+"""
+# incremental: years of the fr_rollup cells a step changes, new rows and the older versions they replace
+# (run after delta_prune, so only changed rows are left in stage)
+ROLLUP_TOUCHED = {
+    "funding_rounds": """
+SELECT EXTRACT(YEAR FROM NULLIF(s.funded_at,'')::date)::int FROM {stg}.funding_rounds_stage s
+UNION
+SELECT EXTRACT(YEAR FROM fr.funded_at)::int
+FROM {sch}.funding_rounds fr JOIN {stg}.funding_rounds_stage s ON s.funding_round_id = fr.funding_round_id;
+""",
+    "investments": """
+SELECT EXTRACT(YEAR FROM fr.funded_at)::int
+FROM {stg}.investments_stage s JOIN {sch}.funding_rounds fr ON fr.funding_round_id = s.funding_round_id
+UNION
+SELECT i.funded_year FROM {sch}.investments i JOIN {stg}.investments_stage s ON i.id = NULLIF(s.id,'')::bigint;
+""",
+}
+# --typed: FK lookups are loaded into memory once per load (after the steps that fill them)
+TYPED_LOOKUPS = {
+    "object_keys": "SELECT entity_id, obj_key FROM {sch}.object_keys",
+    "round_years": "SELECT funding_round_id, EXTRACT(YEAR FROM funded_at)::int FROM {sch}.funding_rounds",
+}
+# cells of a cube built before has_object existed count as missing: rebuild everything
+SQL["rollup_empty"] = "SELECT NOT EXISTS (SELECT 1 FROM {sch}.fr_rollup WHERE has_object IS NOT NULL);"
+SQL["column_exists"] = """
+SELECT EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_schema = %s AND table_name = %s AND column_name = %s);
+"""
+SQL["object_keys_empty"] = "SELECT NOT EXISTS (SELECT 1 FROM {sch}.object_keys);"
+
+# rows that the FK-checked insert is going to drop
+SQL["orphans_count"] = "SELECT count(*) FROM {stg}.{stage} s WHERE {missing};"
+MISSING_OBJECT = "NOT EXISTS (SELECT 1 FROM {sch}.object_keys k WHERE k.entity_id = btrim(s.%s))"
+
+# step -> FK predicates of its insert, as "row is an orphan" conditions
+ORPHAN_CHECKS = {
+    "people": [MISSING_OBJECT % "object_id"],
+    "offices": [MISSING_OBJECT % "object_id"],
+    "degrees": [MISSING_OBJECT % "object_id"],
+    "milestones": [MISSING_OBJECT % "object_id"],
+    "funds": [MISSING_OBJECT % "object_id"],
+    "funding_rounds": [MISSING_OBJECT % "object_id"],
+    "investments": [
+        "NOT EXISTS (SELECT 1 FROM {sch}.funding_rounds fr WHERE fr.funding_round_id = s.funding_round_id)",
+        MISSING_OBJECT % "funded_object_id",
+        MISSING_OBJECT % "investor_object_id",
+    ],
+    "acq": [MISSING_OBJECT % "acquiring_object_id", MISSING_OBJECT % "acquired_object_id"],
+    "ipos": [MISSING_OBJECT % "object_id"],
+}
+
+# loader state: what was loaded from each source file
+SQL["loader_state_create"] = """
+CREATE TABLE IF NOT EXISTS {sch}.loader_state (
+  file_name TEXT PRIMARY KEY,
+  size_bytes BIGINT NOT NULL,
+  mtime DOUBLE PRECISION NOT NULL,
+  sha256 TEXT,
+  loaded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+ALTER TABLE {sch}.loader_state ALTER COLUMN sha256 DROP NOT NULL;
+"""
+SQL["loader_state_get"] = "SELECT size_bytes, mtime, sha256 FROM {sch}.loader_state WHERE file_name = %s;"
+SQL["loader_state_put"] = """
+INSERT INTO {sch}.loader_state(file_name, size_bytes, mtime, sha256, loaded_at)
+VALUES (%s, %s, %s, %s, now())
+ON CONFLICT (file_name) DO UPDATE
+SET size_bytes = EXCLUDED.size_bytes, mtime = EXCLUDED.mtime, sha256 = EXCLUDED.sha256, loaded_at = EXCLUDED.loaded_at;
+"""
+
+# materialized report views (sql/materialized.sql), refreshed after every successful load
+MATERIALIZED_VIEWS = ["mv_company_funding", "mv_top_investors", "mv_raised_by_year"]
+SQL["mv_refresh_log_create"] = """
+CREATE TABLE IF NOT EXISTS {sch}.mv_refresh_log (
+  mv_name TEXT NOT NULL,
+  refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+  concurrent BOOLEAN NOT NULL,
+  duration_ms INTEGER NOT NULL,
+  row_count BIGINT NOT NULL
+);
+"""
+SQL["mv_populated"] = "SELECT ispopulated FROM pg_matviews WHERE schemaname = %s AND matviewname = %s;"
+SQL["mv_refresh_log_put"] = """
+INSERT INTO {sch}.mv_refresh_log(mv_name, concurrent, duration_ms, row_count) VALUES (%s, %s, %s, %s);
+"""
+
+# data version: bumped after every load that changed something; report caches key on it
+SQL["data_version_create"] = """
+CREATE TABLE IF NOT EXISTS {sch}.data_version (
+  id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+  version BIGINT NOT NULL,
+  bumped_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+SQL["data_version_bump"] = """
+INSERT INTO {sch}.data_version(id, version, bumped_at) VALUES (true, 1, now())
+ON CONFLICT (id) DO UPDATE SET version = {sch}.data_version.version + 1, bumped_at = now()
+RETURNING version;
+"""
+
+# incremental: drop stage rows the target already has in the same or newer version,
+# then remove the older versions of what is left so the regular *_insert re-adds them
+SQL["delta_prune"] = """
+DELETE FROM {stg}.{stage} s
+USING {sch}.{table} t
+WHERE t.{key} = {stage_key} AND {unchanged};
+"""
+SQL["delta_replace"] = """
+DELETE FROM {sch}.{table} t
+USING {stg}.{stage} s
+WHERE t.{key} = {stage_key};
+"""
+
+UNCHANGED_BY_UPDATED_AT = (
+    "COALESCE(t.updated_at, '-infinity') >= COALESCE(NULLIF(s.updated_at,'')::timestamp, '-infinity')"
+)
+
+# step -> (target table, natural key, same key computed from a stage row, "row is unchanged" predicate)
+INCREMENTAL_KEYS = {
+    "objects": ("objects", "entity_id", "s.entity_id", UNCHANGED_BY_UPDATED_AT),
+    "people": ("people", "object_id", "btrim(s.object_id)",
+               "(t.first_name, t.last_name, t.birthplace, t.affiliation_name)"
+               " IS NOT DISTINCT FROM (s.first_name, s.last_name, s.birthplace, s.affiliation_name)"),
+    "offices": ("offices", "id", "NULLIF(s.id,'')::bigint", UNCHANGED_BY_UPDATED_AT),
+    "degrees": ("degrees", "id", "NULLIF(s.id,'')::bigint", UNCHANGED_BY_UPDATED_AT),
+    "milestones": ("milestones", "id", "NULLIF(s.id,'')::bigint", UNCHANGED_BY_UPDATED_AT),
+    "funds": ("funds", "fund_id", "s.fund_id", UNCHANGED_BY_UPDATED_AT),
+    "funding_rounds": ("funding_rounds", "funding_round_id", "s.funding_round_id", UNCHANGED_BY_UPDATED_AT),
+    "investments": ("investments", "id", "NULLIF(s.id,'')::bigint", UNCHANGED_BY_UPDATED_AT),
+    "acq": ("acquisitions", "acquisition_id", "s.acquisition_id", UNCHANGED_BY_UPDATED_AT),
+    "ipos": ("ipos", "ipo_id", "s.ipo_id", UNCHANGED_BY_UPDATED_AT),
+    "relationships": ("relationships", "relationship_id", "s.relationship_id", UNCHANGED_BY_UPDATED_AT),
+}
+
+STEPS = [
+    ("objects", SQL["objects_stage_drop"], SQL["objects_stage_create"], "objects_stage", "objects.csv", SQL["objects_insert"]),
+    ("people", SQL["people_stage_drop"], SQL["people_stage_create"], "people_stage", "people.csv", SQL["people_insert"]),
+    ("offices", SQL["offices_stage_drop"], SQL["offices_stage_create"], "offices_stage", "offices.csv", SQL["offices_insert"]),
+    ("degrees", SQL["degrees_stage_drop"], SQL["degrees_stage_create"], "degrees_stage", "degrees.csv", SQL["degrees_insert"]),
+    ("milestones", SQL["milestones_stage_drop"], SQL["milestones_stage_create"], "milestones_stage", "milestones.csv", SQL["milestones_insert"]),
+    ("funds", SQL["funds_stage_drop"], SQL["funds_stage_create"], "funds_stage", "funds.csv", SQL["funds_insert"]),
+    ("funding_rounds", SQL["funding_rounds_stage_drop"], SQL["funding_rounds_stage_create"], "funding_rounds_stage", "funding_rounds.csv", SQL["funding_rounds_insert"]),
+    ("investments", SQL["investments_stage_drop"], SQL["investments_stage_create"], "investments_stage", "investments.csv", SQL["investments_insert"]),
+    ("acq", SQL["acq_stage_drop"], SQL["acq_stage_create"], "acq_stage", "acquisitions.csv", SQL["acq_insert"]),
+    ("ipos", SQL["ipos_stage_drop"], SQL["ipos_stage_create"], "ipos_stage", "ipos.csv", SQL["ipos_insert"]),
+    ("relationships", SQL["relationships_stage_drop"], SQL["relationships_stage_create"], "relationships_stage", "relationships.csv", SQL["relationships_insert"]),
+]
+
+INDEX_RE = re.compile(r"CREATE\s+INDEX\s+IF\s+NOT\s+EXISTS\s+(\w+)\s+ON\s+\w+\.(\w+)(.*?);", re.I | re.S)
+
+def secondary_indexes(schema: str, path: str = INDICES_SQL) -> list[tuple[str, str]]:
+    """(имя, DDL) индексов из sql/indices.sql, перенесённых в схему `schema`."""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    return [(name, f"CREATE INDEX IF NOT EXISTS {name} ON {schema}.{table}{rest.rstrip()};")
+            for name, table, rest in INDEX_RE.findall(text)]
+
+# step -> steps whose rows its FK checks read
+STEP_DEPS = {
+    "objects": (),
+    "people": ("objects",),
+    "offices": ("objects",),
+    "degrees": ("objects",),
+    "milestones": ("objects",),
+    "funds": ("objects",),
+    "funding_rounds": ("objects",),
+    "investments": ("objects", "funding_rounds"),
+    "acq": ("objects",),
+    "ipos": ("objects",),
+    "relationships": ("objects",),
+}
+
 class CBLoader:
-    def __init__(self, conn, schema: str, data_dir: str):
+    def __init__(self, conn, schema: str, data_dir: str, dsn: dict | None = None, incremental: bool = False,
+                 bulk: bool = False, stage_kind: str = 'unlogged', maintenance_work_mem: str = '512MB',
+                 typed: bool = False, reject_dir: str = DEFAULT_REJECT_DIR, count_orphans: bool = False):
+        if typed and incremental:
+            raise ValueError("typed load writes straight into target tables, it cannot do incremental deltas")
         self.conn = conn
         self.schema = schema
         self.data_dir = data_dir
+        self.dsn = dsn
+        self.incremental = incremental
+        self.bulk = bulk
+        self.stage_kind = stage_kind
+        self.maintenance_work_mem = maintenance_work_mem
+        self.typed = typed
+        self.count_orphans = count_orphans
+        self.reject_dir = reject_dir
+        # TEMP-стейджинг живёт в pg_temp своей сессии: шаг его и создаёт, и читает
+        self.stage_schema = 'pg_temp' if bulk and stage_kind == 'temp' else schema
+        self.timings = {}
+        self.skipped = set()
+        self.rejected = {}
+        self.invalid = {}
+        self._lookups = {}
+        self._lookups_lock = threading.Lock()
+        # fr_rollup: full rebuild after a full load or changed objects (country), else only these years
+        self.rollup_full = not incremental
+        self.rollup_years = set()
+        self._abort = threading.Event()
+        self._active = {}
+        self._active_lock = threading.Lock()
 
-    def copy_csv(self, full_table: str, csv_path: str):
+    def copy_csv(self, full_table: str, csv_path: str, conn=None) -> int:
+        """COPY файла в таблицу; возвращает число строк (по статусу COPY)."""
+        conn = conn or self.conn
         sql = f"COPY {full_table} FROM STDIN WITH (FORMAT csv, HEADER true, DELIMITER ',', ENCODING 'UTF8', QUOTE '\"', ESCAPE '\"', NULL '');"
-        with open(csv_path, 'r', encoding='utf-8', newline='') as f:
-            self.conn.cursor().copy_expert(sql, f)
+        with open(csv_path, 'r', encoding='utf-8', newline='') as f, conn.cursor() as cur:
+            cur.copy_expert(sql, f)
+            return cur.rowcount
 
-    def run_step(self, name: str, drop_sql: str, create_sql: str, stage_table: str, csv_file: str, insert_sql: str):
-        cur = self.conn.cursor()
-        sch = self.schema
+    def file_unchanged(self, cur, csv_file: str, csv_path: str):
+        """Сверяет файл с loader_state. Возвращает (unchanged, (size, mtime, sha256)).
+
+        Совпали размер и mtime — файл считается прежним без чтения; иначе решает хеш.
+        Полная загрузка файл не хеширует (лишнее чтение всего CSV): sha256 остаётся NULL
+        и считается при следующем --incremental, если размер или mtime разойдутся.
+        """
+        st = os.stat(csv_path)
+        cur.execute(SQL["loader_state_get"].format(sch=self.schema), (csv_file,))
+        prev = cur.fetchone()
+        if prev and prev[0] == st.st_size and prev[1] == st.st_mtime:
+            return True, (st.st_size, st.st_mtime, prev[2])
+        if not self.incremental:
+            return False, (st.st_size, st.st_mtime, None)
+        digest = file_sha256(csv_path)
+        return bool(prev and prev[0] == st.st_size and prev[2] == digest), (st.st_size, st.st_mtime, digest)
+
+    def object_keys_missing(self, cur) -> bool:
+        cur.execute(SQL["object_keys_exists"].format(sch=self.schema))
+        if not cur.fetchone()[0]:
+            return True
+        cur.execute(SQL["object_keys_empty"].format(sch=self.schema))
+        return cur.fetchone()[0]
+
+    def run_step(self, name: str, drop_sql: str, create_sql: str, stage_table: str, csv_file: str, insert_sql: str, conn=None):
+        conn = conn or self.conn
+        t0 = time.perf_counter()
+        cur = conn.cursor()
+        sch, stg = self.schema, self.stage_schema
         csv_path = os.path.join(self.data_dir, csv_file)
+        unchanged, state = self.file_unchanged(cur, csv_file, csv_path)
+        if self.incremental and unchanged:
+            cur.execute(SQL["loader_state_put"].format(sch=sch), (csv_file, *state))
+            if name == 'objects' and self.object_keys_missing(cur):
+                # UNLOGGED-таблица пустеет после сбоя сервера — пересобираем
+                cur.execute(SQL["object_keys_build"].format(sch=sch))
+            conn.commit()
+            cur.close()
+            self.skipped.add(name)
+            self.timings[name] = time.perf_counter() - t0
+            metrics.observe_step(name, self.timings[name], 'loader')
+            log.info("⏭  %s: %s unchanged, skipped", name, csv_file)
+            return
+        if self.bulk:
+            cur.execute("SET synchronous_commit TO off;")
+        if self.typed:
+            log.info("➡️  %s: typed COPY %s -> %s", name, csv_path, qname(sch, name if name != 'acq' else 'acquisitions'))
+            t_copy = time.perf_counter()
+            staged, inserted = self.run_typed(cur, name, create_sql, csv_path, csv_file)
+            metrics.record_copy(name, staged, state[0], time.perf_counter() - t_copy)
+        else:
+            staged, inserted = self.run_staged(cur, name, drop_sql, create_sql, stage_table, csv_path, insert_sql)
+        if name == 'objects':
+            cur.execute(SQL["object_keys_build"].format(sch=sch))
+        cur.execute(SQL["loader_state_put"].format(sch=sch), (csv_file, *state))
+        if self.bulk and not self.typed:
+            cur.execute(drop_sql.format(sch=sch, stg=stg))
+        conn.commit()
+        cur.close()
+        self.timings[name] = time.perf_counter() - t0
+        metrics.record_insert(name, inserted, self.rejected.get(name, 0))
+        metrics.observe_step(name, self.timings[name], 'loader')
+        log.info("✅ %s done in %.1fs, %d staged, %d inserted", name, self.timings[name], staged, inserted)
+
+    def run_staged(self, cur, name: str, drop_sql: str, create_sql: str, stage_table: str, csv_path: str,
+                   insert_sql: str) -> tuple[int, int]:
+        """Обычный путь: COPY CSV в текстовый staging, затем INSERT ... SELECT с приведением типов и FK-проверками."""
+        sch, stg = self.schema, self.stage_schema
         log.info("➡️  %s: staging %s", name, csv_path)
-        cur.execute(drop_sql.format(sch=sch))
-        cur.execute(create_sql.format(sch=sch))
-        self.copy_csv(qname(sch, stage_table), csv_path)
+        if self.bulk and self.stage_kind == 'unlogged':
+            create_sql = create_sql.replace("CREATE TABLE", "CREATE UNLOGGED TABLE", 1)
+        cur.execute(drop_sql.format(sch=sch, stg=stg))
+        cur.execute(create_sql.format(sch=sch, stg=stg))
+        t_copy = time.perf_counter()
+        staged = self.copy_csv(qname(stg, stage_table), csv_path, conn=cur.connection)
+        metrics.record_copy(name, staged, os.path.getsize(csv_path), time.perf_counter() - t_copy)
+        pruned = 0
+        if self.incremental:
+            table, key, stage_key, same = INCREMENTAL_KEYS[name]
+            fmt = dict(sch=sch, stg=stg, stage=stage_table, table=table, key=key, stage_key=stage_key, unchanged=same)
+            cur.execute(SQL["delta_prune"].format(**fmt))
+            pruned = cur.rowcount
+            if name in ROLLUP_TOUCHED:
+                cur.execute(ROLLUP_TOUCHED[name].format(sch=sch, stg=stg))
+                self.rollup_years.update(r[0] for r in cur.fetchall())
+            elif name == 'objects':
+                self.rollup_full = True
+            cur.execute(SQL["delta_replace"].format(**fmt))
+            log.info("➡️  %s: %d unchanged row(s) pruned, %d older version(s) replaced", name, pruned, cur.rowcount)
+        if name in ORPHAN_CHECKS and self.count_orphans:
+            # exact count costs a second anti-join pass over staging, hence behind --count-orphans
+            missing = " OR ".join(c.format(sch=sch) for c in ORPHAN_CHECKS[name])
+            cur.execute(SQL["orphans_count"].format(stg=stg, stage=stage_table, missing=missing))
+            self.rejected[name] = cur.fetchone()[0]
+            if self.rejected[name]:
+                log.warning("⚠️  %s: %d orphan row(s) rejected by FK check", name, self.rejected[name])
+        if name == 'funding_rounds':
+            cur.execute(SQL["stage_years"].format(stg=stg))
+            ensure_year_partitions(cur, sch, [r[0] for r in cur.fetchall()])
         log.info("➡️  %s: inserting into %s", name, qname(sch, name if name != 'acq' else 'acquisitions'))
-        cur.execute(insert_sql.format(sch=sch))
+        cur.execute(insert_sql.format(sch=sch, stg=stg))
+        inserted = cur.rowcount
+        if name in ORPHAN_CHECKS and not self.count_orphans:
+            # staged rows the insert did not take: FK orphans plus duplicate ids
+            self.rejected[name] = max(0, staged - pruned - inserted)
+            if self.rejected[name]:
+                log.warning("⚠️  %s: %d staged row(s) not inserted (orphans or duplicates)", name, self.rejected[name])
+        if name == 'funding_rounds' and self.incremental:
+            cur.execute(SQL["investments_year_sync"].format(sch=sch, stg=stg))
+            if cur.rowcount:
+                log.info("➡️  %s: %d investment(s) moved to another funded_year", name, cur.rowcount)
+        return staged, inserted
+
+    def run_typed(self, cur, name: str, create_sql: str, csv_path: str, csv_file: str) -> tuple[int, int]:
+        """--typed: CSV разбирается в pandas и идёт binary COPY прямо в целевую таблицу, без staging.
+
+        Плохие значения и «висячие» ссылки — в <reject_dir>/<файл>.rejects.csv с номерами строк.
+        """
+        from typed_copy import SPECS, Rejects, read_chunks, copy_binary, copy_out, target_types
+        spec = SPECS[name]
+        sch = self.schema
+        types = target_types(cur, sch, spec.table)
+        needs_keys = spec.fk or any(k == "key" for _, _, k in spec.columns)
+        object_keys = self._lookup(cur, "object_keys") if needs_keys else None
+        round_years = self._lookup(cur, "round_years") if any(k == "year" for _, _, k in spec.columns) else None
+        existing = set()
+        if spec.unique:
+            df = copy_out(cur, f"SELECT {spec.unique} FROM {sch}.{spec.table} WHERE {spec.unique} IS NOT NULL")
+            existing = set(df[0]) if len(df.columns) else set()
+        os.makedirs(self.reject_dir, exist_ok=True)
+        reject_path = os.path.join(self.reject_dir, f"{csv_file}.rejects.csv")
+        if os.path.exists(reject_path):
+            os.remove(reject_path)
+        rejects = Rejects(reject_path)
+        staged = inserted = orphans = invalid = 0
+        try:
+            for frame, n, read, orphan, bad in read_chunks(csv_path, re.findall(r"(\w+) TEXT", create_sql), spec,
+                                                           types, object_keys, round_years, existing, rejects):
+                if name == 'funding_rounds':
+                    ensure_year_partitions(cur, sch, frame["funded_at"].dt.year.dropna().astype(int).unique().tolist())
+                inserted += copy_binary(cur, sch, spec, types, frame, n)
+                staged, orphans, invalid = staged + read, orphans + orphan, invalid + bad
+        finally:
+            rejects.close()
+        self.rejected[name], self.invalid[name] = orphans, invalid
+        if rejects.count:
+            log.warning("⚠️  %s: %d orphan row(s), %d row(s) with invalid values -> %s",
+                        name, orphans, invalid, reject_path)
+        return staged, inserted
+
+    def _lookup(self, cur, name: str):
+        """Справочник для --typed (entity_id -> obj_key, funding_round_id -> год), один раз на загрузку."""
+        from typed_copy import copy_out
+        with self._lookups_lock:
+            if name not in self._lookups:
+                df = copy_out(cur, TYPED_LOOKUPS[name].format(sch=self.schema))
+                if len(df.columns) < 2:  # пустая таблица
+                    df = df.reindex(columns=[0, 1])
+                self._lookups[name] = df.set_index(0)[1]
+                log.info("📇 %s: %d key(s) loaded for typed COPY", name, len(df))
+            return self._lookups[name]
+
+    def load_all(self, jobs: int = 1):
+        t0 = time.perf_counter()
+        dropped = self.drop_secondary_indexes() if self.bulk else []
+        try:
+            if jobs > 1:
+                self._load_parallel(jobs)
+            else:
+                for s in STEPS:
+                    self.run_step(*s)
+        finally:
+            # индексы возвращаем и после упавшей загрузки, чтобы не оставить базу без них
+            if dropped:
+                self.rebuild_indexes(dropped, jobs)
+        analyze_partitioned(self.conn, self.schema, [t for t, *_ in PARTITIONED_TABLES if t not in self.skipped])
+        self.log_timings(time.perf_counter() - t0)
+
+    def drop_secondary_indexes(self) -> list[tuple[str, str]]:
+        """Сносит индексы из sql/indices.sql перед массовой вставкой.
+
+        Уникальные индексы под ON CONFLICT в indices.sql не входят и остаются.
+        """
+        indexes = secondary_indexes(self.schema)
+        with self.conn.cursor() as cur:
+            for name, _ in indexes:
+                cur.execute(f"DROP INDEX IF EXISTS {self.schema}.{name};")
         self.conn.commit()
-        cur.close()
-        log.info("✅ %s done", name)
-
-    def load_all(self):
-        steps = [
-            ("objects", SQL["objects_stage_drop"], SQL["objects_stage_create"], "objects_stage", "objects.csv", SQL["objects_insert"]),
-            ("people", SQL["people_stage_drop"], SQL["people_stage_create"], "people_stage", "people.csv", SQL["people_insert"]),
-            ("offices", SQL["offices_stage_drop"], SQL["offices_stage_create"], "offices_stage", "offices.csv", SQL["offices_insert"]),
-            ("degrees", SQL["degrees_stage_drop"], SQL["degrees_stage_create"], "degrees_stage", "degrees.csv", SQL["degrees_insert"]),
-            ("milestones", SQL["milestones_stage_drop"], SQL["milestones_stage_create"], "milestones_stage", "milestones.csv", SQL["milestones_insert"]),
-            ("funds", SQL["funds_stage_drop"], SQL["funds_stage_create"], "funds_stage", "funds.csv", SQL["funds_insert"]),
-            ("funding_rounds", SQL["funding_rounds_stage_drop"], SQL["funding_rounds_stage_create"], "funding_rounds_stage", "funding_rounds.csv", SQL["funding_rounds_insert"]),
-            ("investments", SQL["investments_stage_drop"], SQL["investments_stage_create"], "investments_stage", "investments.csv", SQL["investments_insert"]),
-            ("acq", SQL["acq_stage_drop"], SQL["acq_stage_create"], "acq_stage", "acquisitions.csv", SQL["acq_insert"]),
-            ("ipos", SQL["ipos_stage_drop"], SQL["ipos_stage_create"], "ipos_stage", "ipos.csv", SQL["ipos_insert"]),
-            ("relationships", SQL["relationships_stage_drop"], SQL["relationships_stage_create"], "relationships_stage", "relationships.csv", SQL["relationships_insert"]),
-        ]
-        for s in steps:
-            self.run_step(*s)
+        log.info("🧹 dropped %d secondary index(es) for bulk load", len(indexes))
+        return indexes
+
+    def rebuild_indexes(self, indexes: list[tuple[str, str]], jobs: int = 1):
+        t0 = time.perf_counter()
+
+        def build(conn, name, ddl):
+            t = time.perf_counter()
+            with conn.cursor() as cur:
+                cur.execute(f"SET maintenance_work_mem TO '{self.maintenance_work_mem}';")
+                cur.execute(ddl)
+            conn.commit()
+            log.info("🔧 %s rebuilt in %.1fs", name, time.perf_counter() - t)
+
+        if jobs > 1 and self.dsn:
+            pool = ThreadedConnectionPool(1, jobs, **self.dsn)
+
+            def build_pooled(item):
+                conn = pool.getconn()
+                try:
+                    build(conn, *item)
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    pool.putconn(conn)
+
+            try:
+                with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="cbindex") as ex:
+                    list(ex.map(build_pooled, indexes))
+            finally:
+                pool.closeall()
+        else:
+            self.conn.rollback()
+            for item in indexes:
+                build(self.conn, *item)
+        log.info("🔧 %d index(es) rebuilt in %.1fs", len(indexes), time.perf_counter() - t0)
+
+    def _load_parallel(self, jobs: int):
+        """Запускает шаги по графу STEP_DEPS на пуле из `jobs` соединений.
+
+        При первой ошибке новые шаги не стартуют, запросы остальных отменяются,
+        исходное исключение пробрасывается наружу.
+        """
+        if not self.dsn:
+            raise ValueError("parallel load needs connection parameters (dsn)")
+        pending = {s[0]: s for s in STEPS}
+        done = set()
+        running = {}
+        failed = None
+        pool = ThreadedConnectionPool(1, jobs, **self.dsn)
+        try:
+            with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="cbload") as ex:
+                while running or (failed is None and pending):
+                    if failed is None:
+                        ready = [n for n in pending if all(d in done for d in STEP_DEPS[n])]
+                        for n in ready:
+                            running[ex.submit(self._run_pooled, pool, pending.pop(n))] = n
+                    if not running:
+                        raise RuntimeError(f"unresolvable step dependencies: {sorted(pending)}")
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        name = running.pop(fut)
+                        try:
+                            fut.result()
+                        except Exception as e:
+                            if failed is None:
+                                failed = e
+                                log.error("❌ %s failed: %s — cancelling %d running step(s)", name, e, len(running))
+                                self._cancel_running()
+                            else:
+                                log.warning("⚠️  %s aborted: %s", name, e)
+                        else:
+                            done.add(name)
+        finally:
+            pool.closeall()
+        if failed is not None:
+            skipped = sorted(pending)
+            if skipped:
+                log.error("not started: %s", ", ".join(skipped))
+            raise failed
+
+    def _run_pooled(self, pool, step):
+        name = step[0]
+        if self._abort.is_set():
+            raise RuntimeError(f"{name}: load aborted")
+        t_wait = time.perf_counter()
+        with metrics.connection_wait('loader'):
+            conn = pool.getconn()
+        log.debug("%s: got connection in %.3fs", name, time.perf_counter() - t_wait)
+        with self._active_lock:
+            self._active[name] = conn
+        try:
+            self.run_step(*step, conn=conn)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            with self._active_lock:
+                self._active.pop(name, None)
+            pool.putconn(conn)
+
+    def _cancel_running(self):
+        self._abort.set()
+        with self._active_lock:
+            for conn in self._active.values():
+                conn.cancel()
+
+    def log_timings(self, wall: float):
+        for name, sec in sorted(self.timings.items(), key=lambda kv: kv[1], reverse=True):
+            log.info("⏱  %-15s %8.1fs", name, sec)
+        log.info("⏱  steps total %.1fs, wall %.1fs", sum(self.timings.values()), wall)
+        if self.rejected:
+            log.info("🚫 staged rows rejected: %s",
+                     ", ".join(f"{n}={c}" for n, c in sorted(self.rejected.items())))
+        if any(self.invalid.values()):
+            log.info("🚫 rows with invalid values rejected: %s (see %s)",
+                     ", ".join(f"{n}={c}" for n, c in sorted(self.invalid.items()) if c), self.reject_dir)
+
+def file_sha256(path: str, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk), b''):
+            h.update(block)
+    return h.hexdigest()
 
 def ensure_schema(conn, schema: str):
     with conn.cursor() as cur:
         cur.execute(f"CREATE SCHEMA IF NOT EXISTS {schema};")
+        cur.execute(SQL["loader_state_create"].format(sch=schema))
+        cur.execute(SQL["norm_id_function"])
+        cur.execute(SQL["mv_refresh_log_create"].format(sch=schema))
+        cur.execute(SQL["data_version_create"].format(sch=schema))
+        conn.commit()
+    ensure_key_columns(conn, schema)
+    ensure_partitioned(conn, schema)
+    rollup.ensure_table(conn, schema)
+
+def ensure_key_columns(conn, schema: str):
+    """Добавляет колонки канонических ключей; только что добавленные заполняет по уже загруженным строкам."""
+    with conn.cursor() as cur:
+        for table, column, backfill in KEY_COLUMNS:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL;", (qname(schema, table),))
+            if not cur.fetchone()[0]:
+                continue
+            cur.execute(SQL["column_exists"], (schema, table, column))
+            if cur.fetchone()[0]:
+                continue
+            cur.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {column} TEXT;")
+            cur.execute(backfill.format(sch=schema))
+            log.info("🔑 %s.%s added, %d existing row(s) backfilled", table, column, cur.rowcount)
+        conn.commit()
+
+def _bound(kind: str, year: int) -> str:
+    return f"'{year}-01-01'" if kind == "date" else str(year)
+
+def _year(key: str, kind: str) -> str:
+    return f"EXTRACT(YEAR FROM {key})::int" if kind == "date" else key
+
+def ensure_year_partitions(cur, schema: str, years, tables=None):
+    """Создаёт годовые партиции `tables` (по умолчанию funding_rounds и investments) для `years` от PARTITION_FROM."""
+    for year in sorted({y for y in years if y is not None and y >= PARTITION_FROM}):
+        for table, _, kind, _ in PARTITIONED_TABLES:
+            if tables is not None and table not in tables:
+                continue
+            cur.execute(SQL["partition_create"].format(sch=schema, table=table, year=year,
+                                                       lo=_bound(kind, year), hi=_bound(kind, year + 1)))
+
+def ensure_partitioned(conn, schema: str):
+    """Одноразовая миграция: funding_rounds и investments -> таблицы с разбиением по годам.
+
+    Данные копируются в новую таблицу, старая удаляется вместе с зависимыми вьюхами —
+    их, индексы из sql/indices.sql и materialized.sql после миграции создаём заново.
+    """
+    migrated, partitioned = False, []
+    with conn.cursor() as cur:
+        for table, key, kind, backfill in PARTITIONED_TABLES:
+            cur.execute(SQL["relkind"], (schema, table))
+            row = cur.fetchone()
+            if row is None:
+                continue
+            partitioned.append(table)
+            if row[0] == 'p':
+                continue
+            t0 = time.perf_counter()
+            if backfill:
+                cur.execute(SQL["column_exists"], (schema, table, key))
+                if not cur.fetchone()[0]:
+                    cur.execute(f"ALTER TABLE {schema}.{table} ADD COLUMN {key} {kind.upper()};")
+                    cur.execute(backfill.format(sch=schema))
+            cur.execute(SQL["partition_migrate"].format(sch=schema, table=table, key=key, first=PARTITION_FROM,
+                                                        first_bound=_bound(kind, PARTITION_FROM)))
+            cur.execute(SQL["partition_years"].format(sch=schema, table=f"{table}_unpartitioned",
+                                                      key=key, year=_year(key, kind)))
+            ensure_year_partitions(cur, schema, [r[0] for r in cur.fetchall()], [table])
+            cur.execute(SQL["partition_copy"].format(sch=schema, table=table))
+            moved = cur.rowcount
+            cur.execute(SQL["partition_drop_old"].format(sch=schema, table=table))
+            log.info("🗂  %s partitioned by %s, %d row(s) moved in %.1fs",
+                     qname(schema, table), key, moved, time.perf_counter() - t0)
+            migrated = True
+        if migrated:
+            # годы одной таблицы должны быть партициями и в другой: дальше их создаёт шаг funding_rounds
+            for table, key, kind, _ in PARTITIONED_TABLES:
+                if table in partitioned:
+                    cur.execute(SQL["partition_years"].format(sch=schema, table=table, key=key, year=_year(key, kind)))
+                    ensure_year_partitions(cur, schema, [r[0] for r in cur.fetchall()], partitioned)
         conn.commit()
+    if migrated:
+        analyze_partitioned(conn, schema, partitioned)
+        reapply_report_ddl(conn, schema)
+
+def analyze_partitioned(conn, schema: str, tables: list[str]):
+    """ANALYZE родителей с разбиением: autovacuum их не анализирует, и без этого у них
+    reltuples = -1 и пустой pg_stats (на этом стоят оценки quality.fast_metrics и планы по всей таблице)."""
+    with conn.cursor() as cur:
+        for table in tables:
+            cur.execute(SQL["relkind"], (schema, table))
+            row = cur.fetchone()
+            if row and row[0] == 'p':
+                t0 = time.perf_counter()
+                cur.execute(f"ANALYZE {schema}.{table};")
+                log.info("📊 %s analyzed in %.1fs", qname(schema, table), time.perf_counter() - t0)
+    conn.commit()
+
+def reapply_report_ddl(conn, schema: str):
+    """views.sql, materialized.sql и indices.sql после пересоздания таблиц (DROP ... CASCADE снёс вьюхи)."""
+    if schema != DEFAULT_SCHEMA:
+        log.warning("⚠️  views/materialized views are defined for schema %s only — recreate them by hand", DEFAULT_SCHEMA)
+    else:
+        for name in ("views.sql", "materialized.sql"):
+            with open(os.path.join(SQL_DIR, name), 'r', encoding='utf-8') as f, conn.cursor() as cur:
+                cur.execute(f.read())
+            log.info("🔁 %s re-applied", name)
+    with conn.cursor() as cur:
+        for _, ddl in secondary_indexes(schema):
+            cur.execute(ddl)
+    conn.commit()
+
+def bump_data_version(conn, schema: str) -> int:
+    with conn.cursor() as cur:
+        cur.execute(SQL["data_version_bump"].format(sch=schema))
+        version = cur.fetchone()[0]
+    conn.commit()
+    log.info("🏷  data version %d", version)
+    return version
+
+def refresh_rollup(conn, schema: str, loader: 'CBLoader | None' = None):
+    """Пересчёт cb.fr_rollup: только затронутые загрузкой годы, если это возможно, иначе целиком."""
+    with conn.cursor() as cur:
+        cur.execute(SQL["rollup_empty"].format(sch=schema))
+        empty = cur.fetchone()[0]
+    conn.commit()
+    years = None if empty or loader is None or loader.rollup_full else loader.rollup_years
+    if years is not None and not years:
+        log.info("🧊 fr_rollup: no funding years touched, skipped")
+        return
+    rows, sec = rollup.refresh(conn, schema, years)
+    metrics.observe_step("refresh:fr_rollup", sec, 'loader')
+    scope = "all years" if years is None else f"{len(years)} year(s)"
+    log.info("🧊 fr_rollup rebuilt for %s in %.1fs, %d cell(s)", scope, sec, rows)
+
+def refresh_materialized(conn, schema: str):
+    """REFRESH материализованных вьюх (CONCURRENTLY, если уже заполнены) с записью в mv_refresh_log.
+
+    Сами вьюхи создаёт run_assignment.py из sql/materialized.sql; отсутствующие пропускаются.
+    """
+    with conn.cursor() as cur:
+        for mv in MATERIALIZED_VIEWS:
+            cur.execute(SQL["mv_populated"], (schema, mv))
+            row = cur.fetchone()
+            if row is None:
+                log.warning("⚠️  %s not found — run run_assignment.py once to create it", qname(schema, mv))
+                continue
+            concurrent = bool(row[0])
+            t0 = time.perf_counter()
+            cur.execute(f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrent else ''}{qname(schema, mv)};")
+            ms = int((time.perf_counter() - t0) * 1000)
+            metrics.observe_step(f"refresh:{mv}", ms / 1000, 'loader')
+            cur.execute(f"SELECT count(*) FROM {qname(schema, mv)};")
+            rows = cur.fetchone()[0]
+            cur.execute(SQL["mv_refresh_log_put"].format(sch=schema), (mv, concurrent, ms, rows))
+            conn.commit()
+            log.info("🔄 %s refreshed%s in %.1fs, %d row(s)", mv, " concurrently" if concurrent else "", ms / 1000, rows)
 
 def main():
     ap = argparse.ArgumentParser(description="Crunchbase-like CSV loader (staging + cast + FK-checked inserts)")
@@ -341,19 +1089,58 @@ def main():
     ap.add_argument("--password", default=DB_CONFIG['password'])
     ap.add_argument("--schema", default=DEFAULT_SCHEMA)
     ap.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="parallel steps on N connections (objects first, then the rest by dependency graph)")
+    ap.add_argument("--incremental", action="store_true",
+                    help="skip unchanged files (size/mtime/sha256 in loader_state), upsert only new or changed rows")
+    ap.add_argument("--bulk", action="store_true",
+                    help="cold load: UNLOGGED/TEMP staging, drop indices.sql indexes before inserts, rebuild after")
+    ap.add_argument("--stage-kind", choices=["unlogged", "temp"], default="unlogged",
+                    help="staging table kind in --bulk mode")
+    ap.add_argument("--maintenance-work-mem", default="512MB",
+                    help="maintenance_work_mem for index rebuilds in --bulk mode")
+    ap.add_argument("--count-orphans", action="store_true",
+                    help="count FK orphans exactly with an extra anti-join over staging "
+                         "(default: staged minus inserted rows, which also includes duplicates)")
+    ap.add_argument("--typed", action="store_true",
+                    help="parse CSVs in Python and binary-COPY them straight into target tables (no text staging); "
+                         "rows with invalid values or broken references go to --reject-dir")
+    ap.add_argument("--reject-dir", default=DEFAULT_REJECT_DIR,
+                    help="where --typed writes <file>.rejects.csv (line, column, value, reason)")
+    ap.add_argument("--refresh-only", action="store_true",
+                    help="only rebuild fr_rollup and refresh materialized report views, load nothing")
+    ap.add_argument("--no-refresh", action="store_true",
+                    help="do not refresh materialized report views after the load")
+    metrics.add_arguments(ap)
     args = ap.parse_args()
+    if args.typed and args.incremental:
+        ap.error("--typed loads straight into target tables and cannot be combined with --incremental")
+    metrics.configure(args, 'loader')
 
-    conn = psycopg2.connect(
-        host=args.host, port=args.port, dbname=args.dbname,
-        user=args.user, password=args.password
-    )
+    dsn = dict(host=args.host, port=args.port, dbname=args.dbname,
+               user=args.user, password=args.password)
+    with metrics.connection_wait():
+        conn = psycopg2.connect(**dsn)
     try:
         ensure_schema(conn, args.schema)
-        loader = CBLoader(conn, args.schema, args.data_dir)
-        loader.load_all()
+        if args.refresh_only:
+            refresh_rollup(conn, args.schema)
+            refresh_materialized(conn, args.schema)
+            return
+        loader = CBLoader(conn, args.schema, args.data_dir, dsn=dsn, incremental=args.incremental,
+                          bulk=args.bulk, stage_kind=args.stage_kind,
+                          maintenance_work_mem=args.maintenance_work_mem,
+                          typed=args.typed, reject_dir=args.reject_dir, count_orphans=args.count_orphans)
+        loader.load_all(jobs=args.jobs)
+        if len(loader.skipped) < len(STEPS):
+            refresh_rollup(conn, args.schema, loader)
+            if not args.no_refresh:
+                refresh_materialized(conn, args.schema)
+            bump_data_version(conn, args.schema)
         log.info("🎉 All done!")
     finally:
         conn.close()
+        metrics.flush()
 
 if __name__ == "__main__":
     main()
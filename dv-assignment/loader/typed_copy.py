@@ -0,0 +1,314 @@
+"""Типизированная загрузка CSV: разбор и проверка в pandas по чанкам, binary COPY сразу в целевые таблицы.
+
+Без текстового staging и второго прохода INSERT ... SELECT NULLIF(x,'')::type: каждое значение
+разбирается один раз. Строки с неразбираемыми значениями и «висячими» ссылками не грузятся,
+а пишутся в файл отбраковки (номер строки, колонка, значение, причина).
+"""
+import io
+import re
+import csv
+import struct
+from decimal import Decimal
+from itertools import chain, repeat
+import pandas as pd
+
+CHUNK_ROWS = 200_000
+BOOL_TRUE = ["t", "true", "1", "yes"]
+PG_EPOCH = pd.Timestamp("2000-01-01")
+NUMERIC_RE = r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$"
+
+# column spec: "col" (text), "col:kind" (parse the same-named CSV column), "col=fn(src)" (derived)
+# kinds mirror the casts of the SQL *_insert statements in load_cb.py; trim = btrim(...)
+COLUMN_RE = re.compile(r"(\w+)(?::(\w+)|=(\w+)\((\w+)\))?")
+
+
+class Spec:
+    def __init__(self, table: str, columns: str, fk=(), unique: str | None = None, keep: str = "first"):
+        self.table = table
+        self.columns = []  # (target column, source column, kind)
+        for token in columns.split():
+            col, kind, fn, src = COLUMN_RE.fullmatch(token).groups()
+            self.columns.append((col, src or col, fn or kind or "text"))
+        self.fk = fk          # source columns that must reference objects.entity_id (after btrim)
+        self.unique = unique  # target column with ON CONFLICT semantics in the SQL path
+        self.keep = keep      # first — first row of a key wins; newest — max updated_at wins (DISTINCT ON)
+
+
+SPECS = {
+    "objects": Spec("objects", """
+        id entity_type entity_id parent_id name normalized_name permalink category_code status
+        founded_at:date closed_at:date domain homepage_url twitter_username logo_url logo_width:int logo_height:int
+        short_description description overview tag_list country_code state_code city region
+        first_investment_at:date last_investment_at:date investment_rounds:int invested_companies:int
+        first_funding_at:date last_funding_at:date funding_rounds:int funding_total_usd:numeric
+        first_milestone_at:date last_milestone_at:date milestones:int relationships:int
+        created_by created_at:ts updated_at:ts obj_key=norm(id)""", unique="entity_id", keep="newest"),
+    "people": Spec("people", "id:int object_id:trim first_name last_name birthplace affiliation_name",
+                   fk=("object_id",), unique="object_id"),
+    "offices": Spec("offices", """
+        id:int object_id:trim office_id description region address1 address2 city zip_code state_code
+        country_code latitude:float longitude:float created_at:ts updated_at:ts""", fk=("object_id",)),
+    "degrees": Spec("degrees", """
+        id:int object_id:trim degree_type subject institution graduated_at:date created_at:ts updated_at:ts""",
+                    fk=("object_id",)),
+    "milestones": Spec("milestones", """
+        id:int object_id:trim milestone_at:date milestone_code description source_url source_description
+        created_at:ts updated_at:ts""", fk=("object_id",)),
+    "funds": Spec("funds", """
+        id:int fund_id object_id:trim name funded_at:date raised_amount:numeric raised_currency_code
+        created_at:ts updated_at:ts source_url source_description""", fk=("object_id",), unique="fund_id"),
+    "funding_rounds": Spec("funding_rounds", """
+        id:int funding_round_id object_id:trim funded_at:date funding_round_type funding_round_code
+        raised_amount:numeric raised_amount_usd:numeric raised_currency_code
+        pre_money_valuation:numeric pre_money_valuation_usd:numeric pre_money_currency_code
+        post_money_valuation:numeric post_money_valuation_usd:numeric post_money_currency_code
+        participants:int is_first_round:bool is_last_round:bool source_url source_description created_by
+        created_at:ts updated_at:ts object_key=key(object_id)""", unique="funding_round_id", keep="newest"),
+    "investments": Spec("investments", """
+        id:int funding_round_id funded_object_id:trim investor_object_id:trim created_at:ts updated_at:ts
+        funded_object_key=key(funded_object_id) investor_object_key=key(investor_object_id)
+        funded_year=year(funding_round_id)"""),
+    "acq": Spec("acquisitions", """
+        id:int acquisition_id acquiring_object_id:trim acquired_object_id:trim term_code
+        price_amount:numeric price_currency_code acquired_at:date source_url source_description
+        created_at:ts updated_at:ts
+        acquiring_object_key=key(acquiring_object_id) acquired_object_key=key(acquired_object_id)""",
+                unique="acquisition_id"),
+    "ipos": Spec("ipos", """
+        id:int ipo_id object_id:trim valuation_amount:numeric valuation_currency_code raised_amount:numeric
+        raised_currency_code public_at:date stock_symbol source_url source_description
+        created_at:ts updated_at:ts""", fk=("object_id",), unique="ipo_id"),
+    "relationships": Spec("relationships", """
+        id:int relationship_id person_object_id:trim relationship_object_id:trim start_at:date end_at:date
+        is_past:bool sequence:int title created_at:ts updated_at:ts""", unique="relationship_id"),
+}
+
+
+def norm_id(s: pd.Series) -> pd.Series:
+    """То же, что util.norm_id: btrim, без NBSP и управляющих символов, lower."""
+    return (s.str.strip(" ").str.replace("\xa0", "", regex=False)
+             .str.replace(r"[\x00-\x1f\x7f]", "", regex=True).str.lower())
+
+
+def parse(raw: pd.Series, kind: str) -> tuple[pd.Series, pd.Series]:
+    """(значения, маска плохих): плохое — непустое значение, которое SQL-приведение не приняло бы."""
+    present = raw.notna()
+    if kind == "text":
+        return raw, present & False
+    if kind == "trim":
+        return raw.str.strip(" "), present & False
+    if kind == "bool":
+        return raw.str.lower().isin(BOOL_TRUE), present & False
+    s = raw.str.strip()
+    if kind in ("int", "float"):
+        v = pd.to_numeric(s, errors="coerce")
+        bad = present & v.isna()
+        if kind == "int":
+            bad |= v.notna() & (v % 1 != 0)
+        return v.where(~bad), bad
+    if kind == "numeric":
+        ok = s.str.match(NUMERIC_RE, na=False)
+        return s.where(ok), present & ~ok
+    if kind in ("date", "ts"):
+        v = pd.to_datetime(s, format="ISO8601", errors="coerce")
+        if kind == "date":
+            v = v.dt.normalize()
+        return v, present & v.isna()
+    raise ValueError(f"unknown column kind {kind!r}")
+
+
+# --- PGCOPY binary format -------------------------------------------------------------------
+HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+TRAILER = struct.pack(">h", -1)
+NULL = struct.pack(">i", -1)
+_LEN = struct.Struct(">i")
+FIXED = {  # oid -> (struct of length + value, byte length)
+    16: (struct.Struct(">i?"), 1),
+    21: (struct.Struct(">ih"), 2),
+    23: (struct.Struct(">ii"), 4),
+    20: (struct.Struct(">iq"), 8),
+    700: (struct.Struct(">if"), 4),
+    701: (struct.Struct(">id"), 8),
+}
+TEXT_OIDS = {25, 1042, 1043}
+INT_RANGE = {21: 2 ** 15, 23: 2 ** 31, 20: 2 ** 63}
+
+
+def encode_numeric(text: str) -> bytes:
+    """Значение numeric в двоичном формате PostgreSQL: цифры по основанию 10000, weight, sign, dscale."""
+    sign, digits, exp = Decimal(text).as_tuple()
+    ds = "".join(map(str, digits))
+    if exp > 0:
+        ds, exp = ds + "0" * exp, 0
+    dscale = -exp
+    if len(ds) < dscale:
+        ds = "0" * (dscale - len(ds)) + ds
+    int_part, frac = ds[:len(ds) - dscale], ds[len(ds) - dscale:]
+    int_part = int_part.zfill((len(int_part) + 3) // 4 * 4)
+    frac = frac.ljust((len(frac) + 3) // 4 * 4, "0")
+    groups = [int(int_part[i:i + 4]) for i in range(0, len(int_part), 4)]
+    weight = len(groups) - 1
+    groups += [int(frac[i:i + 4]) for i in range(0, len(frac), 4)]
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight, sign = 0, 0
+    body = struct.pack(f">hhHH{len(groups)}H", len(groups), weight, 0x4000 if sign else 0, dscale, *groups)
+    return _LEN.pack(len(body)) + body
+
+
+def _text(values, kind: str) -> list:
+    if kind == "date":
+        values = values.dt.strftime("%Y-%m-%d")
+    elif kind == "ts":
+        values = values.dt.strftime("%Y-%m-%d %H:%M:%S")
+    elif kind == "int":
+        values = values.astype("Int64").astype(str).where(values.notna())
+    out = []
+    for v in values.astype(object).where(values.notna(), None).tolist():
+        if v is None:
+            out.append(NULL)
+        else:
+            b = str(v).encode("utf-8")
+            out.append(_LEN.pack(len(b)) + b)
+    return out
+
+
+def encode_column(values: pd.Series, kind: str, oid: int) -> list:
+    """Колонка -> список ячеек COPY (длина + значение); разбор уже сделан, здесь только упаковка."""
+    if oid in TEXT_OIDS:
+        return _text(values, kind)
+    null = values.isna().tolist()
+    if oid == 1082:
+        v = ((values - PG_EPOCH) // pd.Timedelta(days=1)).fillna(0).astype("int64")
+        pack = FIXED[23][0].pack
+        return [NULL if n else pack(4, d) for d, n in zip(v.tolist(), null)]
+    if oid == 1114:
+        v = ((values - PG_EPOCH) // pd.Timedelta(microseconds=1)).fillna(0).astype("int64")
+        pack = FIXED[20][0].pack
+        return [NULL if n else pack(8, us) for us, n in zip(v.tolist(), null)]
+    if oid == 1700:
+        return [NULL if n else encode_numeric(str(x)) for x, n in zip(values.tolist(), null)]
+    if oid in FIXED:
+        st, size = FIXED[oid]
+        v = values.fillna(0)
+        if oid in INT_RANGE:
+            v = v.astype("int64")
+        return [NULL if n else st.pack(size, x) for x, n in zip(v.tolist(), null)]
+    raise ValueError(f"binary COPY: unsupported column type oid {oid}")
+
+
+def target_types(cur, schema: str, table: str) -> dict[str, int]:
+    cur.execute("SELECT attname, atttypid FROM pg_attribute"
+                " WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped;", (f"{schema}.{table}",))
+    return dict(cur.fetchall())
+
+
+def copy_binary(cur, schema: str, spec: Spec, types: dict[str, int], frame: dict[str, pd.Series], n: int) -> int:
+    """Один binary COPY на чанк: ячейки колонок склеиваются построчно одним join."""
+    if n == 0:
+        return 0
+    cols = [encode_column(frame[c], kind, types[c]) for c, _, kind in spec.columns]
+    data = b"".join(chain.from_iterable(zip(repeat(struct.pack(">h", len(cols)), n), *cols)))
+    names = ", ".join(c for c, _, _ in spec.columns)
+    cur.copy_expert(f"COPY {schema}.{spec.table} ({names}) FROM STDIN WITH (FORMAT binary)",
+                    io.BytesIO(HEADER + data + TRAILER))
+    return cur.rowcount
+
+
+def copy_out(cur, sql: str) -> pd.DataFrame:
+    """Результат запроса через COPY TO STDOUT (CSV) — быстрее fetchall для справочников в сотни тысяч строк."""
+    buf = io.StringIO()
+    cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv)", buf)
+    buf.seek(0)
+    return pd.read_csv(buf, header=None, dtype=str, keep_default_na=False, na_values=[""])
+
+
+class Rejects:
+    """Файл отбраковки шага: line — номер строки CSV (1 — заголовок), column, value, reason."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._f = None
+
+    def add(self, lines, column: str, values, reason: str):
+        if self._f is None:
+            self._f = open(self.path, "w", encoding="utf-8", newline="")
+            self._w = csv.writer(self._f)
+            self._w.writerow(["line", "column", "value", "reason"])
+        rows = [(ln, column, v, reason) for ln, v in zip(lines, values)]
+        self._w.writerows(rows)
+        self.count += len(rows)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+
+
+def newest_lines(csv_path: str, header: list[str], key: str) -> pd.Index:
+    """Номера строк-победителей DISTINCT ON (key) ... ORDER BY updated_at DESC: отдельный лёгкий проход по двум колонкам."""
+    df = pd.read_csv(csv_path, header=0, names=header, usecols=[key, "updated_at"], dtype=str,
+                     keep_default_na=False, na_values=[""], encoding="utf-8")
+    df["updated_at"] = pd.to_datetime(df["updated_at"].str.strip(), format="ISO8601", errors="coerce")
+    df = df[df[key].notna()].sort_values("updated_at", ascending=False, na_position="last", kind="stable")
+    return df.drop_duplicates(key, keep="first").index
+
+
+def read_chunks(csv_path: str, header: list[str], spec: Spec, types: dict[str, int], object_keys: pd.Series | None,
+                round_years: pd.Series | None, existing: set, rejects: Rejects, chunk_rows: int = CHUNK_ROWS):
+    """Чанки CSV -> (разобранные колонки, строк к загрузке, прочитано, «висячих» ссылок, с плохими значениями).
+
+    object_keys: entity_id -> obj_key, round_years: funding_round_id -> год раунда;
+    existing — ключи `spec.unique`, уже лежащие в таблице (пополняется загруженными).
+    """
+    winners = newest_lines(csv_path, header, spec.unique) if spec.keep == "newest" else None
+    reader = pd.read_csv(csv_path, header=0, names=header, dtype=str, keep_default_na=False, na_values=[""],
+                         chunksize=chunk_rows, encoding="utf-8")
+    # (source column, referenced keys, what is missing) for every FK check of the SQL path
+    refs = [(src, "objects") for src in spec.fk]
+    refs += [(src, "objects" if kind == "key" else "funding_rounds")
+             for _, src, kind in spec.columns if kind in ("key", "year")]
+    for chunk in reader:
+        lines = chunk.index + 2
+        out, bad = {}, pd.Series(False, index=chunk.index)
+        for col, src, kind in spec.columns:
+            raw = chunk[src]
+            if kind == "norm":
+                out[col] = norm_id(raw)
+            elif kind == "key":
+                out[col] = raw.str.strip(" ").map(object_keys)
+            elif kind == "year":
+                out[col] = raw.map(round_years).astype("float64")
+            else:
+                out[col], b = parse(raw, kind)
+                if kind == "int" and types.get(col) in INT_RANGE:
+                    b |= out[col].abs() >= INT_RANGE[types[col]]
+                    out[col] = out[col].where(~b)
+                if b.any():
+                    rejects.add(lines[b.to_numpy()], src, raw[b].tolist(), f"not a valid {kind}")
+                    bad |= b
+
+        orphan = pd.Series(False, index=chunk.index)
+        for src, target in refs:
+            ids = chunk[src] if target == "funding_rounds" else chunk[src].str.strip(" ")
+            index = round_years.index if target == "funding_rounds" else object_keys.index
+            miss = ~ids.isin(index) & ~bad & ~orphan
+            if miss.any():
+                rejects.add(lines[miss.to_numpy()], src, chunk[src][miss].tolist(), f"no such {target} row")
+                orphan |= miss
+
+        keep = ~(bad | orphan)
+        if spec.unique:
+            key = out[spec.unique]
+            if winners is not None:
+                keep &= chunk.index.isin(winners) | key.isna()
+            keep &= ~key.isin(existing) | key.isna()
+            cand = keep & key.notna()
+            keep &= ~(key.where(cand).duplicated() & cand)
+            existing.update(key[keep & key.notna()].tolist())
+        out = {c: v[keep] for c, v in out.items()}
+        yield out, int(keep.sum()), len(chunk), int(orphan.sum()), int(bad.sum())
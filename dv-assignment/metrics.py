@@ -0,0 +1,170 @@
+"""Метрики Prometheus для загрузчика и отчётных скриптов.
+
+Три способа отдать метрики (флаги добавляет add_arguments):
+  --metrics-port N          — HTTP /metrics, пока процесс жив (job dv_pipeline в prometheus.yml);
+  --metrics-pushgateway URL — push в Pushgateway в конце прогона (job pushgateway);
+  --metrics-textfile PATH   — файл .prom для textfile-коллектора node_exporter.
+Без prometheus_client все функции — пустышки, скрипты работают как раньше.
+
+Метка pipeline: loader / assignment / assignment2; step — шаг загрузчика, метка запроса или файл экспорта.
+"""
+import sys
+import time
+import logging
+import resource
+from contextlib import contextmanager
+
+try:
+    from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram,
+                                   start_http_server, push_to_gateway, write_to_textfile)
+except ImportError:  # метрики необязательны
+    CollectorRegistry = Counter = Gauge = Histogram = None
+
+log = logging.getLogger(__name__)
+
+# шаги загрузчика идут от долей секунды до десятков минут
+STEP_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class _Noop:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, *args, **kwargs):
+        pass
+
+    def set(self, *args, **kwargs):
+        pass
+
+    def observe(self, *args, **kwargs):
+        pass
+
+
+REGISTRY = CollectorRegistry() if CollectorRegistry else None
+
+
+def _metric(cls, name, doc, labels, **kwargs):
+    if REGISTRY is None:
+        return _Noop()
+    return cls(name, doc, labels, registry=REGISTRY, **kwargs)
+
+
+STEP_SECONDS = _metric(Histogram, "dv_step_duration_seconds",
+                       "Duration of a pipeline step", ["pipeline", "step"], buckets=STEP_BUCKETS)
+STEP_LAST_SECONDS = _metric(Gauge, "dv_step_last_duration_seconds",
+                            "Duration of the last run of a pipeline step", ["pipeline", "step"])
+ROWS_STAGED = _metric(Counter, "dv_loader_rows_staged",
+                      "Rows COPY'd into staging tables", ["step"])
+ROWS_INSERTED = _metric(Counter, "dv_loader_rows_inserted",
+                        "Rows inserted into target tables", ["step"])
+ROWS_REJECTED = _metric(Counter, "dv_loader_rows_rejected",
+                        "Staged rows dropped by FK checks", ["step"])
+COPY_BYTES = _metric(Counter, "dv_loader_copy_bytes",
+                     "CSV bytes sent through COPY", ["step"])
+COPY_BYTES_PER_SEC = _metric(Gauge, "dv_loader_copy_bytes_per_second",
+                             "COPY throughput of the last run of a step", ["step"])
+OUTPUT_ROWS = _metric(Gauge, "dv_output_rows",
+                      "Rows returned by a report query or written by an export", ["pipeline", "step"])
+OUTPUT_BYTES = _metric(Gauge, "dv_output_bytes",
+                       "Size of an export file", ["pipeline", "step"])
+CACHE_HITS = _metric(Counter, "dv_report_cache_hits",
+                     "Report queries served from the result cache", ["pipeline", "step"])
+CONN_WAIT = _metric(Histogram, "dv_db_connection_wait_seconds",
+                    "Time spent waiting for a database connection", ["pipeline"], buckets=WAIT_BUCKETS)
+PEAK_RSS = _metric(Gauge, "dv_process_peak_rss_bytes",
+                   "Peak resident set size of the process", ["pipeline"])
+LAST_RUN = _metric(Gauge, "dv_last_run_timestamp_seconds",
+                   "Unix time the pipeline last finished", ["pipeline"])
+
+_sinks = {"pipeline": "pipeline", "pushgateway": None, "textfile": None}
+
+
+def add_arguments(ap):
+    ap.add_argument("--metrics-port", type=int, default=None,
+                    help="отдавать метрики Prometheus по HTTP на этом порту, пока идёт прогон")
+    ap.add_argument("--metrics-pushgateway", default=None,
+                    help="адрес Pushgateway (host:9091), куда отправить метрики в конце прогона")
+    ap.add_argument("--metrics-textfile", default=None,
+                    help="записать метрики в .prom-файл для textfile-коллектора node_exporter")
+
+
+def configure(args, pipeline: str):
+    _sinks.update(pipeline=pipeline, pushgateway=args.metrics_pushgateway, textfile=args.metrics_textfile)
+    wanted = args.metrics_port or args.metrics_pushgateway or args.metrics_textfile
+    if REGISTRY is None:
+        if wanted:
+            log.warning("prometheus_client is not installed — metrics are disabled")
+        return
+    if args.metrics_port:
+        start_http_server(args.metrics_port, registry=REGISTRY)
+        log.info("metrics on :%d/metrics", args.metrics_port)
+
+
+def peak_rss_bytes() -> int:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт КБ, macOS — байты
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def observe_step(step: str, seconds: float, pipeline: str | None = None):
+    pipeline = pipeline or _sinks["pipeline"]
+    STEP_SECONDS.labels(pipeline, step).observe(seconds)
+    STEP_LAST_SECONDS.labels(pipeline, step).set(seconds)
+    PEAK_RSS.labels(pipeline).set(peak_rss_bytes())
+
+
+@contextmanager
+def timed(step: str, pipeline: str | None = None):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_step(step, time.perf_counter() - t0, pipeline)
+
+
+@contextmanager
+def connection_wait(pipeline: str | None = None):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        CONN_WAIT.labels(pipeline or _sinks["pipeline"]).observe(time.perf_counter() - t0)
+
+
+def record_copy(step: str, rows: int, nbytes: int, seconds: float):
+    ROWS_STAGED.labels(step).inc(max(rows, 0))
+    COPY_BYTES.labels(step).inc(nbytes)
+    COPY_BYTES_PER_SEC.labels(step).set(nbytes / seconds if seconds > 0 else 0)
+
+
+def record_insert(step: str, inserted: int, rejected: int):
+    ROWS_INSERTED.labels(step).inc(max(inserted, 0))
+    ROWS_REJECTED.labels(step).inc(rejected)
+
+
+def record_output(step: str, rows: int, nbytes: int | None = None, pipeline: str | None = None):
+    pipeline = pipeline or _sinks["pipeline"]
+    OUTPUT_ROWS.labels(pipeline, step).set(rows)
+    if nbytes is not None:
+        OUTPUT_BYTES.labels(pipeline, step).set(nbytes)
+
+
+def record_cache_hit(step: str, pipeline: str | None = None):
+    CACHE_HITS.labels(pipeline or _sinks["pipeline"], step).inc()
+
+
+def flush():
+    """Конец прогона: отметка времени, push в Pushgateway и/или запись textfile."""
+    if REGISTRY is None:
+        return
+    pipeline = _sinks["pipeline"]
+    LAST_RUN.labels(pipeline).set(time.time())
+    PEAK_RSS.labels(pipeline).set(peak_rss_bytes())
+    if _sinks["pushgateway"]:
+        try:
+            push_to_gateway(_sinks["pushgateway"], job=f"dv_{pipeline}", registry=REGISTRY)
+        except OSError as e:
+            log.warning("metrics push to %s failed: %s", _sinks["pushgateway"], e)
+    if _sinks["textfile"]:
+        write_to_textfile(_sinks["textfile"], REGISTRY)
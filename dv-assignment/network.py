@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""Сеть соинвестирования по cb.investments на разреженных матрицах.
+
+investments читается один раз и кодируется целыми числами: B — инвестор × раунд,
+C — инвестор × компания (0/1, scipy.sparse CSR). Тогда B·Bᵀ — число общих раундов для
+каждой пары инвесторов, C·Cᵀ — общих компаний; произведение считается блоками строк,
+и рёбра/партнёры каждого блока сразу уходят COPY в базу. Целиком в памяти остаётся только
+граф для PageRank и компонент: CSR пар, прошедших --min-shared (int32), без полной таблицы
+общих раундов и без списка рёбер.
+
+Результат — в cb:
+  net_investors — раунды, компании, степень, PageRank, компонента связности;
+  net_coinvest  — пары (a < b) с общими раундами/компаниями;
+  net_partners  — top-k партнёров каждого инвестора.
+
+    python dv-assignment/network.py --password 0000 --top-k 10
+"""
+import io
+import time
+import argparse
+import numpy as np
+import pandas as pd
+import psycopg2
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+SQL_INVESTMENTS = """
+COPY (
+  SELECT investor_object_key, funding_round_id, funded_object_key
+  FROM {sch}.investments
+  WHERE investor_object_key IS NOT NULL AND funding_round_id IS NOT NULL AND funded_object_key IS NOT NULL
+) TO STDOUT WITH (FORMAT csv)
+"""
+
+SQL_TABLES = """
+DROP TABLE IF EXISTS {sch}.net_investors, {sch}.net_coinvest, {sch}.net_partners;
+CREATE TABLE {sch}.net_investors (
+  investor_key TEXT PRIMARY KEY,
+  rounds INT NOT NULL,
+  companies INT NOT NULL,
+  degree INT NOT NULL,
+  weighted_degree BIGINT NOT NULL,
+  degree_centrality DOUBLE PRECISION NOT NULL,
+  pagerank DOUBLE PRECISION NOT NULL,
+  component INT NOT NULL,
+  component_size INT NOT NULL
+);
+CREATE TABLE {sch}.net_coinvest (
+  investor_a TEXT NOT NULL,
+  investor_b TEXT NOT NULL,
+  shared_rounds INT NOT NULL,
+  shared_companies INT NOT NULL,
+  PRIMARY KEY (investor_a, investor_b)
+);
+CREATE TABLE {sch}.net_partners (
+  investor_key TEXT NOT NULL,
+  rank INT NOT NULL,
+  partner_key TEXT NOT NULL,
+  shared_rounds INT NOT NULL,
+  shared_companies INT NOT NULL,
+  PRIMARY KEY (investor_key, rank)
+);
+"""
+
+# индексы строятся после COPY — так быстрее, чем поддерживать их при вставке
+SQL_INDEXES = """
+CREATE INDEX idx_net_coinvest_b ON {sch}.net_coinvest(investor_b);
+CREATE INDEX idx_net_investors_pagerank ON {sch}.net_investors(pagerank DESC);
+CREATE INDEX idx_net_investors_component ON {sch}.net_investors(component);
+ANALYZE {sch}.net_investors;
+ANALYZE {sch}.net_coinvest;
+ANALYZE {sch}.net_partners;
+"""
+
+SQL_TOP = """
+SELECT COALESCE(NULLIF(o.name, ''), n.investor_key) AS investor, n.rounds, n.degree,
+       round(n.pagerank::numeric, 6) AS pagerank, n.component_size
+FROM {sch}.net_investors n
+LEFT JOIN {sch}.objects o ON o.obj_key = n.investor_key
+ORDER BY n.pagerank DESC
+LIMIT %s;
+"""
+
+
+class CoInvestmentNetwork:
+    def __init__(self, investors: np.ndarray, rounds: sp.csr_matrix, companies: sp.csr_matrix):
+        self.investors = investors  # код -> investor_object_key
+        self.B = rounds
+        self.C = companies
+        self.n = len(investors)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "CoInvestmentNetwork":
+        inv = df["investor"].cat.codes.to_numpy(np.int32)
+        rnd = df["round"].cat.codes.to_numpy(np.int32)
+        com = df["company"].cat.codes.to_numpy(np.int32)
+        n = len(df["investor"].cat.categories)
+
+        def incidence(cols, m):
+            mat = sp.csr_matrix((np.ones(len(inv), np.int32), (inv, cols)), shape=(n, m))
+            mat.sum_duplicates()
+            mat.data[:] = 1  # повторная запись той же пары — одно участие
+            return mat
+
+        return cls(df["investor"].cat.categories.to_numpy(),
+                   incidence(rnd, len(df["round"].cat.categories)),
+                   incidence(com, len(df["company"].cat.categories)))
+
+    @classmethod
+    def load(cls, conn, schema: str = "cb") -> "CoInvestmentNetwork":
+        buf = io.StringIO()
+        with conn.cursor() as cur:
+            cur.copy_expert(SQL_INVESTMENTS.format(sch=schema), buf)
+        buf.seek(0)
+        df = pd.read_csv(buf, header=None, names=["investor", "round", "company"], dtype="category")
+        return cls.from_frame(df)
+
+    def blocks(self, block: int = 4096):
+        """(i0, shared_rounds, shared_companies) по блокам строк; диагональ (сам с собой) обнулена."""
+        BT, CT = self.B.T.tocsc(), self.C.T.tocsc()
+        for i0 in range(0, self.n, block):
+            i1 = min(self.n, i0 + block)
+            r = (self.B[i0:i1] @ BT).tocsr()
+            c = (self.C[i0:i1] @ CT).tocsr()
+            for m in (r, c):
+                m.setdiag(0, k=i0)
+                m.eliminate_zeros()
+                m.sort_indices()
+            yield i0, r, c
+
+    def analyze(self, sink, top_k: int = 10, block: int = 4096, min_shared: int = 1):
+        """Одним проходом по блокам: степени и граф W для PageRank; рёбра и top-k партнёров блока —
+        в sink(edges, partners) сразу, чтобы не копить их в памяти."""
+        w_parts = []
+        self.n_edges = self.n_partners = 0
+        degree = np.zeros(self.n, np.int64)
+        weighted = np.zeros(self.n, np.int64)
+        for i0, r, c in self.blocks(block):
+            # шаблон общих компаний — надмножество общих раундов (общий раунд => общая компания)
+            coo = c.tocoo()
+            rows, cols = coo.row + i0, coo.col
+            shared_c = coo.data
+            shared_r = np.asarray(r[coo.row, cols]).ravel() if coo.nnz else np.zeros(0, np.int64)
+            strong = shared_c >= min_shared
+            keep = (cols > rows) & strong
+            edges = (rows[keep], cols[keep], shared_r[keep], shared_c[keep])
+
+            # top-k: сортировка внутри строк по (раунды, компании) по убыванию
+            order = np.lexsort((-shared_c, -shared_r, coo.row))
+            pos = np.arange(coo.nnz) - np.repeat(c.indptr[:-1], np.diff(c.indptr))
+            top = order[pos < top_k]
+            partners = (rows[top], pos[pos < top_k] + 1, cols[top], shared_r[top], shared_c[top])
+            sink(edges, partners)
+            self.n_edges += len(edges[0])
+            self.n_partners += len(partners[0])
+
+            degree[i0:i0 + r.shape[0]] = np.diff(r.indptr)
+            weighted[i0:i0 + r.shape[0]] = np.asarray(r.sum(axis=1)).ravel()
+            # в W — только пары с общими раундами, прошедшие порог; блок r дальше не нужен
+            w = strong & (shared_r > 0)
+            w_parts.append(sp.csr_matrix((shared_r[w].astype(np.int32), (coo.row[w], cols[w])),
+                                         shape=r.shape))
+        self.W = sp.vstack(w_parts, format="csr") if w_parts else sp.csr_matrix((0, 0))
+        self.degree, self.weighted_degree = degree, weighted
+
+    def pagerank(self, damping: float = 0.85, tol: float = 1e-10, max_iter: int = 200) -> np.ndarray:
+        """PageRank на взвешенном неориентированном графе (вес — число общих раундов, пары с >= min_shared компаний)."""
+        n = self.n
+        if n == 0:
+            return np.zeros(0)
+        out = np.asarray(self.W.sum(axis=1)).ravel().astype(float)
+        dangling = out == 0
+        inv = np.divide(1.0, out, out=np.zeros_like(out), where=~dangling)
+        P = sp.diags(inv) @ self.W  # строки нормированы
+        PT = P.T.tocsr()
+        pr = np.full(n, 1.0 / n)
+        for _ in range(max_iter):
+            nxt = damping * (PT @ pr + pr[dangling].sum() / n) + (1 - damping) / n
+            if np.abs(nxt - pr).sum() < tol:
+                return nxt
+            pr = nxt
+        return pr
+
+    def components(self) -> tuple[np.ndarray, np.ndarray]:
+        _, labels = connected_components(self.W, directed=False)
+        sizes = np.bincount(labels)
+        # номер компоненты по убыванию размера: 0 — самая большая
+        rank = np.empty_like(sizes)
+        rank[np.argsort(-sizes, kind="stable")] = np.arange(len(sizes))
+        return rank[labels], sizes[labels]
+
+
+def _copy(cur, table: str, columns: list[str], frame: pd.DataFrame):
+    buf = io.StringIO()
+    frame.to_csv(buf, index=False, header=False)
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+
+class BlockWriter:
+    """sink для CoInvestmentNetwork.analyze: COPY рёбер и партнёров каждого блока в net_coinvest/net_partners."""
+
+    def __init__(self, cur, keys: np.ndarray, schema: str = "cb"):
+        self.cur, self.keys, self.schema = cur, keys, schema
+
+    def __call__(self, edges, partners):
+        keys = self.keys
+        a, b, sr, sc = edges
+        if len(a):
+            _copy(self.cur, f"{self.schema}.net_coinvest", ["investor_a", "investor_b", "shared_rounds", "shared_companies"],
+                  pd.DataFrame({"a": keys[a], "b": keys[b], "sr": sr, "sc": sc}))
+        i, rank, j, psr, psc = partners
+        if len(i):
+            _copy(self.cur, f"{self.schema}.net_partners",
+                  ["investor_key", "rank", "partner_key", "shared_rounds", "shared_companies"],
+                  pd.DataFrame({"i": keys[i], "rank": rank, "j": keys[j], "sr": psr, "sc": psc}))
+
+
+def write_investors(cur, net: CoInvestmentNetwork, pagerank: np.ndarray, component: np.ndarray,
+                    component_size: np.ndarray, schema: str = "cb") -> int:
+    investors = pd.DataFrame({
+        "investor_key": net.investors,
+        "rounds": np.diff(net.B.indptr),
+        "companies": np.diff(net.C.indptr),
+        "degree": net.degree,
+        "weighted_degree": net.weighted_degree,
+        "degree_centrality": net.degree / max(net.n - 1, 1),
+        "pagerank": pagerank,
+        "component": component,
+        "component_size": component_size,
+    })
+    _copy(cur, f"{schema}.net_investors", list(investors.columns), investors)
+    return len(investors)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Co-investment network analytics over cb.investments (sparse matrices).")
+    ap.add_argument("--host", default="localhost")
+    ap.add_argument("--port", type=int, default=5432)
+    ap.add_argument("--dbname", default="dv_project")
+    ap.add_argument("--user", default="postgres")
+    ap.add_argument("--password", default=None)
+    ap.add_argument("--schema", default="cb")
+    ap.add_argument("--top-k", type=int, default=10, help="сколько партнёров хранить на инвестора")
+    ap.add_argument("--block", type=int, default=4096, help="строк инвесторов в блоке произведения")
+    ap.add_argument("--min-shared", type=int, default=1, help="минимум общих компаний для ребра в net_coinvest")
+    ap.add_argument("--damping", type=float, default=0.85)
+    args = ap.parse_args()
+
+    conn = psycopg2.connect(host=args.host, port=args.port, dbname=args.dbname,
+                            user=args.user, password=args.password)
+    try:
+        t0 = time.perf_counter()
+        net = CoInvestmentNetwork.load(conn, args.schema)
+        print(f"[OK] loaded: {net.n:,} investors, {net.B.shape[1]:,} rounds, {net.C.shape[1]:,} companies, "
+              f"{net.B.nnz:,} participations ({time.perf_counter() - t0:.2f}s)")
+
+        t = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute(SQL_TABLES.format(sch=args.schema))
+            # рёбра и партнёры пишутся по мере подсчёта блоков
+            net.analyze(BlockWriter(cur, net.investors, args.schema), args.top_k, args.block, args.min_shared)
+            print(f"[OK] pairs: {net.n_edges:,} co-investing pairs, {net.n_partners:,} partner rows written "
+                  f"({time.perf_counter() - t:.2f}s)")
+
+            t = time.perf_counter()
+            pr = net.pagerank(args.damping)
+            comp, comp_size = net.components()
+            n_inv = write_investors(cur, net, pr, comp, comp_size, args.schema)
+            cur.execute(SQL_INDEXES.format(sch=args.schema))
+        conn.commit()
+        print(f"[OK] graph: {comp.max() + 1 if net.n else 0:,} components, largest {comp_size.max() if net.n else 0:,}; "
+              f"{args.schema}.net_investors {n_inv:,} ({time.perf_counter() - t:.2f}s)")
+
+        with conn.cursor() as cur:
+            cur.execute(SQL_TOP.format(sch=args.schema), (10,))
+            rows = cur.fetchall()
+        print("\n--- top-10 investors by PageRank ---")
+        print("investor | rounds | degree | pagerank | component_size")
+        for r in rows:
+            print(" | ".join(str(x) for x in r))
+        print(f"\n[OK] total {time.perf_counter() - t0:.2f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
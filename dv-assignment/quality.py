@@ -0,0 +1,175 @@
+"""Проверки качества данных схемы cb: строки, пропуски, дубли ключей, «висячие» ссылки.
+
+exact — точные значения, по одному проходу на таблицу (все метрики таблицы в одном SELECT);
+fast  — оценки из pg_class.reltuples / pg_stats и выборки TABLESAMPLE для ссылок.
+Каждый запуск дописывается в cb.dq_history, чтобы следить за дрейфом между загрузками.
+"""
+import time
+from psycopg2.extras import execute_values
+
+# таблица -> (ключ, колонки для доли NULL)
+DQ_TABLES = {
+    "objects":        ("entity_id",        ["id", "name", "founded_at", "funding_total_usd", "country_code", "obj_key"]),
+    "people":         ("object_id",        ["first_name", "last_name"]),
+    "offices":        ("id",               ["object_id", "country_code"]),
+    "degrees":        ("id",               ["object_id"]),
+    "milestones":     ("id",               ["object_id", "milestone_at"]),
+    "funds":          ("fund_id",          ["object_id", "raised_amount"]),
+    "funding_rounds": ("funding_round_id", ["object_id", "object_key", "funded_at", "raised_amount_usd"]),
+    "investments":    ("id",               ["funding_round_id", "funded_object_key", "investor_object_key"]),
+    "acquisitions":   ("acquisition_id",   ["acquiring_object_key", "acquired_object_key", "acquired_at", "price_amount"]),
+    "ipos":           ("ipo_id",           ["object_id", "public_at"]),
+    "relationships":  ("relationship_id",  ["person_object_id", "relationship_object_id"]),
+}
+
+# (таблица, колонка, на какую таблицу, по какой колонке) — ключи цели уникальны
+DQ_FOREIGN_KEYS = [
+    ("funding_rounds", "object_id",           "objects",        "entity_id"),
+    ("investments",    "funding_round_id",    "funding_rounds", "funding_round_id"),
+    ("investments",    "funded_object_id",    "objects",        "entity_id"),
+    ("investments",    "investor_object_id",  "objects",        "entity_id"),
+    ("acquisitions",   "acquiring_object_id", "objects",        "entity_id"),
+    ("acquisitions",   "acquired_object_id",  "objects",        "entity_id"),
+    ("ipos",           "object_id",           "objects",        "entity_id"),
+]
+
+SQL_HISTORY_CREATE = """
+CREATE TABLE IF NOT EXISTS {sch}.dq_history (
+  checked_at TIMESTAMPTZ NOT NULL,
+  mode TEXT NOT NULL,
+  table_name TEXT NOT NULL,
+  metric TEXT NOT NULL,
+  column_name TEXT NOT NULL DEFAULT '',
+  value NUMERIC
+);
+CREATE INDEX IF NOT EXISTS idx_dq_history_checked ON {sch}.dq_history(mode, checked_at);
+"""
+
+SQL_COLUMNS = """
+SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = %s;
+"""
+
+
+def _columns(cur, schema: str) -> dict[str, set[str]]:
+    cur.execute(SQL_COLUMNS, (schema,))
+    cols = {}
+    for table, column in cur.fetchall():
+        cols.setdefault(table, set()).add(column)
+    return cols
+
+
+def _fks(table: str, cols: dict[str, set[str]]):
+    return [(c, t, tc) for tb, c, t, tc in DQ_FOREIGN_KEYS
+            if tb == table and c in cols.get(table, ()) and tc in cols.get(t, ())]
+
+
+def exact_metrics(cur, schema: str) -> list[tuple]:
+    """Точные метрики: один SELECT (один проход + хеш-джойны на ссылки) на таблицу."""
+    cols = _columns(cur, schema)
+    out = []
+    for table, (key, null_cols) in DQ_TABLES.items():
+        if table not in cols:
+            continue
+        null_cols = [c for c in null_cols if c in cols[table]]
+        fks = _fks(table, cols)
+        select = ["count(*)"]
+        select += [f"count(*) - count(t.{c})" for c in null_cols]
+        select.append(f"count(t.{key}) - count(DISTINCT t.{key})" if key in cols[table] else "NULL")
+        joins = []
+        for i, (c, target, tc) in enumerate(fks):
+            joins.append(f"LEFT JOIN {schema}.{target} r{i} ON r{i}.{tc} = t.{c}")
+            select.append(f"count(*) FILTER (WHERE t.{c} IS NOT NULL AND r{i}.{tc} IS NULL)")
+        cur.execute(f"SELECT {', '.join(select)} FROM {schema}.{table} t {' '.join(joins)};")
+        vals = list(cur.fetchone())
+        rows = vals.pop(0)
+        out.append((table, "rows", "", rows))
+        for c in null_cols:
+            out.append((table, "nulls", c, vals.pop(0)))
+        out.append((table, "duplicate_keys", key, vals.pop(0)))
+        for c, _, _ in fks:
+            out.append((table, "orphans", c, vals.pop(0)))
+    return out
+
+
+def fast_metrics(cur, schema: str, sample_pct: float = 1.0) -> list[tuple]:
+    """Оценки по статистике планировщика; «висячие» ссылки — по выборке TABLESAMPLE SYSTEM."""
+    cols = _columns(cur, schema)
+    cur.execute("""
+        SELECT c.relname, c.reltuples FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relkind IN ('r', 'p');
+    """, (schema,))
+    reltuples = {t: max(0.0, float(n)) for t, n in cur.fetchall()}
+    cur.execute("SELECT tablename, attname, null_frac, n_distinct FROM pg_stats WHERE schemaname = %s;", (schema,))
+    stats = {(t, a): (nf, nd) for t, a, nf, nd in cur.fetchall()}
+
+    out = []
+    for table, (key, null_cols) in DQ_TABLES.items():
+        if table not in cols:
+            continue
+        rows = reltuples.get(table, 0.0)
+        out.append((table, "rows", "", round(rows)))
+        for c in null_cols:
+            if (table, c) in stats:
+                out.append((table, "nulls", c, round(stats[(table, c)][0] * rows)))
+        if (table, key) in stats:
+            nd = stats[(table, key)][1]
+            distinct = -nd * rows if nd < 0 else nd
+            out.append((table, "duplicate_keys", key, max(0, round(rows - distinct))))
+        for c, target, tc in _fks(table, cols):
+            cur.execute(f"""
+                SELECT count(*), count(*) FILTER (WHERE t.{c} IS NOT NULL AND r.{tc} IS NULL)
+                FROM {schema}.{table} t TABLESAMPLE SYSTEM (%s)
+                LEFT JOIN {schema}.{target} r ON r.{tc} = t.{c};
+            """, (sample_pct,))
+            sampled, bad = cur.fetchone()
+            out.append((table, "orphans", c, round(bad / sampled * rows) if sampled else 0))
+    return out
+
+
+def record(cur, schema: str, mode: str, metrics: list[tuple]):
+    cur.execute(SQL_HISTORY_CREATE.format(sch=schema))
+    execute_values(cur, f"""
+        INSERT INTO {schema}.dq_history(checked_at, mode, table_name, metric, column_name, value) VALUES %s
+    """, [(mode, *m) for m in metrics], template="(now(), %s, %s, %s, %s, %s)")
+
+
+def drift(cur, schema: str, mode: str, threshold: float = 0.2) -> list[tuple]:
+    """Метрики, изменившиеся больше чем на `threshold` (доля) с предыдущего запуска того же режима."""
+    cur.execute(f"""
+        WITH runs AS (
+          SELECT DISTINCT checked_at FROM {schema}.dq_history WHERE mode = %s ORDER BY checked_at DESC LIMIT 2
+        ),
+        h AS (
+          SELECT h.*, dense_rank() OVER (ORDER BY h.checked_at DESC) AS r
+          FROM {schema}.dq_history h JOIN runs USING (checked_at)
+          WHERE h.mode = %s
+        )
+        SELECT cur.table_name, cur.metric, cur.column_name, prev.value, cur.value
+        FROM h cur JOIN h prev
+          ON prev.r = 2 AND cur.r = 1
+         AND (prev.table_name, prev.metric, prev.column_name) = (cur.table_name, cur.metric, cur.column_name)
+        WHERE abs(cur.value - prev.value) > %s * greatest(abs(prev.value), 1)
+        ORDER BY 1, 2, 3;
+    """, (mode, mode, threshold))
+    return cur.fetchall()
+
+
+def run_checks(conn, schema: str = "cb", mode: str = "exact", sample_pct: float = 1.0,
+               drift_threshold: float = 0.2) -> list[tuple]:
+    t0 = time.perf_counter()
+    with conn.cursor() as cur:
+        metrics = exact_metrics(cur, schema) if mode == "exact" else fast_metrics(cur, schema, sample_pct)
+        record(cur, schema, mode, metrics)
+        changed = drift(cur, schema, mode, drift_threshold)
+    conn.commit()
+
+    print(f"\n--- data quality ({mode}, {time.perf_counter() - t0:.1f}s) ---")
+    print("table | metric | column | value")
+    print("-" * 60)
+    for table, metric, column, value in metrics:
+        print(f"{table} | {metric} | {column} | {value}")
+    if changed:
+        print(f"\n!!! drift > {drift_threshold:.0%} since previous {mode} run:")
+        for table, metric, column, prev, now in changed:
+            print(f"{table} | {metric} | {column} | {prev} -> {now}")
+    return metrics
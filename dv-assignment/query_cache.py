@@ -0,0 +1,78 @@
+"""Дисковый кэш результатов отчётных запросов (Parquet).
+
+Ключ — sha256 от текста SQL и токена данных: сервер/база/схема плюс `cb.data_version`
+(номер и время bumped_at), которую поднимает загрузчик после каждой загрузки. Поменялся
+запрос, данные или база — ключ другой; пересозданная схема начинает номер заново, но
+bumped_at у неё новый. Без data_version кэш не используется (data_version() -> None).
+Старые файлы вытесняются по размеру каталога, реже всего читанные — первыми.
+"""
+import os
+import hashlib
+import pandas as pd
+from sqlalchemy import text
+
+CACHE_DIR = "dv-assignment/.cache/assignment2"
+DEFAULT_MAX_MB = 512
+
+
+def data_version(engine, schema: str = "cb") -> str | None:
+    """Токен версии данных для ключа кэша; None — версию узнать нельзя, кэшировать нельзя."""
+    with engine.connect() as con:
+        exists = con.execute(text("SELECT to_regclass(:t) IS NOT NULL"), {"t": f"{schema}.data_version"}).scalar()
+        if not exists:
+            return None
+        row = con.execute(text(f"SELECT version, bumped_at FROM {schema}.data_version")).first()
+    if row is None:
+        return None
+    url = engine.url
+    return f"{url.host}:{url.port or 5432}/{url.database}/{schema}:{row[0]}:{row[1].isoformat()}"
+
+
+class QueryCache:
+    def __init__(self, cache_dir: str = CACHE_DIR, max_mb: int = DEFAULT_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_mb * 1024 * 1024
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(sql: str, version: str) -> str:
+        return hashlib.sha256(f"{version}\0{sql}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        path = self._path(key)
+        try:
+            df = pd.read_parquet(path)
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # mtime = последнее чтение, по нему и вытесняем
+        return df
+
+    def put(self, key: str, df: pd.DataFrame):
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".parquet"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(e[1] for e in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -0,0 +1,272 @@
+"""Куб cb.fr_rollup: раунды, агрегированные по (год, страна, тип раунда, есть ли инвесторы, найдена ли компания).
+
+В каждой ячейке — число раундов и строк investments, сумма/min/max raised_amount_usd
+(отдельно сумма только положительных и сумма, взвешенная числом инвесторов — так считают
+отчёты с JOIN investments),
+плюс сливаемый скетч распределения: логарифмические корзины с относительной точностью
+SKETCH_ALPHA (как DDSketch). Ячеек — единицы тысяч, поэтому отчёты по годам/странам/типам
+читают куб, а не funding_rounds × objects × investments.
+
+Куб ведёт загрузчик: refresh() пересчитывает только затронутые годы (партиции funding_rounds
+и investments по годам — те же диапазоны), при полной загрузке — целиком.
+Запросы (Rollup) — обычный SQL по кубу, так что работают и на PostgreSQL, и на снимке DuckDB.
+"""
+import time
+
+SKETCH_ALPHA = 0.01
+SKETCH_GAMMA = (1 + SKETCH_ALPHA) / (1 - SKETCH_ALPHA)
+
+SQL_CREATE = """
+CREATE TABLE IF NOT EXISTS {sch}.fr_rollup (
+  year INT,
+  country TEXT NOT NULL,
+  funding_round_type TEXT,
+  has_investors BOOLEAN NOT NULL,
+  has_object BOOLEAN NOT NULL,
+  rounds BIGINT NOT NULL,
+  investments BIGINT NOT NULL,
+  usd_rounds BIGINT NOT NULL,
+  pos_rounds BIGINT NOT NULL,
+  sum_usd NUMERIC,
+  pos_sum_usd NUMERIC,
+  sum_usd_investments NUMERIC,
+  min_usd NUMERIC,
+  max_usd NUMERIC,
+  sketch_keys INT[],
+  sketch_rounds BIGINT[],
+  sketch_investments BIGINT[]
+);
+CREATE INDEX IF NOT EXISTS idx_fr_rollup_year ON {sch}.fr_rollup(year);
+"""
+
+# колонки, добавленные после первой версии куба; старые ячейки без них надо пересчитать
+SQL_UPGRADE = """
+ALTER TABLE {sch}.fr_rollup ADD COLUMN IF NOT EXISTS has_object BOOLEAN;
+ALTER TABLE {sch}.fr_rollup ADD COLUMN IF NOT EXISTS pos_sum_usd NUMERIC;
+"""
+
+COLUMNS = ("year, country, funding_round_type, has_investors, has_object, rounds, investments, usd_rounds, "
+           "pos_rounds, sum_usd, pos_sum_usd, sum_usd_investments, min_usd, max_usd, "
+           "sketch_keys, sketch_rounds, sketch_investments")
+
+# {fr_years}/{inv_years} — фильтр по годам, диапазоны по ключам партиций (см. year_filter)
+SQL_BUILD = """
+INSERT INTO {sch}.fr_rollup ({columns})
+WITH inv AS (
+  SELECT funding_round_id, count(*) AS n
+  FROM {sch}.investments i
+  WHERE {inv_years}
+  GROUP BY 1
+),
+r AS (
+  SELECT EXTRACT(YEAR FROM fr.funded_at)::int AS year,
+         COALESCE(NULLIF(o.country_code,''),'UNK') AS country,
+         fr.funding_round_type,
+         o.obj_key IS NOT NULL AS has_object,
+         COALESCE(inv.n, 0) AS n_inv,
+         fr.raised_amount_usd AS usd
+  FROM {sch}.funding_rounds fr
+  LEFT JOIN {sch}.objects o ON o.obj_key = fr.object_key
+  LEFT JOIN inv ON inv.funding_round_id = fr.funding_round_id
+  WHERE {fr_years}
+),
+cells AS (
+  SELECT year, country, funding_round_type, n_inv > 0 AS has_investors, has_object,
+         count(*) AS rounds, sum(n_inv)::bigint AS investments,
+         count(usd) AS usd_rounds, count(*) FILTER (WHERE usd > 0) AS pos_rounds,
+         sum(usd) AS sum_usd, sum(usd) FILTER (WHERE usd > 0) AS pos_sum_usd,
+         sum(usd * n_inv) AS sum_usd_investments,
+         min(usd) AS min_usd, max(usd) AS max_usd
+  FROM r
+  GROUP BY 1, 2, 3, 4, 5
+),
+buckets AS (
+  SELECT year, country, funding_round_type, n_inv > 0 AS has_investors, has_object,
+         ceil(ln(usd) / ln({gamma}))::int AS k, count(*) AS rounds, sum(n_inv)::bigint AS investments
+  FROM r
+  WHERE usd > 0
+  GROUP BY 1, 2, 3, 4, 5, 6
+),
+sketch AS (
+  SELECT year, country, funding_round_type, has_investors, has_object,
+         array_agg(k ORDER BY k) AS sketch_keys,
+         array_agg(rounds ORDER BY k) AS sketch_rounds,
+         array_agg(investments ORDER BY k) AS sketch_investments
+  FROM buckets
+  GROUP BY 1, 2, 3, 4, 5
+)
+SELECT c.year, c.country, c.funding_round_type, c.has_investors, c.has_object,
+       c.rounds, c.investments, c.usd_rounds, c.pos_rounds,
+       c.sum_usd, c.pos_sum_usd, c.sum_usd_investments, c.min_usd, c.max_usd,
+       s.sketch_keys, s.sketch_rounds, s.sketch_investments
+FROM cells c
+LEFT JOIN sketch s
+  ON s.year IS NOT DISTINCT FROM c.year AND s.country = c.country
+ AND s.funding_round_type IS NOT DISTINCT FROM c.funding_round_type AND s.has_investors = c.has_investors
+ AND s.has_object = c.has_object;
+"""
+
+
+def ensure_table(conn, schema: str) -> bool:
+    """Создаёт cb.fr_rollup; True — если её не было или она старой версии (значит, нужен полный пересчёт)."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s) IS NULL;", (f"{schema}.fr_rollup",))
+        created = cur.fetchone()[0]
+        cur.execute(SQL_CREATE.format(sch=schema))
+        cur.execute("SELECT count(*) FROM information_schema.columns "
+                    "WHERE table_schema = %s AND table_name = 'fr_rollup' AND column_name IN ('has_object', 'pos_sum_usd');",
+                    (schema,))
+        outdated = cur.fetchone()[0] < 2
+        if outdated:
+            cur.execute(SQL_UPGRADE.format(sch=schema))
+    conn.commit()
+    return created or outdated
+
+
+def year_filter(column: str, years, is_date: bool) -> tuple[str, list]:
+    """WHERE по набору лет: диапазоны по самой колонке (а не EXTRACT), чтобы отсекались партиции."""
+    years = set(years)
+    parts, params = [], []
+    for y in sorted(y for y in years if y is not None):
+        if is_date:
+            parts.append(f"({column} >= %s AND {column} < %s)")
+            params += [f"{y}-01-01", f"{y + 1}-01-01"]
+        else:
+            parts.append(f"{column} = %s")
+            params.append(y)
+    if None in years:
+        parts.append(f"{column} IS NULL")
+    return "(" + " OR ".join(parts or ["false"]) + ")", params
+
+
+def refresh(conn, schema: str, years=None) -> tuple[int, float]:
+    """Пересчитывает ячейки за `years` (None — весь куб) в одной транзакции. Возвращает (строк, секунд)."""
+    t0 = time.perf_counter()
+    with conn.cursor() as cur:
+        if years is None:
+            cur.execute(f"DELETE FROM {schema}.fr_rollup;")
+            fr_years, inv_years, params = "true", "true", []
+        else:
+            fr_years, fr_params = year_filter("fr.funded_at", years, is_date=True)
+            inv_years, inv_params = year_filter("i.funded_year", years, is_date=False)
+            del_years, del_params = year_filter("year", years, is_date=False)
+            cur.execute(f"DELETE FROM {schema}.fr_rollup WHERE {del_years};", del_params)
+            params = inv_params + fr_params  # порядок плейсхолдеров в SQL_BUILD: inv, затем r
+        cur.execute(SQL_BUILD.format(sch=schema, columns=COLUMNS, gamma=repr(SKETCH_GAMMA),
+                                     fr_years=fr_years, inv_years=inv_years), params)
+        rows = cur.rowcount
+        cur.execute(f"ANALYZE {schema}.fr_rollup;")
+    conn.commit()
+    return rows, time.perf_counter() - t0
+
+
+def sketch_value(key: int) -> float:
+    """Представитель корзины key: середина (gamma^(k-1), gamma^k] с относительной ошибкой ≤ SKETCH_ALPHA."""
+    return 2 * SKETCH_GAMMA ** key / (SKETCH_GAMMA + 1)
+
+
+def merge_sketches(keys_col, counts_col) -> dict[int, int]:
+    """Слияние скетчей нескольких ячеек — сумма счётчиков по одинаковым корзинам."""
+    merged = {}
+    for keys, counts in zip(keys_col, counts_col):
+        if keys is None or counts is None:
+            continue
+        for k, c in zip(keys, counts):
+            merged[int(k)] = merged.get(int(k), 0) + int(c)
+    return dict(sorted(merged.items()))
+
+
+def sketch_quantiles(sketch: dict[int, int], qs) -> list[float | None]:
+    total = sum(sketch.values())
+    out = []
+    for q in qs:
+        if not total:
+            out.append(None)
+            continue
+        rank, acc = q * (total - 1), 0
+        for k, c in sketch.items():
+            acc += c
+            if acc > rank:
+                out.append(sketch_value(k))
+                break
+    return out
+
+
+class Rollup:
+    """Отчётные срезы по cb.fr_rollup. `read(sql) -> DataFrame` — как run_assignment2.read_df."""
+
+    def __init__(self, read, schema: str = "cb"):
+        self.read = read
+        self.t = f"{schema}.fr_rollup"
+
+    def raised_by_year(self):
+        """Как cb.v_raised_by_year."""
+        return self.read(f"SELECT year, SUM(sum_usd) AS raised_usd FROM {self.t} GROUP BY 1 ORDER BY 1;")
+
+    def round_types(self):
+        """Как «Тема 5» в queries.sql: число раундов и средняя сумма по типу."""
+        return self.read(f"""
+            SELECT funding_round_type, SUM(rounds) AS rounds_cnt,
+                   SUM(sum_usd) / NULLIF(SUM(usd_rounds), 0) AS avg_usd
+            FROM {self.t} GROUP BY 1 ORDER BY avg_usd DESC NULLS LAST;""")
+
+    def top_countries(self, year_from: int = 2005, year_to: int = 2015, top: int = 10):
+        """Как barh_countries_raised.sql: раунды с инвесторами и компанией в objects, сумма — по каждой строке investments."""
+        return self.read(f"""
+            SELECT country, SUM(sum_usd_investments) AS raised_usd
+            FROM {self.t}
+            WHERE has_investors AND has_object AND year BETWEEN {int(year_from)} AND {int(year_to)}
+            GROUP BY 1 ORDER BY raised_usd DESC LIMIT {int(top)};""")
+
+    def country_year(self, year_from: int = 2005, top: int = 10):
+        """Как plotly_country_year.sql: по годам топ стран по сумме раундов с raised_amount_usd > 0 и компанией в objects."""
+        return self.read(f"""
+            WITH agg AS (
+              SELECT year, country, SUM(pos_rounds) AS deals, SUM(pos_sum_usd) AS raised_usd
+              FROM {self.t}
+              WHERE has_object AND year >= {int(year_from)}
+              GROUP BY 1, 2
+              HAVING SUM(pos_rounds) > 0
+            ),
+            ranked AS (
+              SELECT *, raised_usd / NULLIF(deals, 0) AS avg_raised,
+                     ROW_NUMBER() OVER (PARTITION BY year ORDER BY raised_usd DESC) AS rn
+              FROM agg
+            )
+            SELECT year, country, deals, raised_usd, avg_raised
+            FROM ranked WHERE rn <= {int(top)}
+            ORDER BY year, raised_usd DESC;""")
+
+    def _sketch(self, where: str, weight: str) -> dict[int, int]:
+        col = "sketch_investments" if weight == "investments" else "sketch_rounds"
+        df = self.read(f"SELECT sketch_keys, {col} AS counts FROM {self.t} WHERE {where};")
+        return merge_sketches(df["sketch_keys"], df["counts"])
+
+    @staticmethod
+    def _where(round_type: str | None, country: str | None, with_investors: bool | None) -> str:
+        conds = ["true"]
+        if round_type is not None:
+            conds.append(f"funding_round_type ILIKE '{round_type.replace(chr(39), chr(39) * 2)}'")
+        if country is not None:
+            # страна известна только через objects, как в отчётах с JOIN objects
+            conds += [f"country = '{country.replace(chr(39), chr(39) * 2)}'", "has_object"]
+        if with_investors is not None:
+            conds.append("has_investors" if with_investors else "NOT has_investors")
+        return " AND ".join(conds)
+
+    def distribution(self, round_type: str | None = None, country: str | None = None,
+                     with_investors: bool | None = None, weight: str = "rounds"):
+        """Распределение raised_amount_usd > 0 из скетча: (raised_amount_usd, weight) по корзинам.
+
+        weight="investments" — каждая строка investments отдельно, как hist_seriesa_usa.sql.
+        """
+        import pandas as pd
+
+        sk = self._sketch(self._where(round_type, country, with_investors), weight)
+        return pd.DataFrame({"raised_amount_usd": [sketch_value(k) for k in sk],
+                             "weight": list(sk.values())})
+
+    def quantiles(self, qs=(0.25, 0.5, 0.75, 0.9), round_type: str | None = None, country: str | None = None,
+                  with_investors: bool | None = None, weight: str = "rounds") -> dict[float, float | None]:
+        sk = self._sketch(self._where(round_type, country, with_investors), weight)
+        return dict(zip(qs, sketch_quantiles(sk, qs)))
@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
 import os
 import csv
+import gzip
 import argparse
 import psycopg2
+import metrics
+from quality import run_checks
 
 def read_sql(path: str) -> list[str]:
     with open(path, "r", encoding="utf-8") as f:
@@ -23,10 +26,14 @@ def exec_file(cur, path: str, verbose_name: str):
     for stmt in read_sql(path):
         cur.execute(stmt)
 
-def print_table(cur, title: str, limit: int = 20):
-    rows = cur.fetchall()
-    cols = [d[0] for d in cur.description] if cur.description else []
-    print(f"\n--- {title} (rows: {len(rows)}) ---")
+def print_table(conn, stmt: str, title: str, limit: int = 20):
+    # серверный курсор: с сервера забираем только limit + 1 строк, а не весь результат
+    with conn.cursor(name="preview") as cur:
+        cur.execute(stmt)
+        rows = cur.fetchmany(limit + 1)
+        cols = [d[0] for d in cur.description] if cur.description else []
+    more = len(rows) > limit
+    print(f"\n--- {title} (rows: {f'{limit}+' if more else len(rows)}) ---")
     if not rows:
         print("(no rows)")
         return
@@ -36,19 +43,53 @@ def print_table(cur, title: str, limit: int = 20):
     # строки (срез)
     for r in rows[:limit]:
         print(" | ".join(str(x) if x is not None else "" for x in r))
-    if len(rows) > limit:
-        print(f"... {len(rows) - limit} more")
+    if more:
+        print("... more")
 
-def export_csv(cur, path: str):
+def export_csv(conn, query: str, path: str, compress: bool = False, batch: int = 10_000):
+    """Пишет результат запроса в CSV (или .csv.gz) пачками по `batch` строк через серверный курсор."""
+    if compress and not path.endswith(".gz"):
+        path += ".gz"
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    rows = cur.fetchall()
-    cols = [d[0] for d in cur.description] if cur.description else []
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        w.writerow(cols)
-        for r in rows:
-            w.writerow(r)
-    print(f"saved: {path}")
+    opener = gzip.open if compress else open
+    rows = 0
+    step = f"export:{os.path.basename(path)}"
+    with metrics.timed(step), conn.cursor(name="export") as cur:
+        cur.itersize = batch
+        cur.execute(query)
+        with opener(path, "wt", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            chunk = cur.fetchmany(batch)
+            cols = [d[0] for d in cur.description] if cur.description else []
+            w.writerow(cols)
+            while chunk:
+                w.writerows(chunk)
+                rows += len(chunk)
+                chunk = cur.fetchmany(batch)
+    size = os.path.getsize(path)
+    metrics.record_output(step, rows, size)
+    print(f"saved: {path} ({rows:,} rows, {size:,} bytes)")
+    return rows
+
+# файл в exports/ -> запрос
+EXPORTS = [
+    # Топ компаний по финансированию
+    ("company_funding_top100.csv", """
+        SELECT o.name, cf.total_raised_usd
+        FROM cb.mv_company_funding cf
+        JOIN cb.objects o ON o.entity_id = cf.entity_id
+        ORDER BY cf.total_raised_usd DESC NULLS LAST
+        LIMIT 100;
+    """),
+    # Топ инвесторов
+    ("top_investors_top100.csv", """
+        SELECT * FROM cb.mv_top_investors
+        ORDER BY deals DESC
+        LIMIT 100;
+    """),
+    # Привлечения по годам
+    ("raised_by_year.csv", """SELECT * FROM cb.mv_raised_by_year ORDER BY year;"""),
+]
 
 def main():
     ap = argparse.ArgumentParser(description="Run assignment SQL: views, indices, checks, analysis, and export CSVs.")
@@ -58,66 +99,70 @@ def main():
     ap.add_argument("--user", default="postgres")
     ap.add_argument("--password", default=None)
     ap.add_argument("--project-dir", default="dv-assignment", help="корень проекта с папками sql/ и exports/")
+    ap.add_argument("--gzip", action="store_true", help="сжимать экспорты (.csv.gz)")
+    ap.add_argument("--checks", choices=["exact", "fast", "sql", "skip"], default="exact",
+                    help="проверки качества: exact — точно за проход на таблицу, fast — по статистике, "
+                         "sql — старый sql/checks.sql")
+    ap.add_argument("--sample-pct", type=float, default=1.0, help="процент выборки для --checks fast")
+    ap.add_argument("--backend", choices=["postgres", "snapshot"], default="postgres",
+                    help="snapshot — аналитика и экспорт по Parquet-снимку (snapshot.py export) без сервера")
+    ap.add_argument("--snapshot-dir", default=None, help="каталог снимка (по умолчанию <project-dir>/.snapshot)")
+    metrics.add_arguments(ap)
     args = ap.parse_args()
+    metrics.configure(args, "assignment")
 
     sql_dir = os.path.join(args.project_dir, "sql")
     exports_dir = os.path.join(args.project_dir, "exports")
 
     views_sql    = os.path.join(sql_dir, "views.sql")
+    mviews_sql   = os.path.join(sql_dir, "materialized.sql")
     indices_sql  = os.path.join(sql_dir, "indices.sql")
     checks_sql   = os.path.join(sql_dir, "checks.sql")
     analysis_sql = os.path.join(sql_dir, "analysis.sql")
 
-    conn = psycopg2.connect(
-        host=args.host, port=args.port, dbname=args.dbname,
-        user=args.user, password=args.password
-    )
+    if args.backend == "snapshot":
+        # снимок уже содержит mv_*: DDL и проверки относятся к серверу, тут только чтение
+        from snapshot import Snapshot
+        conn = Snapshot(args.snapshot_dir or os.path.join(args.project_dir, ".snapshot"))
+        print(f">>> SNAPSHOT {conn.path} (data_version {conn.manifest['data_version']}, "
+              f"exported {conn.manifest['exported_at']}); views/indices/checks skipped")
+    else:
+        with metrics.connection_wait():
+            conn = psycopg2.connect(
+                host=args.host, port=args.port, dbname=args.dbname,
+                user=args.user, password=args.password
+            )
     try:
         with conn:
-            with conn.cursor() as cur:
-                # 1) вьюхи и индексы
-                exec_file(cur, views_sql, "CREATE/REPLACE VIEWS")
-                exec_file(cur, indices_sql, "CREATE INDICES")
+            if args.backend == "postgres":
+                with conn.cursor() as cur:
+                    # 1) вьюхи (и их материализованные копии) и индексы
+                    exec_file(cur, views_sql, "CREATE/REPLACE VIEWS")
+                    exec_file(cur, mviews_sql, "CREATE MATERIALIZED VIEWS")
+                    exec_file(cur, indices_sql, "CREATE INDICES")
 
-                # 2) проверки качества — печать в консоль
+                # 2) проверки качества — печать в консоль, история в cb.dq_history
                 print("\n>>> CHECKS")
-                for stmt in read_sql(checks_sql):
-                    cur.execute(stmt)
-                    title = stmt.replace("\n", " ")[:60] + "..."
-                    print_table(cur, title, limit=20)
-
-                # 3) аналитика - печать и экспорт CSV
-                print("\n>>> ANALYSIS (print preview)")
-                for stmt in read_sql(analysis_sql):
-                    cur.execute(stmt)
-                    title = stmt.replace("\n", " ")[:60] + "..."
-                    print_table(cur, title, limit=20)
-
-                # Топ компаний по финансированию
-                cur.execute("""
-                    SELECT o.name, cf.total_raised_usd
-                    FROM cb.v_company_funding cf
-                    JOIN cb.objects o ON o.entity_id = cf.entity_id
-                    ORDER BY cf.total_raised_usd DESC NULLS LAST
-                    LIMIT 100;
-                """)
-                export_csv(cur, os.path.join(exports_dir, "company_funding_top100.csv"))
+                if args.checks == "sql":
+                    for stmt in read_sql(checks_sql):
+                        title = stmt.replace("\n", " ")[:60] + "..."
+                        print_table(conn, stmt, title, limit=20)
+                elif args.checks != "skip":
+                    run_checks(conn, "cb", args.checks, args.sample_pct)
 
-                # Топ инвесторов
-                cur.execute("""
-                    SELECT * FROM cb.v_top_investors
-                    ORDER BY deals DESC
-                    LIMIT 100;
-                """)
-                export_csv(cur, os.path.join(exports_dir, "top_investors_top100.csv"))
+            # 3) аналитика - печать и экспорт CSV
+            print("\n>>> ANALYSIS (print preview)")
+            for stmt in read_sql(analysis_sql):
+                title = stmt.replace("\n", " ")[:60] + "..."
+                print_table(conn, stmt, title, limit=20)
 
-                # Привлечения по годам
-                cur.execute("""SELECT * FROM cb.v_raised_by_year ORDER BY year;""")
-                export_csv(cur, os.path.join(exports_dir, "raised_by_year.csv"))
+            for name, query in EXPORTS:
+                export_csv(conn, query, os.path.join(exports_dir, name), args.gzip)
 
         print("См. папку exports/ и лог консоли.")
     finally:
         conn.close()
+        metrics.flush()
 
 if __name__ == "__main__":
     main()
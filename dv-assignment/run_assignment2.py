@@ -1,13 +1,21 @@
 import os
+import time
 import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import pandas as pd
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import ProgrammingError
+from psycopg2.errors import UndefinedTable
 import matplotlib.pyplot as plt
 import plotly.express as px
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill
-from openpyxl.formatting.rule import ColorScaleRule, FormulaRule
+import xlsxwriter
+from xlsxwriter.utility import xl_col_to_name
 import numpy as np
+from pathlib import Path
+from query_cache import QueryCache, data_version, CACHE_DIR, DEFAULT_MAX_MB
+from snapshot import Snapshot, SNAPSHOT_DIR
+from rollup import Rollup
+import metrics
 # utils
 def ensure_dirs():
     os.makedirs("dv-assignment/charts", exist_ok=True)
@@ -15,18 +23,95 @@ def ensure_dirs():
 
 def mk_engine(a):
     dsn = f"postgresql+psycopg2://{a.user}:{a.password}@{a.host}:{a.port}/{a.dbname}"
-    return create_engine(dsn, future=True)
+    # по соединению на параллельный запрос, без overflow — лишние ждут в очереди
+    return create_engine(dsn, future=True, pool_size=max(1, a.parallel), max_overflow=0)
+
+def read_df(engine, sql):
+    if isinstance(engine, Snapshot):
+        return engine.query(sql)
+    with metrics.connection_wait():
+        con = engine.connect()  # ждём свободное соединение пула
+    with con:
+        return pd.read_sql(text(sql), con)
+
+def run_sql(engine, path, label, cache=None, version=None, refresh=False):
+    sql = open(path, "r", encoding="utf-8").read()
+    key = cache.key(sql, version) if cache else None
+    if cache and not refresh:
+        df = cache.get(key)
+        if df is not None:
+            metrics.record_cache_hit(label)
+            print(f"[CACHE] {label}: {len(df):,} rows")
+            return df
+    t0 = time.perf_counter()
+    with metrics.timed(f"query:{label}"):
+        df = read_df(engine, sql)
+    if cache:
+        cache.put(key, df)
+    metrics.record_output(f"query:{label}", len(df))
+    print(f"[OK] {label}: {len(df):,} rows, {time.perf_counter() - t0:.2f}s")
+    return df
 
-def run_sql(engine, path, label):
-    with engine.connect() as con:
-        sql = open(path, "r", encoding="utf-8").read()
-        df = pd.read_sql(text(sql), con)
-    print(f"[OK] {label}: {len(df):,} rows")
+# метка -> файл в sql/assignment2/
+QUERIES = {
+    "PIE":     "pie_investor_types.sql",
+    "BAR":     "bar_top_buyers.sql",
+    "BARH":    "barh_countries_raised.sql",
+    "LINE":    "line_top5_investors_by_year.sql",
+    "HIST":    "hist_seriesa_usa.sql",
+    "SCATTER": "scatter_funding_vs_acq.sql",
+    "PLOTLY":  "plotly_country_year.sql",
+}
+
+# метка -> срез куба cb.fr_rollup (rollup.py), который отвечает на тот же вопрос, что и файл из QUERIES.
+# HIST сюда не входит: лист seriesA_USA в Excel — точные суммы раундов, а скетч даёт только корзины.
+ROLLUP_QUERIES = {
+    "BARH":   lambda r: r.top_countries(2005, 2015),
+    "PLOTLY": lambda r: r.country_year(2005),
+}
+
+def missing_relation(e: Exception) -> bool:
+    """Ошибка «нет такой таблицы»: UndefinedTable в PostgreSQL, CatalogException в DuckDB (снимок)."""
+    if isinstance(e, ProgrammingError):
+        return isinstance(e.orig, UndefinedTable)
+    return type(e).__name__ == "CatalogException"  # duckdb импортирует только snapshot.py
+
+def run_rollup(engine, path, label, **q):
+    """Срез из cb.fr_rollup; нет куба (старая база/снимок) — обычный запрос из файла."""
+    t0 = time.perf_counter()
+    try:
+        with metrics.timed(f"rollup:{label}"):
+            df = ROLLUP_QUERIES[label](Rollup(lambda sql: read_df(engine, sql)))
+    except Exception as e:
+        if not missing_relation(e):
+            raise
+        print(f"[ROLLUP] {label}: нет cb.fr_rollup — считаем по {os.path.basename(path)}")
+        return run_sql(engine, path, label, **q)
+    metrics.record_output(f"rollup:{label}", len(df))
+    print(f"[OK] {label}: {len(df):,} rows from fr_rollup, {time.perf_counter() - t0:.2f}s")
     return df
 
+def run_queries(engine, base, parallel=1, use_rollup=True, **q):
+    """Выполняет все QUERIES (до `parallel` одновременно), возвращает {метка: DataFrame} в порядке QUERIES."""
+    t0 = time.perf_counter()
+
+    def run(label, f):
+        fn = run_rollup if use_rollup and label in ROLLUP_QUERIES else run_sql
+        return fn(engine, base + f, label, **q)
+
+    if parallel > 1:
+        with ThreadPoolExecutor(max_workers=parallel) as ex:
+            futures = {label: ex.submit(run, label, f) for label, f in QUERIES.items()}
+            res = {label: fut.result() for label, fut in futures.items()}
+    else:
+        res = {label: run(label, f) for label, f in QUERIES.items()}
+    print(f"[OK] {len(res)} queries in {time.perf_counter() - t0:.2f}s (parallel={parallel})")
+    return res
+
 def save_png(fig, name, title):
     path = f"dv-assignment/charts/{name}.png"
     fig.savefig(path, bbox_inches="tight")
+    plt.close(fig)  # иначе pyplot держит все фигуры до конца процесса
     print(f"[CHART] {name}.png — {title}")
 
 # charts
@@ -78,7 +163,8 @@ def scatter_funding_vs_acq(df):
 
 
 
-def plotly_country_year(df_anim):
+def plotly_country_year(df_anim, show=False):
+    """Анимация по годам: всегда пишется в charts/ как самодостаточный HTML и JSON; show — ещё и открыть в браузере."""
     df = df_anim.copy()
     df["deals"] = df["deals"].clip(lower=1)
     df["avg_raised"] = df["avg_raised"].clip(lower=1)
@@ -120,97 +206,141 @@ def plotly_country_year(df_anim):
 
     fig.update_layout(template="simple_white", transition={'duration': 300},
                       margin=dict(l=40, r=20, t=60, b=40))
-    fig.show()
-
+    # plotly.js встраивается в файл — HTML открывается без сети
+    fig.write_html("dv-assignment/charts/plotly_country_year.html", include_plotlyjs=True, auto_play=False)
+    fig.write_json("dv-assignment/charts/plotly_country_year.json")
+    print("[CHART] plotly_country_year.html/.json — Страны: сделки vs средний размер раунда по годам")
+    if show:
+        fig.show()
+
+
+# метка запроса -> график по его результату
+CHARTS = {
+    "PIE":     pie_investor_types,
+    "BAR":     bar_top_buyers,
+    "BARH":    barh_countries_raised,
+    "LINE":    line_top5_investors,
+    "HIST":    hist_seriesa_usa,
+    "SCATTER": scatter_funding_vs_acq,
+    "PLOTLY":  plotly_country_year,
+}
+
+def use_agg():
+    """Agg рисует только в файл: без окон и GUI-цикла — для --headless и для процессов пула."""
+    plt.switch_backend("Agg")
+
+def render_chart(label, df, show=False):
+    """Рисует один график из CHARTS; возвращает (метка, секунды). В пуле выполняется в процессе-воркере."""
+    t0 = time.perf_counter()
+    if show:
+        CHARTS[label](df, show=True)
+    else:
+        CHARTS[label](df)
+    return label, time.perf_counter() - t0
+
+def render_charts(res, jobs=1, headless=False):
+    """Рисует все CHARTS по результатам запросов, возвращает {метка: секунды}.
+
+    jobs > 1 — в пуле из jobs процессов (каждый с Agg). Без headless интерактивная анимация
+    открывается в браузере в основном процессе, после остальных графиков.
+    """
+    t0 = time.perf_counter()
+    if headless:
+        use_agg()
+    interactive = [] if headless else ["PLOTLY"]
+    labels = [label for label in CHARTS if label not in interactive]
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=use_agg) as ex:
+            futures = [ex.submit(render_chart, label, res[label]) for label in labels]
+            timings = dict(f.result() for f in futures)
+    else:
+        timings = dict(render_chart(label, res[label]) for label in labels)
+    for label in interactive:
+        print("[PLOTLY] Откроется интерактивный график; закрой окно для продолжения.")
+        _, sec = render_chart(label, res[label], show=True)
+        timings[label] = sec
+    for label, sec in timings.items():
+        metrics.observe_step(f"chart:{label}", sec)
+        print(f"[TIME] chart {label}: {sec:.2f}s")
+    print(f"[OK] {len(timings)} charts in {time.perf_counter() - t0:.2f}s (jobs={jobs})")
+    return timings
 
 
 # ==== Экспорт в Excel с форматированием ====
-from pathlib import Path
-import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import PatternFill
-from openpyxl.formatting.rule import ColorScaleRule, FormulaRule
+def excel_columns(df: pd.DataFrame):
+    """Ширины колонок и индексы числовых колонок — по dtypes и длинам строк, без прохода по ячейкам.
+
+    Ширина считается по заголовку и первым 199 строкам, как раньше по 200 ячейкам колонки.
+    """
+    head = df.head(199)
+    widths, numeric = [], []
+    for j, col in enumerate(df.columns):
+        s = head.iloc[:, j]
+        lens = s.astype(str).where(s.notna(), "").str.len()
+        max_len = max(len(str(col)), int(lens.max()) if len(lens) else 0)
+        widths.append(min(max(10, int(max_len * 0.9)), 60))
+        if pd.api.types.is_numeric_dtype(s) and s.head(99).notna().any():
+            numeric.append(j)
+    return widths, numeric
 
 def export_to_excel(dataframes: dict[str, pd.DataFrame], filename: str):
 
+    t0 = time.perf_counter()
     out_dir = Path("dv-assignment/exports")
     out_dir.mkdir(parents=True, exist_ok=True)
     path = out_dir / filename
 
-    with pd.ExcelWriter(path, engine="openpyxl") as writer:
-        for sheet, df in dataframes.items():
-            sheet_name = (sheet or "Sheet")[:31]
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
-
-    wb = load_workbook(path)
+    # constant_memory: строки уходят на диск сразу, книга целиком в памяти не держится
+    wb = xlsxwriter.Workbook(str(path), {"constant_memory": True,
+                                         "default_date_format": "yyyy-mm-dd hh:mm:ss"})
+    header_fmt = wb.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+    min_fmt = wb.add_format({"bg_color": "#B3D1FF"})
+    max_fmt = wb.add_format({"bg_color": "#FFC04D"})
     total_rows = 0
 
-    for sheet in wb.sheetnames:
-        ws = wb[sheet]
-
-        ws.freeze_panes = "B2"
-
-        ws.auto_filter.ref = ws.dimensions
-
-        for col in ws.columns:
-            max_len = 0
-            col_letter = col[0].column_letter
-            for cell in col[: min(len(col), 200)]:
-                v = cell.value
-                v = "" if v is None else str(v)
-                if len(v) > max_len:
-                    max_len = len(v)
-            ws.column_dimensions[col_letter].width = min(max(10, int(max_len * 0.9)), 60)
-
-        header = [c.value for c in ws[1]]
-        rows_count = ws.max_row - 1 if ws.max_row > 1 else 0
-        total_rows += rows_count
-
-        numeric_cols = []
-        for j in range(1, len(header) + 1):
-            values = []
-            for i in range(2, min(ws.max_row, 101)):
-                v = ws.cell(row=i, column=j).value
-                if isinstance(v, (int, float)):
-                    values.append(v)
-                elif isinstance(v, str):
-                    try:
-                        float(v.replace(",", ""))
-                        values.append(0.0)
-                    except Exception:
-                        pass
-            if values:
-                numeric_cols.append(j)
+    for sheet, df in dataframes.items():
+        ws = wb.add_worksheet((sheet or "Sheet")[:31])
+        n_rows, n_cols = len(df), len(df.columns)
+        total_rows += n_rows
+        if n_cols == 0:
+            continue
 
-        # градиент и min/max для каждой числовой колонки
-        for col_idx in numeric_cols:
-            col_letter = ws.cell(row=1, column=col_idx).column_letter
-            data_range = f"{col_letter}2:{col_letter}{ws.max_row}"
-
-            # 3-цветный градиент
-            grad = ColorScaleRule(
-                start_type="min", start_color="FFAA0000",   # красный
-                mid_type="percentile", mid_value=50, mid_color="FFFFFF00",  # жёлтый
-                end_type="max", end_color="FF00AA00"        # зелёный
-            )
-            ws.conditional_formatting.add(data_range, grad)
+        widths, numeric_cols = excel_columns(df)
+        for j, width in enumerate(widths):
+            ws.set_column(j, j, width)
+
+        ws.freeze_panes(1, 1)  # B2
+        ws.autofilter(0, 0, n_rows, n_cols - 1)
 
+        # градиент и min/max для каждой числовой колонки
+        for j in numeric_cols:
+            col_letter = xl_col_to_name(j)
+            data_range = f"{col_letter}2:{col_letter}{n_rows + 1}"
+            abs_range = f"${col_letter}$2:${col_letter}${n_rows + 1}"
+
+            # 3-цветный градиент: красный → жёлтый → зелёный
+            ws.conditional_format(data_range, {
+                "type": "3_color_scale",
+                "min_color": "#AA0000",
+                "mid_type": "percentile", "mid_value": 50, "mid_color": "#FFFF00",
+                "max_color": "#00AA00",
+            })
             # MIN и MAX (тонкая подсветка поверх градиента)
-            min_fill = PatternFill("solid", fgColor="FFB3D1FF")
-            max_fill = PatternFill("solid", fgColor="FFFFC04D")
+            ws.conditional_format(data_range, {"type": "formula", "criteria": f"={col_letter}2=MIN({abs_range})",
+                                               "format": min_fmt})
+            ws.conditional_format(data_range, {"type": "formula", "criteria": f"={col_letter}2=MAX({abs_range})",
+                                               "format": max_fmt})
 
-            ws.conditional_formatting.add(
-                data_range,
-                FormulaRule(formula=[f'{col_letter}2=MIN({data_range})'], fill=min_fill),
-            )
-            ws.conditional_formatting.add(
-                data_range,
-                FormulaRule(formula=[f'{col_letter}2=MAX({data_range})'], fill=max_fill),
-            )
+        ws.write_row(0, 0, [str(c) for c in df.columns], header_fmt)
+        values = df.astype(object).where(df.notna(), None)
+        for i, row in enumerate(values.itertuples(index=False, name=None), start=1):
+            ws.write_row(i, 0, row)
 
-    wb.save(path)
+    wb.close()
+    metrics.observe_step(f"export:{filename}", time.perf_counter() - t0)
+    metrics.record_output(f"export:{filename}", total_rows, path.stat().st_size)
 
-    print(f"Создан файл {path.name}, {len(wb.sheetnames)} листа(ов), {total_rows} строк.")
+    print(f"Создан файл {path.name}, {len(dataframes)} листа(ов), {total_rows} строк.")
 
 def main():
     ap = argparse.ArgumentParser()
@@ -219,30 +349,47 @@ def main():
     ap.add_argument("--dbname", default="dv_project")
     ap.add_argument("--user", default="postgres")
     ap.add_argument("--password", default="0000")
+    ap.add_argument("--no-cache", action="store_true", help="не читать и не писать кэш результатов")
+    ap.add_argument("--refresh", action="store_true", help="выполнить запросы заново и перезаписать кэш")
+    ap.add_argument("--cache-dir", default=CACHE_DIR)
+    ap.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_MB)
+    ap.add_argument("--parallel", type=int, default=1, help="сколько запросов выполнять одновременно")
+    ap.add_argument("--backend", choices=["postgres", "snapshot"], default="postgres",
+                    help="snapshot — считать по Parquet-снимку (snapshot.py export) без сервера")
+    ap.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+    ap.add_argument("--no-rollup", action="store_true",
+                    help="считать BARH/PLOTLY по исходным таблицам, а не по кубу cb.fr_rollup")
+    ap.add_argument("--headless", action="store_true",
+                    help="без окон и браузера: matplotlib на Agg, анимация только в charts/*.html/.json")
+    ap.add_argument("--render-jobs", type=int, default=1,
+                    help="сколько графиков рисовать одновременно (процессы)")
+    metrics.add_arguments(ap)
     args = ap.parse_args()
+    metrics.configure(args, "assignment2")
 
     ensure_dirs()
-    engine = mk_engine(args)
+    engine = Snapshot(args.snapshot_dir) if args.backend == "snapshot" else mk_engine(args)
 
-    base = "dv-assignment/sql/assignment2/"
+    cache, version = None, None
+    if not args.no_cache:
+        version = engine.version if args.backend == "snapshot" else data_version(engine)
+        if version is None:
+            print("[CACHE] нет cb.data_version — версию данных не узнать, кэш выключен")
+        else:
+            cache = QueryCache(args.cache_dir, args.cache_max_mb)
+    q = dict(cache=cache, version=version, refresh=args.refresh)
 
-    df_pie  = run_sql(engine, base + "pie_investor_types.sql",        "PIE")
-    df_bar  = run_sql(engine, base + "bar_top_buyers.sql",            "BAR")
-    df_bh   = run_sql(engine, base + "barh_countries_raised.sql",     "BARH")
-    df_line = run_sql(engine, base + "line_top5_investors_by_year.sql","LINE")
-    df_hist = run_sql(engine, base + "hist_seriesa_usa.sql",          "HIST")
-    df_scat = run_sql(engine, base + "scatter_funding_vs_acq.sql",    "SCATTER")
-    df_anim = run_sql(engine, base + "plotly_country_year.sql",       "PLOTLY")
+    base = "dv-assignment/sql/assignment2/"
 
-    pie_investor_types(df_pie)
-    bar_top_buyers(df_bar)
-    barh_countries_raised(df_bh)
-    line_top5_investors(df_line)
-    hist_seriesa_usa(df_hist)
-    scatter_funding_vs_acq(df_scat)
+    res = run_queries(engine, base, args.parallel, use_rollup=not args.no_rollup, **q)
+    df_pie  = res["PIE"]
+    df_bar  = res["BAR"]
+    df_bh   = res["BARH"]
+    df_line = res["LINE"]
+    df_hist = res["HIST"]
+    df_scat = res["SCATTER"]
 
-    print("[PLOTLY] Откроется интерактивный график; закрой окно для продолжения.")
-    plotly_country_year(df_anim)
+    render_charts(res, args.render_jobs, args.headless)
 
     export_to_excel({
         "investor_types": df_pie,
@@ -252,6 +399,7 @@ def main():
         "seriesA_USA": df_hist,
         "funding_vs_acq": df_scat,
     }, "assignment2_report.xlsx")
+    metrics.flush()
 
 if __name__ == "__main__":
     main()
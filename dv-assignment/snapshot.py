@@ -0,0 +1,288 @@
+"""Офлайн-снимок схемы cb в Parquet и встроенный движок (DuckDB) для отчётного SQL.
+
+export — выгружает таблицы, mv_* и fr_rollup из PostgreSQL в каталог снимка (zstd);
+funding_rounds и investments разложены по годам раунда (funded_year=YYYY/).
+Snapshot — поднимает в памяти DuckDB со схемой cb из вьюх поверх файлов снимка,
+так что sql/analysis.sql и sql/assignment2/*.sql выполняются без сервера.
+
+    python dv-assignment/snapshot.py export --dbname dv_project --password 0000
+    python dv-assignment/snapshot.py query -f dv-assignment/sql/assignment2/pie_investor_types.sql
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+from datetime import datetime, timezone
+import psycopg2
+import psycopg2.extensions
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+SNAPSHOT_DIR = "dv-assignment/.snapshot"
+MANIFEST = "_snapshot.json"
+
+SNAPSHOT_TABLES = [
+    "objects", "people", "offices", "degrees", "milestones", "funds",
+    "funding_rounds", "investments", "acquisitions", "ipos", "relationships",
+    "mv_company_funding", "mv_top_investors", "mv_raised_by_year", "fr_rollup",
+]
+
+# таблица -> запрос с колонкой funded_year (год раунда; 0 — без даты);
+# {cols} — колонки таблицы без funded_year (в investments она есть, её ведёт загрузчик)
+PARTITIONED = {
+    "funding_rounds": """
+        SELECT {cols}, COALESCE(EXTRACT(YEAR FROM t.funded_at)::int, 0) AS funded_year
+        FROM {sch}.funding_rounds t
+    """,
+    "investments": """
+        SELECT {cols}, COALESCE(t.funded_year, 0) AS funded_year
+        FROM {sch}.investments t
+    """,
+}
+PARTITION_COLUMN = "funded_year"
+
+# OID типа PostgreSQL -> тип Arrow; всё остальное пишем строкой
+PG_ARROW = {
+    16: pa.bool_(),
+    20: pa.int64(), 21: pa.int16(), 23: pa.int32(),
+    700: pa.float32(), 701: pa.float64(), 1700: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp("us"), 1184: pa.timestamp("us", tz="UTC"),
+    1007: pa.list_(pa.int32()), 1016: pa.list_(pa.int64()),
+}
+TEXT_OIDS = {25, 1042, 1043}
+
+# numeric -> float сразу в psycopg2, без промежуточных Decimal
+FLOAT_NUMERIC = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, "FLOAT_NUMERIC",
+    lambda v, cur: float(v) if v is not None else None)
+
+
+def arrow_schema(description) -> pa.Schema:
+    return pa.schema([(d.name, PG_ARROW.get(d.type_code, pa.string())) for d in description])
+
+
+def _column(values, typ, oid):
+    if typ == pa.string() and oid not in TEXT_OIDS:
+        values = [v if v is None else str(v) for v in values]
+    return pa.array(values, type=typ)
+
+
+def _batches(cur, schema: pa.Schema, batch: int):
+    oids = [d.type_code for d in cur.description]
+    rows = cur.fetchmany(batch)
+    while rows:
+        cols = list(zip(*rows))
+        yield pa.record_batch([_column(list(c), f.type, oid) for c, f, oid in zip(cols, schema, oids)],
+                              schema=schema)
+        rows = cur.fetchmany(batch)
+
+
+def table_columns(conn, schema: str, table: str) -> list[str]:
+    with conn.cursor() as cur:
+        cur.execute("SELECT column_name FROM information_schema.columns"
+                    " WHERE table_schema = %s AND table_name = %s ORDER BY ordinal_position;", (schema, table))
+        return [r[0] for r in cur.fetchall()]
+
+
+def export_table(conn, schema: str, table: str, out_dir: str, batch: int = 50_000) -> int:
+    """Стримит таблицу серверным курсором в Parquet; в памяти одна пачка по `batch` строк."""
+    query = PARTITIONED.get(table, "SELECT * FROM {sch}." + table)
+    if "{cols}" in query:
+        query = query.format(sch=schema, cols=", ".join(
+            f"t.{c}" for c in table_columns(conn, schema, table) if c != PARTITION_COLUMN))
+    else:
+        query = query.format(sch=schema)
+    rows = 0
+    with conn.cursor(name=f"snapshot_{table}") as cur:
+        psycopg2.extensions.register_type(FLOAT_NUMERIC, cur)
+        cur.itersize = batch
+        cur.execute(query)
+        cur.fetchmany(0)  # у именованного курсора description появляется после первого FETCH
+        schema_ = arrow_schema(cur.description)
+
+        def counted():
+            nonlocal rows
+            for b in _batches(cur, schema_, batch):
+                rows += b.num_rows
+                yield b
+
+        partitioning = None
+        if table in PARTITIONED:
+            partitioning = ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.int32())]), flavor="hive")
+        ds.write_dataset(
+            counted(), os.path.join(out_dir, table), schema=schema_, format="parquet",
+            partitioning=partitioning, basename_template="part-{i}.parquet",
+            file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+            existing_data_behavior="delete_matching",
+        )
+    if rows == 0:
+        # пустая таблица: файл со схемой, чтобы вьюха в DuckDB всё равно создалась
+        os.makedirs(os.path.join(out_dir, table), exist_ok=True)
+        pq.write_table(schema_.empty_table(), os.path.join(out_dir, table, "part-0.parquet"))
+    return rows
+
+
+def _exists(cur, schema: str, table: str) -> bool:
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f"{schema}.{table}",))
+    return cur.fetchone()[0]
+
+
+def export_snapshot(conn, out_dir: str = SNAPSHOT_DIR, schema: str = "cb", batch: int = 50_000) -> dict:
+    """Пишет снимок во временный каталог и подменяет им `out_dir` целиком — читатели не видят полуснимок."""
+    tmp = f"{out_dir.rstrip('/')}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    with conn.cursor() as cur:
+        version = "0"
+        if _exists(cur, schema, "data_version"):
+            cur.execute(f"SELECT version FROM {schema}.data_version")
+            version = str((cur.fetchone() or [0])[0])
+        tables = [t for t in SNAPSHOT_TABLES if _exists(cur, schema, t)]
+    conn.commit()
+
+    manifest = {"schema": schema, "data_version": version,
+                "exported_at": datetime.now(timezone.utc).isoformat(timespec="seconds"), "tables": {}}
+    for table in tables:
+        t0 = time.perf_counter()
+        rows = export_table(conn, schema, table, tmp, batch)
+        conn.commit()
+        manifest["tables"][table] = {"rows": rows,
+                                     "partition_by": PARTITION_COLUMN if table in PARTITIONED else None}
+        print(f"[SNAPSHOT] {schema}.{table}: {rows:,} rows, {time.perf_counter() - t0:.1f}s")
+    with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    old = f"{out_dir.rstrip('/')}.old-{os.getpid()}"
+    if os.path.exists(out_dir):
+        os.replace(out_dir, old)
+    os.replace(tmp, out_dir)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+class _Cursor:
+    """Курсор DuckDB с тем подмножеством DB-API, которым пользуются print_table / export_csv."""
+
+    def __init__(self, con):
+        self._cur = con.cursor()
+        self.itersize = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cur.close()
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def execute(self, sql, params=None):
+        self._cur.execute(sql, params)
+
+    def fetchone(self):
+        return self._cur.fetchone()
+
+    def fetchmany(self, size):
+        return self._cur.fetchmany(size)
+
+    def fetchall(self):
+        return self._cur.fetchall()
+
+
+class Snapshot:
+    """Схема cb в DuckDB (в памяти) поверх файлов снимка; ведёт себя как соединение для отчётов."""
+
+    def __init__(self, path: str = SNAPSHOT_DIR, threads: int | None = None):
+        import duckdb
+
+        manifest_path = os.path.join(path, MANIFEST)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"нет снимка в {path}: сначала snapshot.py export")
+        with open(manifest_path, encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.path = path
+        self.schema = self.manifest["schema"]
+        # каталог в токене: снимки разных баз с одинаковым data_version не делят кэш
+        self.version = (f"snapshot:{os.path.abspath(path)}:{self.manifest['data_version']}:"
+                        f"{self.manifest['exported_at']}")
+
+        self.con = duckdb.connect(":memory:")
+        if threads:
+            self.con.execute(f"SET threads = {int(threads)}")
+        self.con.execute(f"CREATE SCHEMA IF NOT EXISTS {self.schema}")
+        for table, meta in self.manifest["tables"].items():
+            files = os.path.join(path, table, "**", "*.parquet").replace("'", "''")
+            hive = "true" if meta.get("partition_by") else "false"
+            self.con.execute(f"CREATE VIEW {self.schema}.{table} AS "
+                             f"SELECT * FROM read_parquet('{files}', hive_partitioning = {hive})")
+
+    def query(self, sql: str):
+        """Результат запроса как pandas.DataFrame; свой курсор на вызов — можно из нескольких потоков."""
+        with self.con.cursor() as cur:
+            return cur.execute(sql).df()
+
+    def cursor(self, name=None):
+        return _Cursor(self.con)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Snapshot the cb schema to Parquet and query it offline with DuckDB.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    ex = sub.add_parser("export", help="выгрузить таблицы cb из PostgreSQL в каталог снимка")
+    ex.add_argument("--host", default="localhost")
+    ex.add_argument("--port", type=int, default=5432)
+    ex.add_argument("--dbname", default="dv_project")
+    ex.add_argument("--user", default="postgres")
+    ex.add_argument("--password", default=None)
+    ex.add_argument("--schema", default="cb")
+    ex.add_argument("--batch", type=int, default=50_000, help="строк в пачке при чтении с сервера")
+    ex.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+
+    q = sub.add_parser("query", help="выполнить SQL по снимку и напечатать результат")
+    q.add_argument("sql", nargs="?", help="текст запроса (или -f файл)")
+    q.add_argument("-f", "--file")
+    q.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+    args = ap.parse_args()
+
+    if args.cmd == "export":
+        conn = psycopg2.connect(host=args.host, port=args.port, dbname=args.dbname,
+                                user=args.user, password=args.password)
+        try:
+            t0 = time.perf_counter()
+            m = export_snapshot(conn, args.snapshot_dir, args.schema, args.batch)
+            print(f"[SNAPSHOT] {len(m['tables'])} tables -> {args.snapshot_dir} "
+                  f"(data_version {m['data_version']}, {time.perf_counter() - t0:.1f}s)")
+        finally:
+            conn.close()
+        return
+
+    if not args.sql and not args.file:
+        ap.error("query: нужен текст запроса или -f файл")
+    sql = open(args.file, encoding="utf-8").read() if args.file else args.sql
+    snap = Snapshot(args.snapshot_dir)
+    t0 = time.perf_counter()
+    df = snap.query(sql)
+    print(df.to_string(max_rows=50))
+    print(f"({len(df):,} rows, {time.perf_counter() - t0:.3f}s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
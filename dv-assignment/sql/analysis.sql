@@ -1,15 +1,15 @@
 -- 6.1 Топ-20 компаний по общему финансированию (USD)
 SELECT o.name, cf.total_raised_usd
-FROM cb.v_company_funding cf
+FROM cb.mv_company_funding cf
 JOIN cb.objects o ON o.entity_id = cf.entity_id
 ORDER BY cf.total_raised_usd DESC NULLS LAST
 LIMIT 20;
 
 -- 6.2 Объём привлечений по годам
-SELECT * FROM cb.v_raised_by_year;
+SELECT * FROM cb.mv_raised_by_year ORDER BY year;
 
 -- 6.3 Топ-20 инвесторов по числу сделок
-SELECT * FROM cb.v_top_investors LIMIT 20;
+SELECT * FROM cb.mv_top_investors ORDER BY deals DESC LIMIT 20;
 
 -- 6.4 IPO по годам и странам
 -- IPO по годам и странам (кастим public_at из TEXT в DATE на лету)
@@ -30,10 +30,8 @@ SELECT
   COUNT(*) AS deals,
   SUM(a.price_amount) AS total_price
 FROM cb.acquisitions a
-JOIN cb.objects buyer  ON lower(replace(buyer.id,  chr(160), '')) =
-                          lower(replace(btrim(a.acquiring_object_id), chr(160), ''))
-JOIN cb.objects target ON lower(replace(target.id, chr(160), '')) =
-                          lower(replace(btrim(a.acquired_object_id),  chr(160), ''))
+JOIN cb.objects buyer  ON buyer.obj_key  = a.acquiring_object_key
+JOIN cb.objects target ON target.obj_key = a.acquired_object_key
 GROUP BY 1
 ORDER BY deals DESC NULLS LAST
 LIMIT 20;
@@ -2,8 +2,8 @@ SELECT
   COALESCE(NULLIF(buyer.name,''), buyer.id) AS buyer,
   COUNT(*) AS deals
 FROM cb.acquisitions a
-JOIN cb.objects buyer  ON buyer.id  = a.acquiring_object_id
-JOIN cb.objects target ON target.id = a.acquired_object_id
+JOIN cb.objects buyer  ON buyer.obj_key  = a.acquiring_object_key
+JOIN cb.objects target ON target.obj_key = a.acquired_object_key
 GROUP BY 1
 ORDER BY deals DESC
 LIMIT 10;
@@ -1,14 +1,15 @@
 WITH fr_valid AS (
-  SELECT fr.funding_round_id, fr.object_id, fr.funded_at::date AS dt, fr.raised_amount_usd
+  SELECT fr.funding_round_id, fr.object_key, fr.funded_at AS dt, fr.raised_amount_usd
   FROM cb.funding_rounds fr
-  WHERE fr.funded_at::date BETWEEN DATE '2005-01-01' AND DATE '2015-12-31'
+  WHERE fr.funded_at >= DATE '2005-01-01' AND fr.funded_at < DATE '2016-01-01'
 )
 SELECT
   COALESCE(NULLIF(o.country_code,''),'UNK') AS country,
   SUM(f.raised_amount_usd) AS raised_usd
 FROM fr_valid f
 JOIN cb.investments i ON i.funding_round_id = f.funding_round_id
-JOIN cb.objects o ON (o.id = f.object_id OR o.entity_id = f.object_id)
+                     AND i.funded_year BETWEEN 2005 AND 2015
+JOIN cb.objects o ON o.obj_key = f.object_key
 GROUP BY 1
 ORDER BY raised_usd DESC
 LIMIT 10;
@@ -3,6 +3,6 @@ SELECT
   COUNT(*) AS deals
 FROM cb.investments i
 JOIN cb.funding_rounds fr ON fr.funding_round_id = i.funding_round_id
-JOIN cb.objects        oinv ON oinv.id = i.investor_object_id
+JOIN cb.objects        oinv ON oinv.obj_key = i.investor_object_key
 GROUP BY 1
 ORDER BY 2 DESC;
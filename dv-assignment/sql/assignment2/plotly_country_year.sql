@@ -4,10 +4,9 @@ WITH base AS (
     COALESCE(NULLIF(o.country_code,''),'UNK') AS country,
     fr.raised_amount_usd
   FROM cb.funding_rounds fr
-  JOIN cb.objects o ON (o.id = fr.object_id OR o.entity_id = fr.object_id)
-  WHERE fr.funded_at IS NOT NULL
+  JOIN cb.objects o ON o.obj_key = fr.object_key
+  WHERE fr.funded_at >= DATE '2005-01-01'
     AND fr.raised_amount_usd IS NOT NULL AND fr.raised_amount_usd > 0
-    AND EXTRACT(YEAR FROM fr.funded_at)::int >= 2005
 ),
 agg AS (
   SELECT year, country,
@@ -2,8 +2,15 @@ CREATE INDEX IF NOT EXISTS idx_objects_entity_type   ON cb.objects(entity_type);
 CREATE INDEX IF NOT EXISTS idx_objects_country       ON cb.objects(country_code);
 CREATE INDEX IF NOT EXISTS idx_fr_object             ON cb.funding_rounds(object_id);
 CREATE INDEX IF NOT EXISTS idx_fr_funded_at          ON cb.funding_rounds(funded_at);
+CREATE INDEX IF NOT EXISTS idx_fr_round_id           ON cb.funding_rounds(funding_round_id);
 CREATE INDEX IF NOT EXISTS idx_inv_investor          ON cb.investments(investor_object_id);
 CREATE INDEX IF NOT EXISTS idx_inv_funded            ON cb.investments(funded_object_id);
 CREATE INDEX IF NOT EXISTS idx_acq_acquiring         ON cb.acquisitions(acquiring_object_id);
 CREATE INDEX IF NOT EXISTS idx_acq_acquired          ON cb.acquisitions(acquired_object_id);
 CREATE INDEX IF NOT EXISTS idx_ipos_public_at        ON cb.ipos(public_at);
+CREATE INDEX IF NOT EXISTS idx_objects_obj_key       ON cb.objects(obj_key);
+CREATE INDEX IF NOT EXISTS idx_fr_object_key         ON cb.funding_rounds(object_key);
+CREATE INDEX IF NOT EXISTS idx_inv_investor_key      ON cb.investments(investor_object_key);
+CREATE INDEX IF NOT EXISTS idx_inv_funded_key        ON cb.investments(funded_object_key);
+CREATE INDEX IF NOT EXISTS idx_acq_acquiring_key     ON cb.acquisitions(acquiring_object_key);
+CREATE INDEX IF NOT EXISTS idx_acq_acquired_key      ON cb.acquisitions(acquired_object_key);
@@ -0,0 +1,19 @@
+-- Материализованные копии отчётных вьюх: отчёты читают их, а не пересчитывают views на каждом запуске.
+-- Обновляет загрузчик после успешной загрузки (REFRESH ... CONCURRENTLY, нужен уникальный индекс).
+
+-- 1) Суммарное финансирование по компаниям
+CREATE MATERIALIZED VIEW IF NOT EXISTS cb.mv_company_funding AS
+SELECT * FROM cb.v_company_funding;
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_company_funding    ON cb.mv_company_funding(entity_id);
+CREATE INDEX IF NOT EXISTS idx_mv_company_funding_total    ON cb.mv_company_funding(total_raised_usd DESC NULLS LAST);
+
+-- 2) Топ инвесторов
+CREATE MATERIALIZED VIEW IF NOT EXISTS cb.mv_top_investors AS
+SELECT * FROM cb.v_top_investors;
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_top_investors      ON cb.mv_top_investors(investor_id);
+CREATE INDEX IF NOT EXISTS idx_mv_top_investors_deals      ON cb.mv_top_investors(deals DESC);
+
+-- 3) Привлечения по годам
+CREATE MATERIALIZED VIEW IF NOT EXISTS cb.mv_raised_by_year AS
+SELECT * FROM cb.v_raised_by_year;
+CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_raised_by_year     ON cb.mv_raised_by_year(year);
@@ -29,7 +29,7 @@ ORDER BY 1;
 -- последние 20 раундов с названием компании
 SELECT fr.funded_at, o.name, fr.funding_round_type, fr.raised_amount_usd
 FROM cb.funding_rounds fr
-JOIN cb.objects o ON o.entity_id = btrim(fr.object_id)
+JOIN cb.objects o ON o.obj_key = fr.object_key
 ORDER BY fr.funded_at DESC
 LIMIT 20;
 
@@ -99,7 +99,7 @@ SELECT o.country_code,
        COUNT(*) AS rounds_cnt,
        AVG(fr.raised_amount_usd) AS avg_raised_usd
 FROM cb.funding_rounds fr
-JOIN cb.objects o ON o.entity_id = btrim(fr.object_id)
+JOIN cb.objects o ON o.obj_key = fr.object_key
 GROUP BY o.country_code
 ORDER BY avg_raised_usd DESC NULLS LAST
 LIMIT 20;
@@ -107,7 +107,7 @@ LIMIT 20;
 -- Тема 9: Компании с > N раундов (пример: больше 5)
 SELECT o.name, COUNT(*) AS rounds_cnt, SUM(fr.raised_amount_usd) AS total_raised_usd
 FROM cb.funding_rounds fr
-JOIN cb.objects o ON o.entity_id = btrim(fr.object_id)
+JOIN cb.objects o ON o.obj_key = fr.object_key
 GROUP BY o.name
 HAVING COUNT(*) > 5
 ORDER BY total_raised_usd DESC NULLS LAST
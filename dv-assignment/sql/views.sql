@@ -42,30 +42,20 @@ SELECT
   MAX(fr.funded_at) AS last_round_at
 FROM cb.objects o
 JOIN cb.funding_rounds fr
-  ON lower(replace(btrim(fr.object_id), chr(160), '')) =  -- стыкуем префиксы
-     lower(replace(btrim(o.id),          chr(160), ''))
+  ON fr.object_key = o.obj_key        -- канонические ключи считает загрузчик
 GROUP BY o.id, o.name, o.country_code;
 
 
 -- 3) Топ инвесторов (с жёстким фолбэком имени)
-DROP VIEW IF EXISTS cb.v_top_investors;
-
-CREATE VIEW cb.v_top_investors AS
+-- CREATE OR REPLACE, а не DROP: от вьюхи зависит cb.mv_top_investors (materialized.sql)
+CREATE OR REPLACE VIEW cb.v_top_investors AS
 WITH deals AS (
-  SELECT util.norm_id(investor_object_id) AS investor_id, COUNT(*) AS deals
+  SELECT investor_object_key AS investor_id, COUNT(*) AS deals
   FROM cb.investments
-  GROUP BY util.norm_id(investor_object_id)
-),
-meta_full AS (            -- имя по полному id (c префиксом)
-  SELECT util.norm_id(id) AS key_full,
-         COALESCE(NULLIF(btrim(name), ''),
-                  NULLIF(btrim(permalink), ''),
-                  NULLIF(btrim(normalized_name), ''),
-                  NULLIF(btrim(domain), '')) AS base_name
-  FROM cb.objects
+  GROUP BY investor_object_key
 ),
-meta_num AS (             -- имя по цифре (entity_id)
-  SELECT btrim(entity_id) AS key_num,
+meta AS (                 -- имя по каноническому ключу (obj_key)
+  SELECT obj_key,
          COALESCE(NULLIF(btrim(name), ''),
                   NULLIF(btrim(permalink), ''),
                   NULLIF(btrim(normalized_name), ''),
@@ -75,9 +65,8 @@ meta_num AS (             -- имя по цифре (entity_id)
 SELECT
   d.investor_id,
   COALESCE(
-    mf.base_name,                                 -- 1) по полному id
-    mn.base_name,                                 -- 2) по entity_id (цифрам)
-    CASE left(d.investor_id,1)                    -- 3) фолбэк-текст
+    m.base_name,                                  -- 1) по ключу объекта
+    CASE left(d.investor_id,1)                    -- 2) фолбэк-текст
       WHEN 'f' THEN 'Financial org ' || split_part(d.investor_id,':',2)
       WHEN 'c' THEN 'Company '       || split_part(d.investor_id,':',2)
       WHEN 'p' THEN 'Person '        || split_part(d.investor_id,':',2)
@@ -86,8 +75,7 @@ SELECT
   ) AS investor_name,
   d.deals
 FROM deals d
-LEFT JOIN meta_full mf ON mf.key_full = d.investor_id
-LEFT JOIN meta_num  mn ON mn.key_num  = split_part(d.investor_id,':',2)
+LEFT JOIN meta m ON m.obj_key = d.investor_id
 ORDER BY d.deals DESC;
 
 
@@ -1,6 +1,11 @@
 import pandas as pd
 from sqlalchemy import create_engine
 import os
+import io
+import sys
+import time
+import argparse
+import resource
 
 # 1) параметры подключения к твоей БД
 USER = "postgres"              # логин от pgAdmin
@@ -29,21 +34,109 @@ files_to_import = [
     "funding_rounds.csv",
 ]
 
-for filename in files_to_import:
-    path = os.path.join(FOLDER, filename)
-    if not os.path.exists(path):
-        print(f"❌ Файл {filename} не найден, пропускаю")
-        continue
+# 4) типы колонок для потокового режима: всё, чего нет в списках, читаем как текст,
+#    чтобы pandas не угадывал типы заново на каждом чанке
+INT_COLUMNS = {
+    "id", "logo_width", "logo_height", "investment_rounds", "invested_companies",
+    "funding_rounds", "milestones", "relationships", "participants", "sequence",
+}
+FLOAT_COLUMNS = {
+    "funding_total_usd", "raised_amount", "raised_amount_usd",
+    "pre_money_valuation", "pre_money_valuation_usd",
+    "post_money_valuation", "post_money_valuation_usd",
+    "price_amount", "valuation_amount", "latitude", "longitude",
+}
+TEXT_ID_FILES = {"objects.csv"}  # тут id с префиксом (c:1, f:2), не число
 
-    table_name = filename.replace(".csv", "")
-    print(f"📥 Импортирую {filename} -> таблица {table_name}")
 
+def column_dtypes(filename: str, columns) -> dict:
+    dtypes = {}
+    for c in columns:
+        if c in FLOAT_COLUMNS:
+            dtypes[c] = "float64"
+        elif c in INT_COLUMNS and not (c == "id" and filename in TEXT_ID_FILES):
+            dtypes[c] = "Int64"
+        else:
+            dtypes[c] = str
+    return dtypes
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт КБ, macOS — байты
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def import_full(path: str, table_name: str) -> int:
     # читаем csv
     df = pd.read_csv(path)
 
     # пишем в postgres, если таблица была — заменим
     df.to_sql(table_name, engine, if_exists="replace", index=False)
+    return len(df)
+
+
+def import_stream(path: str, table_name: str, filename: str, chunksize: int) -> int:
+    """Читает csv чанками по `chunksize` строк и грузит каждый через COPY.
+
+    Таблица пересоздаётся и заполняется в одной транзакции, в памяти только текущий чанк.
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    dtypes = column_dtypes(filename, header)
+    cols = ", ".join(f'"{c}"' for c in header)
+    copy_sql = f'COPY "{table_name}" ({cols}) FROM STDIN WITH (FORMAT csv, NULL \'\')'
+
+    rows = 0
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        for chunk in pd.read_csv(path, dtype=dtypes, chunksize=chunksize):
+            if rows == 0:
+                ddl = pd.io.sql.get_schema(chunk.head(0), table_name, con=engine)
+                cur.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+                cur.execute(ddl)
+            buf = io.StringIO()
+            chunk.to_csv(buf, index=False, header=False, na_rep="")
+            buf.seek(0)
+            cur.copy_expert(copy_sql, buf)
+            rows += len(chunk)
+        raw.commit()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+    return rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Import Crunchbase CSVs into PostgreSQL as-is")
+    ap.add_argument("--stream", action="store_true",
+                    help="читать чанками и грузить через COPY (память не растёт с размером файла)")
+    ap.add_argument("--chunksize", type=int, default=100_000, help="строк в чанке для --stream")
+    args = ap.parse_args()
+
+    for filename in files_to_import:
+        path = os.path.join(FOLDER, filename)
+        if not os.path.exists(path):
+            print(f"❌ Файл {filename} не найден, пропускаю")
+            continue
+
+        table_name = filename.replace(".csv", "")
+        print(f"📥 Импортирую {filename} -> таблица {table_name}")
+
+        t0 = time.perf_counter()
+        if args.stream:
+            rows = import_stream(path, table_name, filename, args.chunksize)
+        else:
+            rows = import_full(path, table_name)
+        sec = time.perf_counter() - t0
+
+        print(f"✅ Готово: {table_name} ({rows} строк, {sec:.1f} с, "
+              f"{rows / sec if sec > 0 else 0:,.0f} строк/с, peak RSS {peak_rss_mb():,.0f} МБ)")
+
+    print("🎉 Все файлы обработаны")
 
-    print(f"✅ Готово: {table_name} ({len(df)} строк)")
 
-print("🎉 Все файлы обработаны")
+if __name__ == "__main__":
+    main()